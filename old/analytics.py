@@ -1,16 +1,50 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+from google_clients import get_google_client
+from ga_quota import quota_scheduler, QuotaDeferred, seconds_to_next_hour
+from scoring import batch_quality_scores
+from insight_stats import TrafficInsightStats
+from comparison import get_date_range, get_comparison_range, format_date_range, attach_comparison
+from ranking import MultiTopK
+from reports import TrafficReport
+from observability import log, timed, submit_in_context
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import json
 
 class AnalyticsService:
+    # Metrics compared between periods
+    COMPARISON_METRICS = [
+        'sessions', 'users', 'bounce_rate', 'avg_session_duration_seconds',
+        'pages_per_session', 'conversions', 'quality_score'
+    ]
+    
+    # Row limit when both periods share one runReport response
+    COMPARISON_ROW_LIMIT = 250
+    
+    # Rankings of the 'sort' parameter - all of them are tracked in the same pass
+    RANKINGS = ['quality_score', 'sessions', 'users', 'conversions']
+    
+    # Sources returned when no limit is given
+    DEFAULT_LIMIT = 10
+    
+    # Row limit when every source is ranked (sort / limit given)
+    RANKING_ROW_LIMIT = 10000
+    
+    # batchRunReports takes up to 5 reports, all of the same property
+    MAX_BATCH_REPORTS = 5
+    
+    # Multi-property fan-out: rows per property report / rows in the combined table
+    FANOUT_ROW_LIMIT = 50
+    FANOUT_COMBINED_LIMIT = 20
+    
     def __init__(self, credentials):
         """Initialize Analytics service with user credentials"""
         self.credentials = credentials
         # Google Analytics Data API v1 (GA4)
-        self.analytics = build('analyticsdata', 'v1beta', credentials=credentials)
+        self.analytics = get_google_client('analyticsdata', 'v1beta', credentials)
     
-    def get_traffic_quality_data(self, property_id, date_range='30days', comparison=None):
+    def get_traffic_quality_data(self, property_id, date_range='30days', comparison=None, sort=None, limit=None):
         """
         Get traffic quality data from Google Analytics
         
@@ -18,25 +52,489 @@ class AnalyticsService:
             property_id: GA4 Property ID (format: properties/123456789)
             date_range: '7days', '30days', '90days', or custom
             comparison: 'previous', 'year', or None
+            sort: one of RANKINGS - ranks every source of the period
+            limit: sources returned (default: DEFAULT_LIMIT)
+        
+        Without sort and limit the result is the top 10 sources by sessions,
+        ordered by quality score.
         """
         try:
-            # Build date range
-            end_date = datetime.now().date()
-            
-            if date_range == '7days':
-                start_date = end_date - timedelta(days=7)
-            elif date_range == '30days':
-                start_date = end_date - timedelta(days=30)
-            elif date_range == '90days':
-                start_date = end_date - timedelta(days=90)
-            else:
-                start_date = end_date - timedelta(days=30)  # default
-            
-            # Format property ID correctly
-            if not property_id.startswith('properties/'):
-                property_id = f'properties/{property_id}'
-            
-            # Build the request
+            property_id, request, context = self.build_traffic_quality_request(
+                property_id, date_range, comparison, sort, limit
+            )
+            
+            # Make the API call
+            response = self.run_report(property_id, request)
+            
+            log.info("✅ Analytics API call successful")
+            
+            return self.parse_traffic_quality_response(response, context)
+            
+        except QuotaDeferred as e:
+            log.warning(f"⏳ {e}")
+            return e.to_result()
+            
+        except Exception as e:
+            log.error(f"❌ Error fetching Analytics data: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def run_report(self, property_id, request):
+        """
+        runReport through the per-property quota scheduler
+        
+        Waits for a slot in the property's token bucket, asks GA for the
+        remaining property quota and records it. Raises QuotaDeferred
+        (before sending) when the call can't be afforded.
+        """
+        response = self.execute_with_quota(property_id, self.analytics.properties().runReport(
+            property=property_id,
+            body=dict(request, returnPropertyQuota=True)
+        ))
+        
+        quota_scheduler.record(property_id, response.get('propertyQuota'))
+        return response
+    
+    def run_batch_reports(self, property_id, requests):
+        """
+        Send runReport bodies of one property in batchRunReports calls
+        
+        GA4 batches at most MAX_BATCH_REPORTS reports per call, all for the
+        same property. Each call takes one slot of the property's quota
+        bucket. Returns the reports in request order.
+        """
+        reports = []
+        
+        for start in range(0, len(requests), self.MAX_BATCH_REPORTS):
+            chunk = [dict(request, returnPropertyQuota=True)
+                     for request in requests[start:start + self.MAX_BATCH_REPORTS]]
+            response = self.execute_with_quota(property_id, self.analytics.properties().batchRunReports(
+                property=property_id,
+                body={'requests': chunk}
+            ))
+            
+            for report in response.get('reports', []):
+                quota_scheduler.record(property_id, report.get('propertyQuota'))
+            reports.extend(response.get('reports', []))
+        
+        return reports
+    
+    def execute_with_quota(self, property_id, api_request):
+        """Execute a Data API request once the property's quota bucket allows it"""
+        quota_scheduler.acquire(property_id)
+        
+        try:
+            return api_request.execute()
+        except HttpError as e:
+            # Still 429 after the transport's retries - the quota is gone
+            if e.resp.status == 429:
+                quota_scheduler.mark_exhausted(property_id)
+                raise QuotaDeferred(property_id, seconds_to_next_hour(), 'quota exhausted') from e
+            raise
+    
+    def build_traffic_quality_request(self, property_id, date_range='30days', comparison=None,
+                                      sort=None, limit=None):
+        """
+        Build the runReport body for get_traffic_quality_data
+        
+        Returns (property_id, request, context); context is passed back to
+        parse_traffic_quality_response. Kept free of I/O so the async
+        transport can send the same request.
+        """
+        start_date, end_date = get_date_range(date_range)
+        property_id = self.format_property_id(property_id)
+        context = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'comparison': comparison,
+            'ranking': (sort, limit) if sort or limit else None
+        }
+        
+        date_ranges = [
+            {
+                'startDate': start_date.strftime('%Y-%m-%d'),
+                'endDate': end_date.strftime('%Y-%m-%d'),
+                'name': 'current'
+            }
+        ]
+        
+        # Comparison period is requested in the same runReport call
+        if comparison:
+            previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+            context['previous_start'], context['previous_end'] = previous_start, previous_end
+            date_ranges.append({
+                'startDate': previous_start.strftime('%Y-%m-%d'),
+                'endDate': previous_end.strftime('%Y-%m-%d'),
+                'name': 'previous'
+            })
+        
+        # Build the request
+        if context['ranking']:
+            # Every source is ranked locally
+            row_limit = self.RANKING_ROW_LIMIT
+        else:
+            # With a comparison, rows of both periods share the limit
+            row_limit = self.COMPARISON_ROW_LIMIT if comparison else 10
+        request = self.build_traffic_report(property_id, date_ranges, row_limit)
+        
+        log.info(f"🔍 Fetching Analytics data for property: {property_id}")
+        log.info(f"📅 Date range: {start_date} to {end_date}")
+        
+        return property_id, request, context
+    
+    def build_traffic_report(self, property_id, date_ranges, limit):
+        """runReport body of the traffic quality report, top sources by sessions"""
+        return {
+            'property': property_id,
+            'dateRanges': date_ranges,
+            'dimensions': [
+                {'name': 'sessionDefaultChannelGrouping'},  # Traffic source grouping
+                {'name': 'sessionSourceMedium'}  # Detailed source/medium
+            ],
+            'metrics': [
+                {'name': 'sessions'},
+                {'name': 'totalUsers'},
+                {'name': 'bounceRate'},
+                {'name': 'averageSessionDuration'},
+                {'name': 'screenPageViewsPerSession'},
+                {'name': 'conversions'}  # If goals are set up
+            ],
+            'orderBys': [
+                {
+                    'metric': {'metricName': 'sessions'},
+                    'desc': True
+                }
+            ],
+            'limit': limit
+        }
+    
+    def parse_traffic_quality_response(self, response, context):
+        """Turn a runReport response into the traffic quality result"""
+        start_date, end_date = context['start_date'], context['end_date']
+        comparison = context['comparison']
+        ranking = context.get('ranking')
+        
+        # Process the response - one pass, split by date range
+        parsed_rows = []
+        previous_rows = []
+        
+        with timed('parse'):
+            for row in response.get('rows', []):
+                period, parsed_row = self.parse_traffic_row(row)
+                
+                if period == 'current':
+                    if ranking or len(parsed_rows) < 10:
+                        parsed_rows.append(parsed_row)
+                else:
+                    previous_rows.append(parsed_row)
+        
+        traffic_sources = self.build_traffic_sources(parsed_rows)
+        if ranking:
+            result = self.build_ranked_result(traffic_sources, start_date, end_date, *ranking)
+        else:
+            result = self.build_result(traffic_sources, start_date, end_date)
+        
+        if comparison:
+            self.add_comparison(result, self.build_traffic_sources(previous_rows),
+                                comparison, context['previous_start'], context['previous_end'])
+        
+        return result
+    
+    def get_multi_property_traffic_quality(self, properties, date_range='30days', comparison=None, max_workers=8):
+        """
+        Traffic quality across several GA4 properties (agency view)
+        
+        Args:
+            properties: list of (property_id, property_name)
+            date_range: '7days', '30days', '90days', or custom
+            comparison: 'previous', 'year', or None
+            max_workers: properties fetched concurrently
+        
+        Each property's period reports go out together in batchRunReports
+        (GA4 only batches reports of one property), and up to max_workers
+        properties are in flight at once - wall-clock time grows with the
+        number of batch rounds, not with the number of properties. Returns
+        the merged traffic sources plus a per-property table.
+        """
+        try:
+            start_date, end_date = get_date_range(date_range)
+            periods = [('current', start_date, end_date)]
+            if comparison:
+                previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+                periods.append(('previous', previous_start, previous_end))
+            
+            log.info(f"🔍 Fetching Analytics data for {len(properties)} properties")
+            log.info(f"📅 Date range: {start_date} to {end_date}")
+            
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ga-fanout') as executor:
+                futures = [submit_in_context(executor, self.fetch_property_periods, property_id, property_name, periods)
+                           for property_id, property_name in properties]
+                fetched = [future.result() for future in futures]
+            
+            succeeded = [item for item in fetched if item['success']]
+            if not succeeded:
+                # Nothing to merge - surface the first failure (keeps quota_deferred)
+                return fetched[0]
+            
+            log.info(f"✅ Analytics batch calls successful for {len(succeeded)}/{len(fetched)} properties")
+            
+            merged = self.merge_property_rows([item['rows']['current'] for item in succeeded])
+            traffic_sources = self.build_traffic_sources(merged[:self.FANOUT_COMBINED_LIMIT])
+            result = self.build_result(traffic_sources, start_date, end_date)
+            result['properties'] = [self.build_property_summary(item) for item in fetched]
+            result['properties'].sort(key=lambda item: item.get('total_sessions', -1), reverse=True)
+            # Sessions of every fetched property, not only of the combined top rows
+            result['total_sessions'] = sum(item['total_sessions'] for item in result['properties']
+                                           if 'total_sessions' in item)
+            
+            if comparison:
+                previous_rows = self.merge_property_rows([item['rows']['previous'] for item in succeeded])
+                # Period-wide like total_sessions: every fetched row of the same properties
+                previous_total = sum(item['previous_sessions'] for item in result['properties']
+                                     if 'previous_sessions' in item)
+                self.add_comparison(result, self.build_traffic_sources(previous_rows),
+                                    comparison, previous_start, previous_end, previous_total)
+            
+            return result
+            
+        except Exception as e:
+            log.error(f"❌ Error fetching multi-property Analytics data: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def fetch_property_periods(self, property_id, property_name, periods):
+        """Parsed traffic rows of one property per period, one report per period"""
+        property_id = self.format_property_id(property_id)
+        item = {'property_id': property_id.split('/')[-1], 'property_name': property_name}
+        
+        try:
+            requests = [
+                self.build_traffic_report(property_id, [{
+                    'startDate': period_start.strftime('%Y-%m-%d'),
+                    'endDate': period_end.strftime('%Y-%m-%d')
+                }], self.FANOUT_ROW_LIMIT)
+                for _, period_start, period_end in periods
+            ]
+            reports = self.run_batch_reports(property_id, requests)
+            
+            item['success'] = True
+            with timed('parse'):
+                item['rows'] = {
+                    name: [self.parse_traffic_row(row)[1] for row in report.get('rows', [])]
+                    for (name, _, _), report in zip(periods, reports)
+                }
+            
+        except QuotaDeferred as e:
+            log.warning(f"⏳ {e}")
+            item.update(e.to_result())
+        
+        except Exception as e:
+            log.error(f"❌ Error fetching Analytics data for {property_id}: {e}")
+            item.update({'success': False, 'error': str(e)})
+        
+        return item
+    
+    def merge_property_rows(self, rows_by_property):
+        """
+        Sum parsed traffic rows of several properties by (channel, source/medium)
+        
+        Averages are weighted by sessions. Returns merged tuples in the
+        parsed row format, most sessions first.
+        """
+        totals = {}
+        for rows in rows_by_property:
+            for channel_group, source_medium, sessions, users, bounce_rate, avg_duration, pages, conversions in rows:
+                total = totals.get((channel_group, source_medium))
+                if total is None:
+                    total = totals[(channel_group, source_medium)] = [0, 0, 0.0, 0.0, 0.0, 0]
+                total[0] += sessions
+                total[1] += users
+                total[2] += bounce_rate * sessions
+                total[3] += avg_duration * sessions
+                total[4] += pages * sessions
+                total[5] += conversions
+        
+        merged = []
+        for (channel_group, source_medium), (sessions, users, bounced, duration, pages, conversions) in totals.items():
+            divisor = sessions or 1
+            merged.append((
+                channel_group, source_medium, sessions, users,
+                bounced / divisor, duration / divisor, pages / divisor, conversions
+            ))
+        
+        merged.sort(key=lambda row: row[2], reverse=True)
+        return merged
+    
+    def build_property_summary(self, item):
+        """Row of the per-property table"""
+        summary = {'property_id': item['property_id'], 'property_name': item['property_name']}
+        if not item['success']:
+            summary['error'] = item['error']
+            return summary
+        
+        traffic_sources = self.build_traffic_sources(item['rows']['current'])
+        sessions = traffic_sources.column('sessions')
+        quality_scores = traffic_sources.column('quality_score')
+        total_sessions = sum(sessions)
+        summary.update({
+            'total_sessions': total_sessions,
+            'sources': len(traffic_sources),
+            # Sessions-weighted quality of the property's traffic
+            'quality_score': round(sum(score * count for score, count in zip(quality_scores, sessions))
+                                   / total_sessions) if total_sessions else 0,
+            'top_source': traffic_sources.column('source_medium')[0] if traffic_sources else None
+        })
+        
+        if 'previous' in item['rows']:
+            previous_sessions = sum(row[2] for row in item['rows']['previous'])
+            summary['previous_sessions'] = previous_sessions
+            summary['change_percent'] = (round((total_sessions - previous_sessions) / previous_sessions * 100, 1)
+                                         if previous_sessions else None)
+        
+        return summary
+    
+    def parse_traffic_row(self, row):
+        """(period, parsed metric tuple) of one traffic report row"""
+        # Extract dimension values
+        dimensions = row['dimensionValues']
+        channel_group = dimensions[0]['value']
+        source_medium = dimensions[1]['value']
+        
+        # Multiple date ranges add a dateRange dimension at the end
+        period = dimensions[2]['value'] if len(dimensions) > 2 else 'current'
+        
+        # Extract metric values
+        metrics = row['metricValues']
+        sessions = int(metrics[0]['value'])
+        users = int(metrics[1]['value'])
+        bounce_rate = float(metrics[2]['value']) * 100  # Convert to percentage
+        avg_duration = float(metrics[3]['value'])  # In seconds
+        pages_per_session = float(metrics[4]['value'])
+        conversions = int(metrics[5]['value']) if len(metrics) > 5 else 0
+        
+        return period, (
+            channel_group, source_medium, sessions, users,
+            bounce_rate, avg_duration, pages_per_session, conversions
+        )
+    
+    def format_property_id(self, property_id):
+        """Format property ID as properties/123456789"""
+        if not property_id.startswith('properties/'):
+            property_id = f'properties/{property_id}'
+        return property_id
+    
+    def build_traffic_sources(self, parsed_rows):
+        """
+        Build a scored TrafficReport from parsed metric tuples
+        
+        Each tuple is (channel_group, source_medium, sessions, users, bounce_rate,
+        avg_duration, pages_per_session, conversions). Quality scores for all rows
+        are computed in one vectorized pass; rows of the report read as
+        traffic source dicts.
+        """
+        traffic_sources = TrafficReport()
+        if not parsed_rows:
+            return traffic_sources
+        
+        with timed('score'):
+            columns = list(zip(*parsed_rows))
+            quality_scores = batch_quality_scores(
+                avg_duration=columns[5],
+                bounce_rate=columns[4],
+                pages_per_session=columns[6],
+                conversions=columns[7],
+                sessions=columns[2]
+            )
+            
+            # The MM:SS session duration is formatted when a row is read
+            for row, score in zip(parsed_rows, quality_scores):
+                traffic_sources.append(*row, quality_score=int(score))
+        
+        return traffic_sources
+    
+    def build_result(self, traffic_sources, start_date, end_date, ranked=False):
+        """Sort traffic sources by quality (unless already ranked) and wrap them in the API result format"""
+        
+        # Sort by quality score
+        if not ranked:
+            traffic_sources.sort_by('quality_score')
+        
+        return {
+            'success': True,
+            'traffic_sources': traffic_sources,
+            'date_range': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d')
+            },
+            'total_sessions': sum(traffic_sources.column('sessions'))
+        }
+    
+    def build_ranked_result(self, traffic_sources, start_date, end_date, sort=None, limit=None):
+        """
+        Top `limit` sources by `sort`, wrapped in the API result format
+        
+        Every ranking of RANKINGS is tracked in the same pass (MultiTopK);
+        the result carries the source/medium of each under 'rankings'.
+        """
+        sort = sort or 'quality_score'
+        
+        # Rank row indexes on the report's columns - no row dicts are built
+        ranker = MultiTopK(limit or self.DEFAULT_LIMIT, {
+            name: traffic_sources.column(name).__getitem__ for name in self.RANKINGS
+        })
+        ranker.add_many(range(len(traffic_sources)))
+        
+        result = self.build_result(traffic_sources.take(ranker.top(sort)), start_date, end_date, ranked=True)
+        result['sort'] = sort
+        result['rankings'] = ranker.labels(traffic_sources.column('source_medium').__getitem__)
+        return result
+    
+    def add_comparison(self, result, previous_sources, comparison, previous_start, previous_end,
+                       previous_total=None):
+        """
+        Attach per-source deltas against the comparison period to a result
+        
+        The previous total_sessions is taken over the same sources as the
+        result's total_sessions (the sources in the result) unless the
+        caller passes a previous_total of the same basis.
+        """
+        previous_by_key = {
+            (source['source'], source['source_medium']): source
+            for source in previous_sources
+        }
+        
+        traffic_sources = result['traffic_sources']
+        attach_comparison(traffic_sources, previous_by_key,
+                          ['source', 'source_medium'], self.COMPARISON_METRICS)
+        
+        if previous_total is None:
+            previous_total = sum(
+                previous_by_key[key]['sessions']
+                for key in zip(traffic_sources.column('source'), traffic_sources.column('source_medium'))
+                if key in previous_by_key
+            )
+        result['comparison'] = {
+            'type': comparison,
+            'date_range': format_date_range(previous_start, previous_end),
+            'total_sessions': previous_total
+        }
+        return result
+    
+    def fetch_daily_rows(self, property_id, start_date, end_date, page_size=100000):
+        """
+        Fetch per-day traffic rows for the local metrics store
+        
+        Yields dicts with additive metrics (sums, not averages) so any date
+        range can be re-aggregated locally.
+        """
+        property_id = self.format_property_id(property_id)
+        offset = 0
+        
+        while True:
             request = {
                 'property': property_id,
                 'dateRanges': [
@@ -46,8 +544,9 @@ class AnalyticsService:
                     }
                 ],
                 'dimensions': [
-                    {'name': 'sessionDefaultChannelGrouping'},  # Traffic source grouping
-                    {'name': 'sessionSourceMedium'}  # Detailed source/medium
+                    {'name': 'date'},
+                    {'name': 'sessionDefaultChannelGrouping'},
+                    {'name': 'sessionSourceMedium'}
                 ],
                 'metrics': [
                     {'name': 'sessions'},
@@ -55,88 +554,100 @@ class AnalyticsService:
                     {'name': 'bounceRate'},
                     {'name': 'averageSessionDuration'},
                     {'name': 'screenPageViewsPerSession'},
-                    {'name': 'conversions'}  # If goals are set up
+                    {'name': 'conversions'}
                 ],
+                # Offset paging needs a total order, or rows can move between pages -
+                # (date, channel, source/medium) is unique per row
                 'orderBys': [
-                    {
-                        'metric': {'metricName': 'sessions'},
-                        'desc': True
-                    }
+                    {'dimension': {'dimensionName': 'date'}},
+                    {'dimension': {'dimensionName': 'sessionDefaultChannelGrouping'}},
+                    {'dimension': {'dimensionName': 'sessionSourceMedium'}}
                 ],
-                'limit': 10
+                'limit': page_size,
+                'offset': offset
             }
             
-            print(f"🔍 Fetching Analytics data for property: {property_id}")
-            print(f"📅 Date range: {start_date} to {end_date}")
+            log.info(f"🔍 Syncing Analytics daily data for {property_id}: {start_date} to {end_date}")
             
-            # Make the API call
-            response = self.analytics.properties().runReport(
-                property=property_id,
-                body=request
-            ).execute()
-            
-            print("✅ Analytics API call successful")
-            
-            # Process the response
-            traffic_sources = []
+            response = self.run_report(property_id, request)
             
-            if 'rows' in response:
-                for row in response['rows']:
-                    # Extract dimension values
-                    channel_group = row['dimensionValues'][0]['value']
-                    source_medium = row['dimensionValues'][1]['value']
-                    
-                    # Extract metric values
+            rows = response.get('rows', [])
+            # Parsed a page at a time, so the 'parse' phase doesn't time the consumer
+            page = []
+            with timed('parse'):
+                for row in rows:
+                    dimensions = row['dimensionValues']
                     metrics = row['metricValues']
                     sessions = int(metrics[0]['value'])
-                    users = int(metrics[1]['value'])
-                    bounce_rate = float(metrics[2]['value']) * 100  # Convert to percentage
-                    avg_duration = float(metrics[3]['value'])  # In seconds
-                    pages_per_session = float(metrics[4]['value'])
-                    conversions = int(metrics[5]['value']) if len(metrics) > 5 else 0
-                    
-                    # Format session duration as MM:SS
-                    duration_minutes = int(avg_duration // 60)
-                    duration_seconds = int(avg_duration % 60)
-                    duration_formatted = f"{duration_minutes}:{duration_seconds:02d}"
-                    
-                    # Calculate quality score
-                    quality_score = self.calculate_quality_score(
-                        avg_duration, bounce_rate, pages_per_session, conversions, sessions
-                    )
                     
-                    traffic_sources.append({
-                        'source': channel_group,
-                        'source_medium': source_medium,
+                    page.append({
+                        'date': datetime.strptime(dimensions[0]['value'], '%Y%m%d').date(),
+                        'channel_group': dimensions[1]['value'],
+                        'source_medium': dimensions[2]['value'],
                         'sessions': sessions,
-                        'users': users,
-                        'avg_session_duration': duration_formatted,
-                        'avg_session_duration_seconds': avg_duration,
-                        'bounce_rate': round(bounce_rate, 1),
-                        'pages_per_session': round(pages_per_session, 1),
-                        'conversions': conversions,
-                        'quality_score': quality_score
+                        'users': int(metrics[1]['value']),
+                        'bounced_sessions': float(metrics[2]['value']) * sessions,
+                        'session_duration': float(metrics[3]['value']) * sessions,
+                        'page_views': float(metrics[4]['value']) * sessions,
+                        'conversions': float(metrics[5]['value']) if len(metrics) > 5 else 0
                     })
+            yield from page
             
-            # Sort by quality score
-            traffic_sources.sort(key=lambda x: x['quality_score'], reverse=True)
-            
-            return {
-                'success': True,
-                'traffic_sources': traffic_sources,
-                'date_range': {
-                    'start_date': start_date.strftime('%Y-%m-%d'),
-                    'end_date': end_date.strftime('%Y-%m-%d')
-                },
-                'total_sessions': sum(source['sessions'] for source in traffic_sources)
+            offset += len(rows)
+            if not rows or offset >= int(response.get('rowCount', 0)):
+                break
+    
+    def iter_landing_page_pages(self, property_id, start_date, end_date, page_size=100000):
+        """
+        Page through per-landing-page metrics and yield raw row pages
+        
+        Rows carry the hostName and landingPage dimensions, so they can be
+        joined with Search Console page URLs. Only one page is held in
+        memory at a time.
+        """
+        property_id = self.format_property_id(property_id)
+        offset = 0
+        
+        while True:
+            request = {
+                'property': property_id,
+                'dateRanges': [
+                    {
+                        'startDate': start_date.strftime('%Y-%m-%d'),
+                        'endDate': end_date.strftime('%Y-%m-%d')
+                    }
+                ],
+                'dimensions': [
+                    {'name': 'hostName'},
+                    {'name': 'landingPage'}
+                ],
+                'metrics': [
+                    {'name': 'sessions'},
+                    {'name': 'totalUsers'},
+                    {'name': 'bounceRate'},
+                    {'name': 'averageSessionDuration'},
+                    {'name': 'conversions'}
+                ],
+                # Stable order for offset paging, like fetch_daily_rows
+                'orderBys': [
+                    {'dimension': {'dimensionName': 'hostName'}},
+                    {'dimension': {'dimensionName': 'landingPage'}}
+                ],
+                'limit': page_size,
+                'offset': offset
             }
             
-        except Exception as e:
-            print(f"❌ Error fetching Analytics data: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            log.info(f"🔍 Fetching Analytics landing pages for {property_id}: rows from {offset}")
+            
+            response = self.run_report(property_id, request)
+            
+            rows = response.get('rows', [])
+            if rows:
+                yield rows
+            
+            offset += len(rows)
+            if not rows or offset >= int(response.get('rowCount', 0)):
+                break
     
     def calculate_quality_score(self, avg_duration, bounce_rate, pages_per_session, conversions, sessions):
         """
@@ -173,13 +684,19 @@ class AnalyticsService:
         return round(quality_score)
     
     def generate_insights(self, traffic_sources, total_sessions):
-        """Generate AI-like insights from the data"""
+        """
+        Generate AI-like insights from the data
+        
+        traffic_sources is any iterable of scored rows (consumed once) or a
+        TrafficInsightStats built while streaming them.
+        """
+        stats = TrafficInsightStats.from_rows(traffic_sources)
         
-        if not traffic_sources:
+        if not stats.count:
             return "לא נמצאו נתונים לניתוח"
         
-        best_source = traffic_sources[0]
-        worst_source = traffic_sources[-1]
+        best_source = stats.best
+        worst_source = stats.worst
         
         insights = []
         
@@ -198,51 +715,48 @@ class AnalyticsService:
                            f"({best_source['bounce_rate']}%) - זה מעולה!")
         
         # Volume vs Quality insight
-        highest_volume = max(traffic_sources, key=lambda x: x['sessions'])
+        highest_volume = stats.highest_volume
         if highest_volume != best_source:
             insights.append(f"<strong>{highest_volume['source']}</strong> מביא הכי הרבה תנועה "
                            f"({highest_volume['sessions']:,} ביקורים) אבל לא בהכרח הכי איכותית")
         
         # Improvement opportunity
-        if len(traffic_sources) > 1 and worst_source['sessions'] > total_sessions * 0.1:
+        if stats.count > 1 and worst_source['sessions'] > total_sessions * 0.1:
             insights.append(f"יש הזדמנות לשיפור ב-<strong>{worst_source['source']}</strong> - "
                            f"מביא הרבה תנועה ({worst_source['sessions']:,}) אבל עם איכות נמוכה יותר")
         
         return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{insight}</li>" for insight in insights]) + "</ul>"
     
     def generate_recommendations(self, traffic_sources):
-        """Generate actionable recommendations"""
+        """Generate actionable recommendations (rows or TrafficInsightStats, like generate_insights)"""
+        stats = TrafficInsightStats.from_rows(traffic_sources)
         
-        if not traffic_sources:
+        if not stats.count:
             return "אין מספיק נתונים להמלצות"
         
         recommendations = []
-        best_source = traffic_sources[0]
+        best_source = stats.best
         
         # Investment recommendation
         recommendations.append(f"<strong>הגדל השקעה ב-{best_source['source']}</strong> - "
                               f"זה המקור הכי איכותי שלך")
         
-        # Find sources with high bounce rate
-        high_bounce_sources = [s for s in traffic_sources if s['bounce_rate'] > 60]
-        if high_bounce_sources:
-            source_name = high_bounce_sources[0]['source']
-            recommendations.append(f"<strong>שפר את חוויית המשתמש מ-{source_name}</strong> - "
-                                  f"שיעור נטישה גבוה ({high_bounce_sources[0]['bounce_rate']}%)")
+        # Sources with high bounce rate
+        high_bounce = stats.first_high_bounce
+        if high_bounce:
+            recommendations.append(f"<strong>שפר את חוויית המשתמש מ-{high_bounce['source']}</strong> - "
+                                  f"שיעור נטישה גבוה ({high_bounce['bounce_rate']}%)")
         
-        # Find sources with low pages per session
-        low_engagement = [s for s in traffic_sources if s['pages_per_session'] < 2]
+        # Sources with low pages per session
+        low_engagement = stats.first_low_engagement
         if low_engagement:
-            source_name = low_engagement[0]['source']
-            recommendations.append(f"<strong>שפר את התוכן עבור {source_name}</strong> - "
-                                  f"מבקרים רואים מעט דפים ({low_engagement[0]['pages_per_session']})")
+            recommendations.append(f"<strong>שפר את התוכן עבור {low_engagement['source']}</strong> - "
+                                  f"מבקרים רואים מעט דפים ({low_engagement['pages_per_session']})")
         
         # Conversion opportunity
-        high_traffic_low_conversion = [s for s in traffic_sources 
-                                     if s['sessions'] > 100 and s['conversions'] == 0]
-        if high_traffic_low_conversion:
-            source_name = high_traffic_low_conversion[0]['source']
-            recommendations.append(f"<strong>הוסף מטרות המרה עבור {source_name}</strong> - "
+        untracked = stats.first_untracked_conversions
+        if untracked:
+            recommendations.append(f"<strong>הוסף מטרות המרה עבור {untracked['source']}</strong> - "
                                   f"תנועה גבוהה ללא מעקב המרות")
         
-        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
\ No newline at end of file
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
@@ -1,16 +1,48 @@
-from flask import Flask, render_template, session, redirect, url_for, flash, request, jsonify
+from flask import Flask, render_template, session, redirect, url_for, flash, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import click
+import hmac
 import os
+import json
+import threading
+from datetime import datetime, timedelta
 from config import Config
-from database import init_db, db, User, GoogleToken, FacebookToken, UserAccount
+from database import init_db, db, FacebookToken, UserAccount
 from auth import auth_bp
+from google_clients import client_pool, GOOGLE_SERVICES
+from result_cache import ResultCache
+from comparison import COMPARISON_TYPES, get_date_range
+from token_manager import token_manager
+from identity import get_identity
+from http_transport import transport_stats
+from jobs import job_manager, JobFullError
+from ga_quota import quota_scheduler
+from insight_stats import TrafficInsightStats, KeywordInsightStats
+from reports import ColumnarReport
+from json_response import dumps, build_response
+from prewarm import analysis_prewarmer
+from observability import log, timed, operation_scope, registry, setup_logging
 
 # Fix for development - allow HTTP for OAuth
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+class AnalysisJSONProvider(DefaultJSONProvider):
+    """JSON של Flask שמכיר גם את הדוחות הטוריים (reports.py) - נשלחים כרשימת שורות"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, ColumnarReport):
+            return o.to_list()
+        return DefaultJSONProvider.default(o)
+
 def create_app():
     """יצירת Flask application"""
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = AnalysisJSONProvider(app)
+    
+    # לוג דרך תור - הכתיבה ל-stdout לא חוסמת בקשות
+    setup_logging(app.config['LOG_LEVEL'], app.config['LOG_SAMPLE_RATE'], app.config['LOG_QUEUE_SIZE'])
     
     # Initialize database
     init_db(app)
@@ -18,10 +50,26 @@ def create_app():
     # Register blueprints
     app.register_blueprint(auth_bp)
     
+    # טעינת discovery documents פעם אחת לכל process
+    client_pool.warm_up(GOOGLE_SERVICES)
+    
+    # רענון Google tokens ברקע לפני שפג תוקפם
+    if app.config['GOOGLE_TOKEN_BACKGROUND_REFRESH']:
+        token_manager.start(app)
+    
     return app
 
 app = create_app()
 
+# Cache לתוצאות /api/analyze - ערכים הם (results, computed_at)
+analysis_cache = ResultCache(
+    max_entries=app.config['ANALYZE_CACHE_MAX_ENTRIES'],
+    ttl_seconds=app.config['ANALYZE_CACHE_TTL_SECONDS']
+)
+
+# מגבלה על streams פתוחים של /api/analyze/stream
+analysis_stream_slots = threading.BoundedSemaphore(app.config['ANALYZE_STREAM_MAX_CONCURRENT'])
+
 # Helper function לבדיקת authentication
 def login_required(f):
     """Decorator לדרישה להתחברות"""
@@ -54,84 +102,56 @@ def login():
 @login_required
 def dashboard():
     """דשבורד ראשי"""
-    user_id = session['user_id']
-    
-    # קבלת פרטי משתמש
-    user = User.query.get(user_id)
-    if not user:
+    # משתמש, tokens וחשבונות - בשאילתה אחת
+    identity = get_identity()
+    if not identity:
         session.clear()
         flash('שגיאה בקבלת פרטי משתמש', 'error')
         return redirect(url_for('login'))
     
-    # בדיקת סטטוס התחברויות
-    google_token = GoogleToken.query.filter_by(user_id=user_id).first()
-    google_connected = google_token is not None and not google_token.is_expired()
-    
-    facebook_token = FacebookToken.query.filter_by(user_id=user_id).first()
-    facebook_connected = facebook_token is not None and not facebook_token.is_expired()
-    
-    # קבלת חשבונות מחוברים
-    accounts = UserAccount.query.filter_by(user_id=user_id, is_active=True).all()
-    
-    # סיווג חשבונות לפי סוג
-    analytics_accounts = [acc for acc in accounts if acc.account_type == 'google_analytics']
-    search_console_accounts = [acc for acc in accounts if acc.account_type == 'search_console']
-    facebook_accounts = [acc for acc in accounts if acc.account_type == 'facebook_ads']
+    # סיווג חשבונות מחוברים לפי סוג
+    accounts_by_type = identity.accounts_by_type(active_only=True)
     
     return render_template('dashboard.html',
-                         user=user,
-                         google_connected=google_connected,
-                         facebook_connected=facebook_connected,
-                         analytics_accounts=analytics_accounts,
-                         search_console_accounts=search_console_accounts,
-                         facebook_accounts=facebook_accounts)
+                         user=identity.user,
+                         google_connected=identity.google_connected,
+                         facebook_connected=identity.facebook_connected,
+                         analytics_accounts=accounts_by_type['google_analytics'],
+                         search_console_accounts=accounts_by_type['search_console'],
+                         facebook_accounts=accounts_by_type['facebook_ads'])
 
 @app.route('/profile')
 @login_required  
 def profile():
     """עמוד פרופיל משתמש"""
-    user_id = session['user_id']
-    user = User.query.get(user_id)
+    identity = get_identity()
     
-    if not user:
+    if not identity:
         flash('משתמש לא נמצא', 'error')
         return redirect(url_for('login'))
     
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=identity.user)
 
 @app.route('/accounts')
 @login_required
 def accounts():
     """עמוד ניהול חשבונות"""
-    user_id = session['user_id']
-    user = User.query.get(user_id)
+    identity = get_identity()
     
-    if not user:
+    if not identity:
         flash('משתמש לא נמצא', 'error')
         return redirect(url_for('login'))
     
-    # קבלת כל החשבונות
-    all_accounts = UserAccount.query.filter_by(user_id=user_id).all()
-    
-    # סיווג לפי סוג
-    analytics_accounts = [acc for acc in all_accounts if acc.account_type == 'google_analytics']
-    search_console_accounts = [acc for acc in all_accounts if acc.account_type == 'search_console']
-    facebook_accounts = [acc for acc in all_accounts if acc.account_type == 'facebook_ads']
-    
-    # בדיקת סטטוס התחברות
-    google_token = GoogleToken.query.filter_by(user_id=user_id).first()
-    google_connected = google_token is not None and not google_token.is_expired()
-    
-    facebook_token = FacebookToken.query.filter_by(user_id=user_id).first()
-    facebook_connected = facebook_token is not None and not facebook_token.is_expired()
+    # סיווג כל החשבונות לפי סוג
+    accounts_by_type = identity.accounts_by_type(active_only=False)
     
     return render_template('accounts.html',
-                         user=user,
-                         analytics_accounts=analytics_accounts,
-                         search_console_accounts=search_console_accounts,
-                         facebook_accounts=facebook_accounts,
-                         google_connected=google_connected,
-                         facebook_connected=facebook_connected)
+                         user=identity.user,
+                         analytics_accounts=accounts_by_type['google_analytics'],
+                         search_console_accounts=accounts_by_type['search_console'],
+                         facebook_accounts=accounts_by_type['facebook_ads'],
+                         google_connected=identity.google_connected,
+                         facebook_connected=identity.facebook_connected)
 
 @app.route('/accounts/toggle/<int:account_id>')
 @login_required
@@ -147,6 +167,7 @@ def toggle_account(account_id):
     # החלפת סטטוס
     account.is_active = not account.is_active
     db.session.commit()
+    analysis_cache.invalidate_user(user_id)
     
     status = "הופעל" if account.is_active else "הושבת"
     flash(f'חשבון {account.account_name} {status} בהצלחה', 'success')
@@ -159,33 +180,24 @@ def refresh_accounts():
     """רענון רשימת החשבונות מGoogle"""
     user_id = session['user_id']
     
-    # קבלת Google token
-    google_token = GoogleToken.query.filter_by(user_id=user_id).first()
-    if not google_token or google_token.is_expired():
+    # קבלת credentials מוכנים (מרוענים לפי הצורך)
+    with timed('credentials', 'accounts'):
+        credentials = token_manager.get_credentials(user_id)
+    if not credentials:
         flash('יש להתחבר מחדש לGoogle', 'warning')
         return redirect(url_for('auth.google_login'))
     
     try:
-        # יצירת credentials מהtoken השמור
-        from google.oauth2.credentials import Credentials
-        
-        credentials = Credentials(
-            token=google_token.access_token,
-            refresh_token=google_token.refresh_token,
-            token_uri=google_token.token_uri,
-            client_id=google_token.client_id,
-            client_secret=google_token.client_secret,
-            scopes=google_token.get_scopes()
-        )
-        
         # רענון החשבונות
-        from auth import fetch_google_accounts
+        from auth import fetch_google_accounts, refresh_facebook_accounts
         fetch_google_accounts(user_id, credentials)
+        refresh_facebook_accounts(user_id)
+        analysis_cache.invalidate_user(user_id)
         
         flash('רשימת החשבונות עודכנה בהצלחה', 'success')
         
     except Exception as e:
-        print(f"Error refreshing accounts: {e}")
+        log.error(f"Error refreshing accounts: {e}")
         flash('שגיאה ברענון החשבונות', 'error')
     
     return redirect(url_for('accounts'))
@@ -194,15 +206,16 @@ def refresh_accounts():
 @login_required
 def action_page(action_id):
     """עמוד פעולה ספציפית"""
-    user_id = session['user_id']
-    user = User.query.get(user_id)
+    identity = get_identity()
     
-    if not user:
+    if not identity:
         flash('משתמש לא נמצא', 'error')
         return redirect(url_for('login'))
     
+    user = identity.user
+    
     # בדיקה שיש חשבונות פעילים
-    active_accounts = UserAccount.query.filter_by(user_id=user_id, is_active=True).all()
+    active_accounts = identity.active_accounts
     if not active_accounts:
         flash('יש לחבר חשבונות כדי לבצע ניתוחים', 'warning')
         return redirect(url_for('accounts'))
@@ -217,6 +230,14 @@ def action_page(action_id):
             'service_type': 'analytics',
             'available': True
         },
+        'traffic-quality-all': {
+            'title': 'איכות תנועה בכל הנכסים',
+            'description': 'תמונה אחת של מקורות התנועה בכל נכסי ה-Analytics הפעילים שלך, עם טבלה לכל נכס',
+            'explanation': 'הנתונים של כל הנכסים נשלפים במקביל ומאוחדים לפי מקור תנועה; ציון האיכות מחושב כמו בניתוח של נכס בודד',
+            'metrics': ['Sessions', 'Users', 'Bounce Rate', 'Session Duration', 'Pages per Session'],
+            'service_type': 'analytics_all',
+            'available': True
+        },
         'search-keywords': {
             'title': 'מילות חיפוש מובילות',
             'description': 'גלה איזו מילת חיפוש מביאה לך הכי הרבה תנועה מגוגל ואיך לשפר את הדירוג',
@@ -224,6 +245,22 @@ def action_page(action_id):
             'metrics': ['Clicks', 'Impressions', 'CTR', 'Average Position', 'Traffic Potential'],
             'service_type': 'search_console',
             'available': True
+        },
+        'landing-pages': {
+            'title': 'דפי נחיתה: חיפוש מול התנהגות',
+            'description': 'אילו דפים מקבלים תנועה מגוגל ומה המבקרים עושים בהם אחרי שהם נוחתים',
+            'explanation': 'חיבור נתוני Search Console (קליקים, הצגות, דירוג) לנתוני Analytics (ביקורים, נטישה, המרות) לפי כתובת הדף',
+            'metrics': ['Clicks', 'Impressions', 'Position', 'Sessions', 'Bounce Rate', 'Conversions'],
+            'service_type': 'landing_pages',
+            'available': True
+        },
+        'facebook-campaigns': {
+            'title': 'ביצועי קמפיינים בפייסבוק',
+            'description': 'איזה קמפיין בפייסבוק מנצל את התקציב הכי טוב ואיפה הכסף הולך לאיבוד',
+            'explanation': 'ניתוח מבוסס על Facebook Ads Insights: הוצאה, הצגות, קליקים, CTR, עלות לקליק והמרות',
+            'metrics': ['Spend', 'Impressions', 'Clicks', 'CTR', 'CPC', 'Conversions'],
+            'service_type': 'facebook_ads',
+            'available': True
         }
     }
     
@@ -243,39 +280,116 @@ def action_page(action_id):
                          action_id=action_id,
                          active_accounts=active_accounts)
 
-@app.route('/api/analyze', methods=['POST'])
-@login_required
-def analyze_data():
-    """API endpoint לביצוע ניתוח נתונים"""
-    try:
-        data = request.get_json()
-        user_id = session['user_id']
-        
-        # בדיקת פרמטרים
-        action_id = data.get('action_id')
-        if action_id not in ['traffic-quality', 'search-keywords']:
-            return jsonify({'success': False, 'error': 'פעולה לא נתמכת'})
-        
-        # קבלת Google credentials
-        google_token = GoogleToken.query.filter_by(user_id=user_id).first()
-        if not google_token or google_token.is_expired():
-            return jsonify({'success': False, 'error': 'יש להתחבר מחדש לGoogle'})
-        
-        # יצירת credentials
-        from google.oauth2.credentials import Credentials
-        credentials = Credentials(
-            token=google_token.access_token,
-            refresh_token=google_token.refresh_token,
-            token_uri=google_token.token_uri,
-            client_id=google_token.client_id,
-            client_secret=google_token.client_secret,
-            scopes=google_token.get_scopes()
-        )
-        
-        date_range = data.get('dateRange', '30days')
-        comparison = data.get('comparison', 'none')
+# פעולות ניתוח: פרמטר החשבון בבקשה, מפתח השורות בתוצאה והמיונים הנתמכים (פרמטר sort)
+ANALYSIS_ACTIONS = {
+    'traffic-quality': {
+        'account_param': 'analyticsAccount', 'rows_key': 'traffic_sources',
+        'sorts': ['quality_score', 'sessions', 'users', 'conversions']
+    },
+    'traffic-quality-all': {'account_param': None, 'rows_key': 'traffic_sources'},  # כל הנכסים הפעילים
+    'search-keywords': {
+        'account_param': 'searchAccount', 'rows_key': 'keywords',
+        'sorts': ['clicks', 'quality_score', 'traffic_potential', 'impressions']
+    },
+    'landing-pages': {'account_param': ('analyticsAccount', 'searchAccount'), 'rows_key': 'pages'},
+    'facebook-campaigns': {'account_param': 'facebookAccount', 'rows_key': 'campaigns'}
+}
+
+# שגיאת prepare_analysis כשאין Google credentials תקפים (401 ב-endpoints של הייצוא)
+GOOGLE_RECONNECT_ERROR = 'יש להתחבר מחדש לGoogle'
+
+def prepare_analysis(user_id, data, use_cache=True):
+    """
+    בדיקת פרמטרים, cache, credentials וחשבון - ללא קריאות ל-Google
+    
+    מחזיר (plan, error). plan['cached'] מכיל תוצאות מה-cache או מהחימום
+    המוקדם (prewarm.py) אם נמצאו, plan['cache'] את המקור ('hit' / 'prewarmed')
+    ו-plan['computed_at'] את זמן החישוב. use_cache=False מדלג על שניהם.
+    משותף למצב הסינכרוני ולמצב ה-async (asgi.py).
+    """
+    # בדיקת פרמטרים
+    action_id = data.get('action_id')
+    if action_id not in ANALYSIS_ACTIONS:
+        return None, 'פעולה לא נתמכת'
+    
+    date_range = data.get('dateRange', '30days')
+    comparison = data.get('comparison', 'none')
+    
+    # מיון ומספר שורות - בלי שניהם נשארת התצוגה הקבועה (10 מקורות / 20 מילות חיפוש)
+    sorts = ANALYSIS_ACTIONS[action_id].get('sorts')
+    sort = data.get('sort') or None
+    limit = data.get('limit') or None
+    if (sort or limit) and not sorts:
+        return None, 'מיון אינו נתמך בפעולה זו'
+    if sort and sort not in sorts:
+        return None, 'מיון לא נתמך'
+    if limit:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return None, 'מספר שורות לא תקין'
+        if not 1 <= limit <= app.config['ANALYZE_MAX_LIMIT']:
+            return None, f'מספר השורות חייב להיות בין 1 ל-{app.config["ANALYZE_MAX_LIMIT"]}'
+    
+    # בדיקה ב-cache לפני כל עבודה נוספת
+    account_param = ANALYSIS_ACTIONS[action_id]['account_param']
+    if isinstance(account_param, tuple):
+        account_key = tuple(data.get(param) for param in account_param)
+    else:
+        account_key = data.get(account_param) if account_param else None
+    cache_key = (user_id, action_id, account_key, date_range, comparison, sort, limit)
+    plan = {
+        'action_id': action_id,
+        'date_range': date_range,
+        'comparison': comparison if comparison in COMPARISON_TYPES else None,
+        'sort': sort,
+        'limit': limit,
+        'cache_key': cache_key,
+        'cache': 'hit',
+        'cached': None,
+        'computed_at': None
+    }
+    
+    cached = analysis_cache.get(cache_key) if use_cache else None
+    if cached is None and use_cache and analysis_prewarmer.is_prewarmed(action_id, date_range, comparison, sort, limit):
+        # תוצאה שחושבה מראש בשעות השפל - נשמרת גם ב-cache של ה-process
+        with timed('db'):
+            cached = analysis_prewarmer.load(user_id, action_id, account_key)
+        if cached is not None:
+            plan['cache'] = 'prewarmed'
+            analysis_cache.set(cache_key, cached)
+    if cached is not None:
+        plan['cached'], plan['computed_at'] = cached
+        return plan, None
+    
+    if action_id == 'facebook-campaigns':
+        with timed('db'):
+            facebook_token = FacebookToken.query.filter_by(user_id=user_id).first()
+            if not facebook_token or facebook_token.is_expired():
+                return None, 'יש להתחבר מחדש לפייסבוק'
+            
+            # קבלת חשבון מודעות
+            account = UserAccount.query.filter_by(
+                user_id=user_id,
+                account_id=data.get('facebookAccount'),
+                account_type='facebook_ads',
+                is_active=True
+            ).first()
+            
+            if not account:
+                return None, 'חשבון מודעות פייסבוק לא נמצא'
         
-        # Handle Analytics actions
+        plan['access_token'] = facebook_token.access_token
+        plan['account_id'] = account.account_id
+        return plan, None
+    
+    # קבלת Google credentials מוכנים (מרוענים לפי הצורך)
+    with timed('credentials'):
+        plan['credentials'] = token_manager.get_credentials(user_id)
+    if not plan['credentials']:
+        return None, GOOGLE_RECONNECT_ERROR
+    
+    with timed('db'):
         if action_id == 'traffic-quality':
             # קבלת חשבון Analytics
             account_id = data.get('analyticsAccount')
@@ -287,52 +401,47 @@ def analyze_data():
             ).first()
             
             if not account:
-                return jsonify({'success': False, 'error': 'חשבון Analytics לא נמצא'})
+                return None, 'חשבון Analytics לא נמצא'
             
-            # יצירת Analytics service
-            from analytics import AnalyticsService
-            analytics_service = AnalyticsService(credentials)
+            plan['account_id'] = account_id
             
-            print(f"🔍 Analyzing traffic quality for property: {account_id}")
+        elif action_id == 'traffic-quality-all':
+            # כל נכסי ה-Analytics הפעילים של המשתמש
+            accounts = UserAccount.query.filter_by(
+                user_id=user_id,
+                account_type='google_analytics',
+                is_active=True
+            ).all()
             
-            # שליפת נתונים אמיתיים
-            analytics_data = analytics_service.get_traffic_quality_data(
-                property_id=account_id,
-                date_range=date_range,
-                comparison=comparison if comparison != 'none' else None
-            )
+            if not accounts:
+                return None, 'לא נמצאו חשבונות Analytics פעילים'
             
-            if not analytics_data['success']:
-                return jsonify({
-                    'success': False, 
-                    'error': f'שגיאה בקבלת נתונים מ-Analytics: {analytics_data["error"]}'
-                })
+            plan['properties'] = [(account.account_id, account.account_name) for account in accounts]
             
-            traffic_sources = analytics_data['traffic_sources']
-            total_sessions = analytics_data['total_sessions']
+        elif action_id == 'landing-pages':
+            # חיבור נכס Analytics לאתר Search Console - שני החשבונות נדרשים
+            analytics_account = UserAccount.query.filter_by(
+                user_id=user_id,
+                account_id=data.get('analyticsAccount'),
+                account_type='google_analytics',
+                is_active=True
+            ).first()
+            search_account = UserAccount.query.filter_by(
+                user_id=user_id,
+                account_id=data.get('searchAccount'),
+                account_type='search_console',
+                is_active=True
+            ).first()
             
-            # יצירת תובנות והמלצות
-            ai_insights = analytics_service.generate_insights(traffic_sources, total_sessions)
-            recommendations = analytics_service.generate_recommendations(traffic_sources)
+            if not analytics_account:
+                return None, 'חשבון Analytics לא נמצא'
+            if not search_account:
+                return None, 'חשבון Search Console לא נמצא'
             
-            # החזרת תוצאות
-            results = {
-                'traffic_sources': traffic_sources,
-                'ai_insights': f"""
-                    <strong>תובנות מרכזיות מהניתוח של {total_sessions:,} ביקורים:</strong>
-                    {ai_insights}
-                """,
-                'recommendations': f"""
-                    <strong>המלצות לשיפור:</strong>
-                    {recommendations}
-                """,
-                'date_range': analytics_data['date_range']
-            }
-            
-            print(f"✅ Analytics analysis completed. Found {len(traffic_sources)} traffic sources")
+            plan['account_id'] = analytics_account.account_id
+            plan['site_url'] = search_account.account_id
             
-        # Handle Search Console actions
-        elif action_id == 'search-keywords':
+        else:
             # קבלת חשבון Search Console
             search_account_id = data.get('searchAccount')
             if not search_account_id:
@@ -346,65 +455,544 @@ def analyze_data():
                     search_account_id = account.account_id
             
             if not search_account_id:
-                return jsonify({'success': False, 'error': 'חשבון Search Console לא נמצא'})
+                return None, 'חשבון Search Console לא נמצא'
             
-            # יצירת Search Console service
-            from search_console import SearchConsoleService
-            search_service = SearchConsoleService(credentials)
-            
-            print(f"🔍 Analyzing search keywords for site: {search_account_id}")
-            
-            # שליפת נתונים אמיתיים
-            search_data = search_service.get_top_search_keywords(
-                site_url=search_account_id,
-                date_range=date_range,
-                comparison=comparison if comparison != 'none' else None
+            plan['account_id'] = search_account_id
+    
+    return plan, None
+
+def fetch_analysis_data(plan):
+    """שליפת הנתונים מ-Google / Facebook - מחזיר (service, data)"""
+    if plan['action_id'] == 'facebook-campaigns':
+        # יצירת Facebook Ads service
+        from facebook_ads import FacebookAdsService
+        ads_service = FacebookAdsService(plan['access_token'])
+        
+        log.info(f"🔍 Analyzing Facebook campaigns for ad account: {plan['account_id']}")
+        
+        return ads_service, ads_service.get_campaign_performance(
+            account_id=plan['account_id'],
+            date_range=plan['date_range'],
+            comparison=plan['comparison']
+        )
+    
+    if plan['action_id'] == 'traffic-quality':
+        # יצירת Analytics service
+        from analytics import AnalyticsService
+        analytics_service = AnalyticsService(plan['credentials'])
+        
+        log.info(f"🔍 Analyzing traffic quality for property: {plan['account_id']}")
+        
+        # שליפת נתונים - מהמאגר המקומי (סנכרון חלקי בלבד) או ישירות מ-GA
+        if app.config['ANALYTICS_USE_LOCAL_STORE']:
+            from metrics_store import get_traffic_quality_data
+            return analytics_service, get_traffic_quality_data(
+                analytics_service, plan['account_id'], plan['date_range'],
+                comparison=plan['comparison'],
+                sort=plan['sort'],
+                limit=plan['limit']
             )
-            
-            if not search_data['success']:
-                return jsonify({
-                    'success': False, 
-                    'error': f'שגיאה בקבלת נתונים מ-Search Console: {search_data["error"]}'
-                })
-            
-            keywords = search_data['keywords']
-            summary = search_data['summary']
-            
-            # יצירת תובנות והמלצות
-            ai_insights = search_service.generate_insights(keywords, summary)
-            recommendations = search_service.generate_recommendations(keywords, summary)
-            
-            # החזרת תוצאות
-            results = {
-                'keywords': keywords,
-                'ai_insights': f"""
+        
+        return analytics_service, analytics_service.get_traffic_quality_data(
+            property_id=plan['account_id'],
+            date_range=plan['date_range'],
+            comparison=plan['comparison'],
+            sort=plan['sort'],
+            limit=plan['limit']
+        )
+    
+    if plan['action_id'] == 'traffic-quality-all':
+        from analytics import AnalyticsService
+        analytics_service = AnalyticsService(plan['credentials'])
+        
+        log.info(f"🔍 Analyzing traffic quality for {len(plan['properties'])} properties")
+        
+        # batchRunReports לכל נכס, כמה נכסים במקביל
+        return analytics_service, analytics_service.get_multi_property_traffic_quality(
+            plan['properties'],
+            date_range=plan['date_range'],
+            comparison=plan['comparison'],
+            max_workers=app.config['ANALYTICS_FANOUT_MAX_WORKERS']
+        )
+    
+    if plan['action_id'] == 'landing-pages':
+        from landing_pages import LandingPageService
+        landing_page_service = LandingPageService(plan['credentials'])
+        
+        log.info(f"🔍 Analyzing landing pages for property {plan['account_id']} and site {plan['site_url']}")
+        
+        # join מלא של שני המקורות, עמוד אחרי עמוד
+        return landing_page_service, landing_page_service.get_landing_pages_report(
+            property_id=plan['account_id'],
+            site_url=plan['site_url'],
+            date_range=plan['date_range']
+        )
+    
+    # יצירת Search Console service
+    from search_console import SearchConsoleService
+    search_service = SearchConsoleService(plan['credentials'])
+    
+    log.info(f"🔍 Analyzing search keywords for site: {plan['account_id']}")
+    
+    # שליפת נתונים אמיתיים
+    return search_service, search_service.get_top_search_keywords(
+        site_url=plan['account_id'],
+        date_range=plan['date_range'],
+        comparison=plan['comparison'],
+        sort=plan['sort'],
+        limit=plan['limit']
+    )
+
+def iter_analysis_results(plan, service, fetched):
+    """
+    שלבי הניתוח אחרי שליפת הנתונים: rows, summary, insights, recommendations, done
+    
+    ללא קריאות רשת או DB - רץ כמו שהוא גם במצב ה-async.
+    """
+    action_id = plan['action_id']
+    results = {}
+    done = {'cache': 'miss'}
+    if action_id == 'traffic-quality':
+        done['property_quota'] = quota_scheduler.snapshot(plan['account_id'])
+    
+    # הקריאה ל-GA נדחתה לפני שנשלחה כי מכסת הנכס כמעט נוצלה -
+    # תוצאה ישנה מה-cache עדיפה על שגיאה
+    if fetched.get('quota_deferred'):
+        stale = analysis_cache.get_stale(plan['cache_key'])
+        if stale is None:
+            minutes = max(1, round(fetched['retry_after'] / 60))
+            yield 'error', {'error': f'מכסת Google Analytics של הנכס כמעט נוצלה, נסה שוב בעוד {minutes} דקות'}
+            return
+        
+        stale_results, computed_at = stale
+        property_ids = plan.get('account_id') or ', '.join(property_id for property_id, _ in plan['properties'])
+        log.warning(f"⏳ Serving stale cached results for property {property_ids} (GA4 quota low)")
+        yield from iter_result_events(action_id, stale_results)
+        done['cache'] = 'stale'
+        done['computed_at'] = computed_at.isoformat()
+        yield 'done', done
+        return
+    
+    # Handle Analytics actions (נכס בודד או כל הנכסים)
+    if action_id in ('traffic-quality', 'traffic-quality-all'):
+        if not fetched['success']:
+            yield 'error', {'error': f'שגיאה בקבלת נתונים מ-Analytics: {fetched["error"]}'}
+            return
+        
+        traffic_sources = fetched['traffic_sources']
+        total_sessions = fetched['total_sessions']
+        
+        # הטבלה נשלחת לפני יצירת התובנות
+        results['traffic_sources'] = traffic_sources
+        results['total_sessions'] = total_sessions
+        results['date_range'] = fetched['date_range']
+        for key in ['properties', 'comparison', 'sort', 'rankings']:
+            if key in fetched:
+                results[key] = fetched[key]
+        yield from iter_result_events(action_id, results, stages=['rows', 'summary'])
+        
+        yield 'status', {'stage': 'analyzing'}
+        
+        # יצירת תובנות והמלצות - מעבר אחד על השורות לשתיהן
+        with timed('insights'):
+            stats = TrafficInsightStats.from_rows(traffic_sources)
+            ai_insights = service.generate_insights(stats, total_sessions)
+            results['ai_insights'] = f"""
+                    <strong>תובנות מרכזיות מהניתוח של {total_sessions:,} ביקורים:</strong>
+                    {ai_insights}
+                """
+        yield from iter_result_events(action_id, results, stages=['insights'])
+        
+        with timed('insights'):
+            recommendations = service.generate_recommendations(stats)
+            results['recommendations'] = f"""
+                    <strong>המלצות לשיפור:</strong>
+                    {recommendations}
+                """
+        yield from iter_result_events(action_id, results, stages=['recommendations'])
+        
+        log.info(f"✅ Analytics analysis completed. Found {len(traffic_sources)} traffic sources")
+        
+    # Handle Search Console actions
+    elif action_id == 'search-keywords':
+        if not fetched['success']:
+            yield 'error', {'error': f'שגיאה בקבלת נתונים מ-Search Console: {fetched["error"]}'}
+            return
+        
+        keywords = fetched['keywords']
+        summary = fetched['summary']
+        
+        # הטבלה והסיכום נשלחים לפני יצירת התובנות
+        results['keywords'] = keywords
+        results['summary'] = summary
+        results['date_range'] = fetched['date_range']
+        for key in ['comparison', 'sort', 'rankings']:
+            if key in fetched:
+                results[key] = fetched[key]
+        yield from iter_result_events(action_id, results, stages=['rows', 'summary'])
+        
+        yield 'status', {'stage': 'analyzing'}
+        
+        # יצירת תובנות והמלצות - מעבר אחד על השורות לשתיהן
+        with timed('insights'):
+            stats = KeywordInsightStats.from_rows(keywords)
+            ai_insights = service.generate_insights(stats, summary)
+            results['ai_insights'] = f"""
                     <strong>תובנות מרכזיות מניתוח {summary['total_keywords']} מילות חיפוש:</strong>
                     {ai_insights}
-                """,
-                'recommendations': f"""
+                """
+        yield from iter_result_events(action_id, results, stages=['insights'])
+        
+        with timed('insights'):
+            recommendations = service.generate_recommendations(stats, summary)
+            results['recommendations'] = f"""
                     <strong>המלצות SEO:</strong>
                     {recommendations}
-                """,
-                'summary': summary,
-                'date_range': search_data['date_range']
-            }
-            
-            print(f"✅ Search Console analysis completed. Found {len(keywords)} keywords")
+                """
+        yield from iter_result_events(action_id, results, stages=['recommendations'])
+        
+        log.info(f"✅ Search Console analysis completed. Found {len(keywords)} keywords")
+        
+    # Handle landing pages (Analytics + Search Console)
+    elif action_id == 'landing-pages':
+        if not fetched['success']:
+            yield 'error', {'error': f'שגיאה בחיבור נתוני Analytics ו-Search Console: {fetched["error"]}'}
+            return
+        
+        pages = fetched['pages']
+        summary = fetched['summary']
+        
+        # הטבלה והסיכום נשלחים לפני יצירת התובנות
+        results['pages'] = pages
+        results['summary'] = summary
+        results['date_range'] = fetched['date_range']
+        yield from iter_result_events(action_id, results, stages=['rows', 'summary'])
+        
+        yield 'status', {'stage': 'analyzing'}
+        
+        # יצירת תובנות והמלצות
+        with timed('insights'):
+            ai_insights = service.generate_insights(pages, summary)
+            results['ai_insights'] = f"""
+                    <strong>תובנות מרכזיות מחיבור {summary['total_pages']:,} דפים:</strong>
+                    {ai_insights}
+                """
+        yield from iter_result_events(action_id, results, stages=['insights'])
+        
+        with timed('insights'):
+            recommendations = service.generate_recommendations(pages, summary)
+            results['recommendations'] = f"""
+                    <strong>המלצות לדפי הנחיתה:</strong>
+                    {recommendations}
+                """
+        yield from iter_result_events(action_id, results, stages=['recommendations'])
         
-        return jsonify({
-            'success': True,
-            'results': results
-        })
+        log.info(f"✅ Landing pages analysis completed. Joined {summary['total_pages']} pages")
+        
+    # Handle Facebook Ads actions
+    elif action_id == 'facebook-campaigns':
+        if not fetched['success']:
+            yield 'error', {'error': f'שגיאה בקבלת נתונים מ-Facebook Ads: {fetched["error"]}'}
+            return
+        
+        campaigns = fetched['campaigns']
+        summary = fetched['summary']
+        
+        # הטבלה והסיכום נשלחים לפני יצירת התובנות
+        results['campaigns'] = campaigns
+        results['summary'] = summary
+        results['date_range'] = fetched['date_range']
+        if 'comparison' in fetched:
+            results['comparison'] = fetched['comparison']
+        yield from iter_result_events(action_id, results, stages=['rows', 'summary'])
+        
+        yield 'status', {'stage': 'analyzing'}
+        
+        # יצירת תובנות והמלצות
+        with timed('insights'):
+            ai_insights = service.generate_insights(campaigns, summary)
+            results['ai_insights'] = f"""
+                    <strong>תובנות מרכזיות מניתוח {summary['total_campaigns']} קמפיינים:</strong>
+                    {ai_insights}
+                """
+        yield from iter_result_events(action_id, results, stages=['insights'])
+        
+        with timed('insights'):
+            recommendations = service.generate_recommendations(campaigns, summary)
+            results['recommendations'] = f"""
+                    <strong>המלצות לקמפיינים:</strong>
+                    {recommendations}
+                """
+        yield from iter_result_events(action_id, results, stages=['recommendations'])
+        
+        log.info(f"✅ Facebook Ads analysis completed. Found {len(campaigns)} campaigns")
+    
+    computed_at = datetime.utcnow()
+    analysis_cache.set(plan['cache_key'], (results, computed_at))
+    done['computed_at'] = computed_at.isoformat()
+    yield 'done', done
+
+def cached_done(plan):
+    """payload של done לתוצאה מה-cache או מהחימום המוקדם - עם זמן החישוב שלה"""
+    return {'cache': plan['cache'], 'computed_at': plan['computed_at'].isoformat()}
+
+def iter_analysis(user_id, data):
+    """
+    ביצוע ניתוח בשלבים - generator של (event, payload)
+    
+    האירועים לפי הסדר: status ('importing' / 'analyzing'), rows, summary,
+    insights, recommendations ולבסוף done. בשגיאה נשלח אירוע error והניתוח נעצר.
+    משותף ל-/api/analyze, לעבודות ברקע ול-stream.
+    """
+    try:
+        plan, error = prepare_analysis(user_id, data)
+        if error:
+            yield 'error', {'error': error}
+            return
+        
+        if plan['cached'] is not None:
+            yield from iter_result_events(plan['action_id'], plan['cached'])
+            yield 'done', cached_done(plan)
+            return
+        
+        yield 'status', {'stage': 'importing'}
+        service, fetched = fetch_analysis_data(plan)
+        yield from iter_analysis_results(plan, service, fetched)
         
     except Exception as e:
-        print(f"❌ Error in analyze_data: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error in iter_analysis: {e}")
         
-        return jsonify({
-            'success': False, 
-            'error': f'שגיאה פנימית בשרת: {str(e)}'
-        })
+        yield 'error', {'error': f'שגיאה פנימית בשרת: {str(e)}'}
+
+def iter_result_events(action_id, results, stages=('rows', 'summary', 'insights', 'recommendations')):
+    """פירוק תוצאות ניתוח לאירועי שלבים (גם עבור תוצאות מה-cache)"""
+    rows_key = ANALYSIS_ACTIONS[action_id]['rows_key']
+    
+    for stage in stages:
+        if stage == 'rows':
+            yield 'rows', {rows_key: results[rows_key]}
+        elif stage == 'summary':
+            summary = {'date_range': results['date_range']}
+            for key in ['summary', 'total_sessions', 'properties', 'comparison', 'sort', 'rankings']:
+                if key in results:
+                    summary[key] = results[key]
+            yield 'summary', summary
+        elif stage == 'insights':
+            yield 'insights', {'ai_insights': results['ai_insights']}
+        elif stage == 'recommendations':
+            yield 'recommendations', {'recommendations': results['recommendations']}
+
+def perform_analysis(user_id, data, report_progress=None):
+    """
+    ביצוע ניתוח מלא והחזרת תוצאה אחת - עבור /api/analyze ועבודות ברקע
+    
+    report_progress (אופציונלי) מקבל את שם השלב הנוכחי: 'importing' / 'analyzing'
+    זמני השלבים נמדדים כ-operation 'analyze' ב-/metrics
+    """
+    with operation_scope('analyze'):
+        return collect_analysis(iter_analysis(user_id, data), report_progress)
+
+def collect_analysis(events, report_progress=None):
+    """איחוד אירועי ניתוח לתשובת JSON אחת"""
+    results = {}
+    for event, payload in events:
+        if event == 'error':
+            return {'success': False, 'error': payload['error']}
+        elif event == 'status':
+            if report_progress:
+                report_progress(payload['stage'])
+        elif event == 'done':
+            # payload: cache ('hit' / 'prewarmed' / 'miss' / 'stale'), computed_at
+            # (זמן חישוב התוצאות, UTC) ו-property_quota ב-Analytics
+            return dict({
+                'success': True,
+                'results': results
+            }, **payload)
+        else:
+            results.update(payload)
+
+def prewarm_analysis(user_id, data):
+    """ניתוח עבור החימום המוקדם (prewarm.py) - תמיד מול Google, בלי cache"""
+    try:
+        with operation_scope('prewarm'):
+            plan, error = prepare_analysis(user_id, data, use_cache=False)
+            if error:
+                return {'success': False, 'error': error}
+            
+            service, fetched = fetch_analysis_data(plan)
+            return collect_analysis(iter_analysis_results(plan, service, fetched))
+    
+    except Exception as e:
+        log.error(f"❌ Error in prewarm_analysis: {e}")
+        return {'success': False, 'error': str(e)}
+
+# חימום ניתוחי הדשבורד של כל החשבונות הפעילים בשעות השפל
+if app.config['ANALYSIS_PREWARM_ENABLED']:
+    analysis_prewarmer.start(app, prewarm_analysis)
+
+def analysis_response(payload):
+    """
+    תשובת ניתוח: JSON מהיר (orjson), דחיסה לפי Accept-Encoding ו-ETag של התוצאות
+    
+    ניתוח חוזר שהתוצאות שלו לא השתנו מחזיר 304 ללא גוף.
+    """
+    status, body, headers = build_response(
+        payload,
+        request.headers.get('Accept-Encoding'),
+        request.headers.get('If-None-Match')
+    )
+    return Response(body, status=status, headers=headers)
+
+@app.route('/api/analyze', methods=['POST'])
+@login_required
+def analyze_data():
+    """API endpoint לביצוע ניתוח נתונים"""
+    data = request.get_json()
+    return analysis_response(perform_analysis(session['user_id'], data))
+
+@app.route('/api/analyze/stream', methods=['GET', 'POST'])
+@login_required
+def analyze_stream():
+    """ניתוח כ-Server-Sent Events - כל שלב נשלח ללקוח ברגע שהוא מוכן"""
+    # EventSource שולח GET עם query string, fetch יכול לשלוח JSON
+    data = request.get_json(silent=True) or request.args.to_dict()
+    user_id = session['user_id']
+    
+    # הגבלת מספר ה-streams הפתוחים כדי שלא יתפסו את כל ה-workers
+    if not analysis_stream_slots.acquire(blocking=False):
+        return jsonify({'success': False, 'error': 'יותר מדי ניתוחים פעילים, נסה שוב בעוד מספר שניות'}), 503
+    
+    def generate():
+        # 'total' של analyze_stream כולל גם את זמן השליחה ללקוח
+        with operation_scope('analyze_stream'):
+            for event, payload in iter_analysis(user_id, data):
+                yield b'event: ' + event.encode() + b'\ndata: ' + dumps(payload) + b'\n\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # השרת סוגר את התגובה גם אם הלקוח התנתק באמצע
+    response.call_on_close(analysis_stream_slots.release)
+    return response
+
+@app.route('/api/analyze/jobs', methods=['POST'])
+@login_required
+def submit_analysis_job():
+    """הפעלת ניתוח ברקע - מחזיר מזהה משימה מיד"""
+    data = request.get_json()
+    
+    try:
+        job = job_manager.submit(app, session['user_id'], data, perform_analysis)
+    except JobFullError:
+        return jsonify({'success': False, 'error': 'יותר מדי ניתוחים ממתינים, נסה שוב בעוד מספר דקות'}), 503
+    
+    return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/api/analyze/jobs/<job_id>')
+@login_required
+def analysis_job_status(job_id):
+    """מצב משימת ניתוח ברקע"""
+    job = job_manager.get(job_id, session['user_id'])
+    if not job:
+        return jsonify({'success': False, 'error': 'משימה לא נמצאה'}), 404
+    
+    if not job.finished:
+        result = job.to_dict()
+        result['error'] = 'הנתונים בתהליך טעינה, נסה שוב בעוד מספר שניות'
+        return jsonify(result), 202
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/transport/stats')
+@login_required
+def transport_stats_endpoint():
+    """מוני בקשות, שגיאות, retries ו-latency לכל שרת חיצוני (Google / Facebook)"""
+    return jsonify({'success': True, 'hosts': transport_stats.snapshot()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    מדדי Prometheus של ה-process: זמני שלבים (dtv3_phase_seconds) ומוני לוג
+    
+    ללא התחברות - אם METRICS_TOKEN מוגדר נדרש "Authorization: Bearer <token>"
+    """
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), content_type=registry.CONTENT_TYPE)
+
+@app.route('/api/export/search-keywords')
+@login_required
+def export_search_keywords():
+    """ייצוא מלא של נתוני Search Console כ-NDJSON, עמוד אחרי עמוד"""
+    user_id = session['user_id']
+    
+    site_url = request.args.get('site')
+    account = UserAccount.query.filter_by(
+        user_id=user_id,
+        account_id=site_url,
+        account_type='search_console',
+        is_active=True
+    ).first()
+    if not account:
+        return jsonify({'success': False, 'error': 'חשבון Search Console לא נמצא'}), 404
+    
+    credentials = token_manager.get_credentials(user_id)
+    if not credentials:
+        return jsonify({'success': False, 'error': GOOGLE_RECONNECT_ERROR}), 401
+    
+    dimensions = request.args.get('dimensions', 'query').split(',')
+    from search_console import SearchConsoleService
+    if any(d not in SearchConsoleService.SUPPORTED_DIMENSIONS for d in dimensions):
+        return jsonify({'success': False, 'error': 'מימד לא נתמך'}), 400
+    
+    search_service = SearchConsoleService(credentials)
+    date_range = request.args.get('dateRange', '30days')
+    
+    def generate():
+        for page in search_service.stream_keywords(site_url, date_range, dimensions):
+            for row in page:
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/export/landing-pages')
+@login_required
+def export_landing_pages():
+    """ייצוא מלא של חיבור דפי הנחיתה (Analytics + Search Console) כ-NDJSON"""
+    user_id = session['user_id']
+    
+    plan, error = prepare_analysis(user_id, {
+        'action_id': 'landing-pages',
+        'analyticsAccount': request.args.get('property'),
+        'searchAccount': request.args.get('site'),
+        'dateRange': request.args.get('dateRange', '30days')
+    }, use_cache=False)
+    if error:
+        return jsonify({'success': False, 'error': error}), 401 if error == GOOGLE_RECONNECT_ERROR else 404
+    
+    from landing_pages import LandingPageService
+    landing_page_service = LandingPageService(plan['credentials'])
+    start_date, end_date = get_date_range(plan['date_range'])
+    
+    def generate():
+        for page in landing_page_service.iter_joined_pages(plan['account_id'], plan['site_url'],
+                                                           start_date, end_date):
+            yield json.dumps(page, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# CLI commands
+@app.cli.command('export-metrics')
+@click.option('--days', default=30, help='ימים אחורה מהיום (הרצה יומית: מספיקים ימים ספורים)')
+@click.option('--output', default=None, help='תיקיית היעד (ברירת מחדל: METRICS_EXPORT_DIR)')
+def export_metrics_command(days, output):
+    """ייצוא מדדים יומיים של כל החשבונות הפעילים ל-Parquet - להרצה מ-cron"""
+    from metrics_export import export_active_accounts
+    end_date = datetime.now().date()
+    counts = export_active_accounts(token_manager.get_credentials, end_date - timedelta(days=days), end_date, output)
+    log.info(f"📦 Export finished: {counts['properties']} properties, {counts['sites']} sites, {counts['failed']} failed")
 
 # Error handlers
 @app.errorhandler(404)
@@ -425,9 +1013,8 @@ def is_authenticated():
 @app.template_global()
 def current_user():
     """קבלת המשתמש הנוכחי"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    identity = get_identity()
+    return identity.user if identity else None
 
 @app.template_filter('hebrew_date')
 def hebrew_date_filter(date):
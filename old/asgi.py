@@ -0,0 +1,265 @@
+"""
+ASGI entry point for the optional async mode
+
+    uvicorn asgi:application --workers 2
+
+Analysis and account discovery run as coroutines that call Google over
+AsyncGoogleTransport, so a process can keep hundreds of analyses waiting on
+Google without a thread each. Every other route is served by the regular
+Flask app through WsgiToAsgi, which keeps working unchanged.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie, dump_cookie
+from app import (app, analysis_cache, prepare_analysis, fetch_analysis_data,
+                 iter_analysis_results, iter_result_events, cached_done, collect_analysis)
+from async_google import (AsyncGoogleTransport, AsyncAnalyticsService,
+                          AsyncSearchConsoleService, list_google_accounts)
+from auth import save_google_accounts, refresh_facebook_accounts
+from database import db
+from json_response import dumps, build_response
+from observability import log, timed, operation_scope
+from token_manager import token_manager
+
+transport = AsyncGoogleTransport(
+    max_connections=app.config['ASYNC_GOOGLE_MAX_CONNECTIONS'],
+    timeout_seconds=app.config['ASYNC_GOOGLE_TIMEOUT_SECONDS'],
+    max_retries=app.config['HTTP_MAX_RETRIES']
+)
+
+flask_application = WsgiToAsgi(app)
+
+def run_in_app_context(func, *args):
+    with app.app_context():
+        try:
+            return func(*args)
+        finally:
+            db.session.remove()
+
+async def run_sync(func, *args):
+    """Run a blocking call (database, token refresh) in a worker thread"""
+    return await asyncio.to_thread(run_in_app_context, func, *args)
+
+# Flask session cookie, read and written with the app's own serializer
+
+def load_session(scope):
+    headers = dict(scope['headers'])
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    value = cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if not value:
+        return {}
+    
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+def session_cookie_header(session_data):
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie = dump_cookie(
+        app.config['SESSION_COOKIE_NAME'],
+        serializer.dumps(dict(session_data)),
+        path=app.config['SESSION_COOKIE_PATH'] or '/',
+        domain=app.config['SESSION_COOKIE_DOMAIN'],
+        secure=app.config['SESSION_COOKIE_SECURE'],
+        httponly=app.config['SESSION_COOKIE_HTTPONLY'],
+        samesite=app.config['SESSION_COOKIE_SAMESITE']
+    )
+    return (b'set-cookie', cookie.encode('latin-1'))
+
+def flash(session_data, message, category):
+    session_data.setdefault('_flashes', []).append((category, message))
+
+# ASGI helpers
+
+async def read_json(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return json.loads(body) if body else {}
+
+async def send_json(send, payload, status=200):
+    body = dumps(payload)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_analysis(scope, send, payload):
+    """Analysis result with compression and ETag, like app.analysis_response"""
+    headers = dict(scope['headers'])
+    status, body, response_headers = build_response(
+        payload,
+        headers.get(b'accept-encoding', b'').decode('latin-1'),
+        headers.get(b'if-none-match', b'').decode('latin-1')
+    )
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_redirect(send, location, session_data):
+    await send({
+        'type': 'http.response.start',
+        'status': 302,
+        'headers': [(b'location', location.encode()), session_cookie_header(session_data),
+                    (b'content-length', b'0')]
+    })
+    await send({'type': 'http.response.body', 'body': b''})
+
+# Analysis
+
+async def fetch_analysis_data_async(plan):
+    """Async version of app.fetch_analysis_data"""
+    # Facebook Ads uses the pooled Graph session, the multi-property fan-out
+    # its own thread pool and the landing pages join spills to disk - keep
+    # them on a thread
+    if plan['action_id'] in ('facebook-campaigns', 'traffic-quality-all', 'landing-pages'):
+        return await run_sync(fetch_analysis_data, plan)
+    
+    if plan['action_id'] == 'traffic-quality':
+        # The local metrics store is database-backed, keep it on a thread
+        if app.config['ANALYTICS_USE_LOCAL_STORE']:
+            return await run_sync(fetch_analysis_data, plan)
+        
+        analytics_service = AsyncAnalyticsService(plan['credentials'], transport)
+        log.info(f"🔍 Analyzing traffic quality for property: {plan['account_id']}")
+        return analytics_service, await analytics_service.get_traffic_quality_data(
+            property_id=plan['account_id'],
+            date_range=plan['date_range'],
+            comparison=plan['comparison'],
+            sort=plan['sort'],
+            limit=plan['limit']
+        )
+    
+    search_service = AsyncSearchConsoleService(plan['credentials'], transport)
+    log.info(f"🔍 Analyzing search keywords for site: {plan['account_id']}")
+    return search_service, await search_service.get_top_search_keywords(
+        site_url=plan['account_id'],
+        date_range=plan['date_range'],
+        comparison=plan['comparison'],
+        sort=plan['sort'],
+        limit=plan['limit']
+    )
+
+async def iter_analysis_async(user_id, data):
+    """Async version of app.iter_analysis - same events in the same order"""
+    try:
+        plan, error = await run_sync(prepare_analysis, user_id, data)
+        if error:
+            yield 'error', {'error': error}
+            return
+        
+        if plan['cached'] is not None:
+            for event in iter_result_events(plan['action_id'], plan['cached']):
+                yield event
+            yield 'done', cached_done(plan)
+            return
+        
+        yield 'status', {'stage': 'importing'}
+        service, fetched = await fetch_analysis_data_async(plan)
+        for event in iter_analysis_results(plan, service, fetched):
+            yield event
+    
+    except Exception as e:
+        log.error(f"❌ Error in iter_analysis_async: {e}")
+        yield 'error', {'error': f'שגיאה פנימית בשרת: {str(e)}'}
+
+async def analyze_data(scope, receive, send, session_data):
+    """POST /api/analyze"""
+    data = await read_json(receive)
+    with operation_scope('analyze'):
+        events = [event async for event in iter_analysis_async(session_data['user_id'], data)]
+        payload = collect_analysis(events)
+    await send_analysis(scope, send, payload)
+
+async def analyze_stream(scope, receive, send, session_data):
+    """GET/POST /api/analyze/stream"""
+    if scope['method'] == 'POST':
+        data = await read_json(receive)
+    else:
+        data = dict(parse_qsl(scope['query_string'].decode()))
+    
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')]
+    })
+    with operation_scope('analyze_stream'):
+        async for event, payload in iter_analysis_async(session_data['user_id'], data):
+            chunk = b'event: ' + event.encode() + b'\ndata: ' + dumps(payload) + b'\n\n'
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+# Account discovery
+
+async def refresh_accounts(scope, receive, send, session_data):
+    """GET /accounts/refresh"""
+    user_id = session_data['user_id']
+    
+    with timed('credentials', 'accounts'):
+        credentials = await run_sync(token_manager.get_credentials, user_id)
+    if not credentials:
+        flash(session_data, 'יש להתחבר מחדש לGoogle', 'warning')
+        await send_redirect(send, '/auth/google', session_data)
+        return
+    
+    try:
+        with operation_scope('accounts'):
+            records, _ = await asyncio.gather(
+                list_google_accounts(credentials, transport),
+                # Facebook discovery uses the Graph session, on a worker thread
+                run_sync(refresh_facebook_accounts, user_id)
+            )
+            await run_sync(save_google_accounts, user_id, records)
+        analysis_cache.invalidate_user(user_id)
+        
+        flash(session_data, 'רשימת החשבונות עודכנה בהצלחה', 'success')
+    
+    except Exception as e:
+        log.error(f"Error refreshing accounts: {e}")
+        flash(session_data, 'שגיאה ברענון החשבונות', 'error')
+    
+    await send_redirect(send, '/accounts', session_data)
+
+ASYNC_ROUTES = {
+    ('POST', '/api/analyze'): analyze_data,
+    ('GET', '/api/analyze/stream'): analyze_stream,
+    ('POST', '/api/analyze/stream'): analyze_stream,
+    ('GET', '/accounts/refresh'): refresh_accounts,
+}
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await transport.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    route = ASYNC_ROUTES.get((scope.get('method'), scope.get('path')))
+    if scope['type'] == 'http' and route:
+        session_data = load_session(scope)
+        # Not logged in - let Flask's login_required redirect as usual
+        if 'user_id' in session_data:
+            await route(scope, receive, send, session_data)
+            return
+    
+    await flask_application(scope, receive, send)
@@ -0,0 +1,290 @@
+import asyncio
+import time
+from urllib.parse import quote, urlsplit
+import httpx
+from http_transport import is_retryable, retry_delay, transport_stats
+from ga_quota import quota_scheduler, QuotaDeferred, seconds_to_next_hour
+from analytics import AnalyticsService
+from search_console import SearchConsoleService
+from comparison import get_date_range
+from auth import build_property_records, build_site_records
+from observability import log, timed
+
+# REST roots of the APIs called from the async mode
+ANALYTICS_DATA_URL = 'https://analyticsdata.googleapis.com/v1beta'
+ANALYTICS_ADMIN_URL = 'https://analyticsadmin.googleapis.com/v1beta'
+SEARCH_CONSOLE_URL = 'https://searchconsole.googleapis.com/webmasters/v3'
+
+class GoogleAPIError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+class AsyncGoogleTransport:
+    """
+    Non-blocking HTTP transport for Google REST APIs
+    
+    One httpx.AsyncClient (connection pool) is shared by all requests of the
+    event loop, so hundreds of analyses can wait on Google concurrently
+    without holding a thread each. Credentials must already be fresh - the
+    token manager refreshes them before they are handed over.
+    
+    Retries, backoff and per-host metrics follow the same policy as the
+    synchronous http_transport.
+    """
+    
+    def __init__(self, max_connections=100, timeout_seconds=30, max_retries=4):
+        self.max_connections = max_connections
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self._client = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=self.timeout_seconds
+            )
+        return self._client
+    
+    async def request(self, method, url, credentials, params=None, body=None):
+        """Send an authorized request and return the decoded JSON response"""
+        # Phase 'upstream' of the current operation - retries and backoff included
+        with timed('upstream'):
+            return await self._request(method, url, credentials, params, body)
+    
+    async def _request(self, method, url, credentials, params=None, body=None):
+        host = urlsplit(url).hostname
+        attempt = 0
+        
+        while True:
+            start = time.monotonic()
+            retry_after = None
+            try:
+                response = await self.client.request(
+                    method, url, params=params, json=body,
+                    headers={'Authorization': f'Bearer {credentials.token}'}
+                )
+            except httpx.TransportError:
+                transport_stats.record(host, time.monotonic() - start, None)
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                transport_stats.record(host, time.monotonic() - start, response.status_code)
+                if response.status_code < 400:
+                    return response.json()
+                
+                try:
+                    error_body = response.json()
+                except ValueError:
+                    error_body = None
+                
+                if attempt >= self.max_retries or not is_retryable(response.status_code, error_body):
+                    try:
+                        message = error_body['error']['message']
+                    except Exception:
+                        message = response.text
+                    raise GoogleAPIError(response.status_code, message)
+                retry_after = response.headers.get('Retry-After')
+            
+            delay = retry_delay(attempt, retry_after)
+            transport_stats.record_retry(host)
+            log.warning(f"🔁 Retrying {method} {host} in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class AsyncAnalyticsService(AnalyticsService):
+    """AnalyticsService whose report calls are coroutines on AsyncGoogleTransport"""
+    
+    def __init__(self, credentials, transport):
+        # No googleapiclient client - requests go through the transport
+        self.credentials = credentials
+        self.transport = transport
+    
+    async def run_report(self, property_id, request):
+        """Async version of AnalyticsService.run_report"""
+        wait = quota_scheduler.reserve(property_id)
+        if wait:
+            await asyncio.sleep(wait)
+        
+        try:
+            response = await self.transport.request(
+                'POST', f'{ANALYTICS_DATA_URL}/{property_id}:runReport',
+                self.credentials, body=dict(request, returnPropertyQuota=True)
+            )
+        except GoogleAPIError as e:
+            if e.status_code == 429:
+                quota_scheduler.mark_exhausted(property_id)
+                raise QuotaDeferred(property_id, seconds_to_next_hour(), 'quota exhausted') from e
+            raise
+        
+        quota_scheduler.record(property_id, response.get('propertyQuota'))
+        return response
+    
+    async def get_traffic_quality_data(self, property_id, date_range='30days', comparison=None, sort=None, limit=None):
+        """Async version of AnalyticsService.get_traffic_quality_data"""
+        try:
+            property_id, request, context = self.build_traffic_quality_request(
+                property_id, date_range, comparison, sort, limit
+            )
+            
+            response = await self.run_report(property_id, request)
+            
+            log.info("✅ Analytics API call successful")
+            
+            return self.parse_traffic_quality_response(response, context)
+        
+        except QuotaDeferred as e:
+            log.warning(f"⏳ {e}")
+            return e.to_result()
+        
+        except Exception as e:
+            log.error(f"❌ Error fetching Analytics data: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+class AsyncSearchConsoleService(SearchConsoleService):
+    """SearchConsoleService whose query calls are coroutines on AsyncGoogleTransport"""
+    
+    def __init__(self, credentials, transport):
+        # No googleapiclient client - requests go through the transport
+        self.credentials = credentials
+        self.transport = transport
+    
+    async def query(self, site_url, request):
+        return await self.transport.request(
+            'POST', f'{SEARCH_CONSOLE_URL}/sites/{quote(site_url, safe="")}/searchAnalytics/query',
+            self.credentials, body=request
+        )
+    
+    async def get_top_search_keywords(self, site_url, date_range='30days', comparison=None, sort=None, limit=None):
+        """Async version of SearchConsoleService.get_top_search_keywords"""
+        try:
+            start_date, end_date = get_date_range(date_range)
+            
+            if comparison:
+                return await self.get_keywords_with_comparison(site_url, start_date, end_date, comparison,
+                                                               limit or self.DEFAULT_LIMIT, sort)
+            
+            if sort or limit:
+                return await self.get_ranked_keywords(site_url, start_date, end_date,
+                                                      sort or 'clicks', limit or self.DEFAULT_LIMIT)
+            
+            # Top 20 search keywords
+            request = self.build_search_analytics_request(start_date, end_date, ['query'], 20)
+            
+            log.info(f"🔍 Fetching Search Console data for site: {site_url}")
+            log.info(f"📅 Date range: {start_date} to {end_date}")
+            
+            response = await self.query(site_url, request)
+            
+            log.info("✅ Search Console API call successful")
+            
+            keywords_data = self.score_rows(response.get('rows', []), ['query'])
+            return self.build_result(keywords_data, start_date, end_date)
+        
+        except Exception as e:
+            log.error(f"❌ Error fetching Search Console data: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    async def get_ranked_keywords(self, site_url, start_date, end_date, sort='clicks',
+                                  limit=SearchConsoleService.DEFAULT_LIMIT):
+        """Async version of SearchConsoleService.get_ranked_keywords"""
+        ranker = self.start_keyword_ranking(limit)
+        
+        log.info(f"🔍 Ranking Search Console keywords for site: {site_url} (by {sort}, top {limit})")
+        log.info(f"📅 Date range: {start_date} to {end_date}")
+        
+        async for rows in self.iter_search_analytics_pages(site_url, start_date, end_date, ['query']):
+            self.add_keyword_ranking_rows(ranker, rows)
+        
+        return self.build_ranked_result(ranker, sort, start_date, end_date)
+    
+    async def get_keywords_with_comparison(self, site_url, start_date, end_date, comparison, limit=20, sort=None):
+        """Async version of SearchConsoleService.get_keywords_with_comparison"""
+        state = self.start_keyword_comparison(site_url, start_date, end_date, comparison)
+        
+        for query_start, query_end in state['query_windows']:
+            async for rows in self.iter_search_analytics_pages(site_url, query_start, query_end, ['query', 'date']):
+                self.add_keyword_comparison_rows(state, rows)
+        
+        return self.build_keyword_comparison_result(state, limit, sort)
+    
+    async def iter_search_analytics_pages(self, site_url, start_date, end_date,
+                                          dimensions=None, page_size=SearchConsoleService.MAX_ROW_LIMIT):
+        """Async version of SearchConsoleService.iter_search_analytics_pages"""
+        dimensions = list(dimensions or ['query'])
+        start_row = 0
+        
+        while True:
+            request = self.build_search_analytics_request(start_date, end_date, dimensions,
+                                                          page_size, start_row)
+            response = await self.query(site_url, request)
+            
+            rows = response.get('rows', [])
+            if rows:
+                yield rows
+            
+            if len(rows) < page_size:
+                break
+            start_row += page_size
+
+async def list_analytics_properties(credentials, transport):
+    """Async version of auth.list_analytics_properties - all accounts are listed concurrently"""
+    records = []
+    
+    try:
+        accounts_response = await transport.request('GET', f'{ANALYTICS_ADMIN_URL}/accounts', credentials)
+        accounts = accounts_response.get('accounts', [])
+        
+        responses = await asyncio.gather(*[
+            transport.request('GET', f'{ANALYTICS_ADMIN_URL}/properties', credentials,
+                              params={'filter': f'parent:{account["name"]}'})
+            for account in accounts
+        ], return_exceptions=True)
+        
+        for account, properties_response in zip(accounts, responses):
+            if isinstance(properties_response, Exception):
+                log.error(f"Error fetching properties for account {account['name'].split('/')[-1]}: {properties_response}")
+                continue
+            
+            records.extend(build_property_records(account, properties_response))
+        
+        log.info(f"📊 Found {len(accounts)} Analytics accounts")
+    
+    except Exception as admin_error:
+        log.error(f"Analytics Admin API error: {admin_error}")
+        log.warning("💡 Tip: Enable Analytics Admin API in Google Cloud Console")
+    
+    return records
+
+async def list_search_console_sites(credentials, transport):
+    """Async version of auth.list_search_console_sites"""
+    try:
+        sites = await transport.request('GET', f'{SEARCH_CONSOLE_URL}/sites', credentials)
+        return build_site_records(sites)
+    
+    except Exception as e:
+        log.error(f"Search Console API error: {e}")
+        log.warning("💡 Tip: Check if Search Console API is enabled")
+        return []
+
+async def list_google_accounts(credentials, transport):
+    """Discover Analytics properties and Search Console sites concurrently"""
+    analytics_records, site_records = await asyncio.gather(
+        list_analytics_properties(credentials, transport),
+        list_search_console_sites(credentials, transport)
+    )
+    return analytics_records + site_records
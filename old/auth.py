@@ -2,10 +2,14 @@ from flask import Blueprint, request, redirect, url_for, session, flash, jsonify
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-import requests
+from google_clients import get_google_client
+from http_transport import http_session
+from token_manager import token_manager
+from identity import get_identity
+from observability import log, timed, operation_scope, submit_in_context
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from database import db, User, GoogleToken, FacebookToken, UserAccount
 from config import Config
@@ -105,7 +109,7 @@ def google_callback():
         return redirect(url_for('dashboard'))
         
     except Exception as e:
-        print(f"Google callback error: {e}")
+        log.error(f"Google callback error: {e}")
         flash(f'שגיאה בהתחברות: {str(e)}', 'error')
         return redirect(url_for('login'))
 
@@ -113,7 +117,7 @@ def get_google_user_info(credentials):
     """קבלת פרטי משתמש מ-Google"""
     try:
         # בניית service לקבלת פרטי משתמש
-        service = build('oauth2', 'v2', credentials=credentials)
+        service = get_google_client('oauth2', 'v2', credentials)
         user_info = service.userinfo().get().execute()
         
         return {
@@ -123,7 +127,7 @@ def get_google_user_info(credentials):
             'picture': user_info.get('picture')
         }
     except Exception as e:
-        print(f"Error getting Google user info: {e}")
+        log.error(f"Error getting Google user info: {e}")
         return None
 
 def save_google_tokens(user_id, credentials):
@@ -153,112 +157,149 @@ def save_google_tokens(user_id, credentials):
         
         db.session.add(google_token)
         db.session.commit()
+        token_manager.invalidate(user_id)
         
-        print("✅ Google tokens saved successfully")
-        print(f"📝 Scopes saved: {actual_scopes}")
+        log.info("✅ Google tokens saved successfully")
+        log.info(f"📝 Scopes saved: {actual_scopes}")
         
     except Exception as e:
-        print(f"Error saving Google tokens: {e}")
+        log.error(f"Error saving Google tokens: {e}")
         db.session.rollback()
 
-def fetch_google_accounts(user_id, credentials):
-    """קבלת רשימת חשבונות Google Analytics ו-Search Console"""
+def list_analytics_properties(credentials):
+    """קבלת רשימת properties מכל חשבונות Analytics, במקביל"""
+    records = []
+    
+    # Analytics Admin API לקבלת רשימת properties
+    # (analyticsdata / analyticsreporting לא נדרשים לגילוי חשבונות)
     try:
-        # מחיקת חשבונות Google קיימים
-        UserAccount.query.filter_by(user_id=user_id).filter(
-            UserAccount.account_type.in_(['google_analytics', 'search_console'])
-        ).delete()
-        
-        # Google Analytics - קבלת רשימת חשבונות
-        try:
-            # Analytics Data API v1 - החדש יותר
-            from googleapiclient.discovery import build
-            analytics = build('analyticsdata', 'v1beta', credentials=credentials)
-            
-            # או Analytics Reporting API v4 - הישן יותר אבל יציב
-            analytics_reporting = build('analyticsreporting', 'v4', credentials=credentials)
+        analytics_admin = get_google_client('analyticsadmin', 'v1beta', credentials)
+        
+        # קבלת רשימת accounts
+        accounts_response = analytics_admin.accounts().list().execute()
+        accounts = accounts_response.get('accounts', [])
+        
+        def list_account_properties(account):
+            # ה-transport המשותף thread-safe - אותו client לכל ה-workers
+            return analytics_admin.properties().list(
+                filter=f'parent:{account["name"]}'
+            ).execute()
+        
+        # קבלת properties לכל חשבון במקביל
+        with ThreadPoolExecutor(max_workers=Config.GOOGLE_DISCOVERY_MAX_WORKERS) as executor:
+            futures = [(account, submit_in_context(executor, list_account_properties, account)) for account in accounts]
             
-            # ננסה גם Analytics Admin API לקבלת רשימת properties
-            try:
-                analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
-                
-                # קבלת רשימת accounts
-                accounts_response = analytics_admin.accounts().list().execute()
+            for account, future in futures:
+                try:
+                    properties_response = future.result()
+                except Exception as prop_error:
+                    log.error(f"Error fetching properties for account {account['name'].split('/')[-1]}: {prop_error}")
+                    continue
                 
-                for account in accounts_response.get('accounts', []):
-                    account_id = account['name'].split('/')[-1]  # לקבל רק את המספר
-                    
-                    # קבלת properties לחשבון הזה
-                    try:
-                        properties_response = analytics_admin.properties().list(
-                            filter=f'parent:{account["name"]}'
-                        ).execute()
-                        
-                        for property_data in properties_response.get('properties', []):
-                            property_id = property_data['name'].split('/')[-1]
-                            website_url = property_data.get('websiteUrl', '')
-                            display_name = property_data.get('displayName', f'Property {property_id}')
-                            
-                            account_record = UserAccount(
-                                user_id=user_id,
-                                account_type='google_analytics',
-                                account_id=property_id,
-                                account_name=f"{display_name} ({account.get('displayName', 'Unknown Account')})",
-                                website_url=website_url,
-                                is_active=False  # משתמש יבחר מה לחבר
-                            )
-                            db.session.add(account_record)
-                            
-                    except Exception as prop_error:
-                        print(f"Error fetching properties for account {account_id}: {prop_error}")
-                        continue
-                        
-                print(f"📊 Found {len(accounts_response.get('accounts', []))} Analytics accounts")
-                
-            except Exception as admin_error:
-                print(f"Analytics Admin API error: {admin_error}")
-                print("💡 Tip: Enable Analytics Admin API in Google Cloud Console")
-                # לא נוסיף חשבון דמו - נתן למשתמש לדעת מה הבעיה
-                
-        except Exception as e:
-            print(f"Analytics API error: {e}")
+                records.extend(build_property_records(account, properties_response))
+        
+        log.info(f"📊 Found {len(accounts)} Analytics accounts")
+        
+    except Exception as admin_error:
+        log.error(f"Analytics Admin API error: {admin_error}")
+        log.warning("💡 Tip: Enable Analytics Admin API in Google Cloud Console")
+        # לא נוסיף חשבון דמו - נתן למשתמש לדעת מה הבעיה
+    
+    return records
+
+def list_search_console_sites(credentials):
+    """קבלת רשימת אתרי Search Console"""
+    records = []
+    
+    try:
+        search_console = get_google_client('searchconsole', 'v1', credentials)
         
-        # Google Search Console  
-        try:
-            search_console = build('searchconsole', 'v1', credentials=credentials)
-            print("🔍 Search Console service created successfully")
+        sites = search_console.sites().list().execute()
+        records = build_site_records(sites)
+        
+    except Exception as e:
+        log.error(f"Search Console API error: {e}")
+        log.error(f"Error type: {type(e)}")
+        log.warning("💡 Tip: Check if Search Console API is enabled")
+    
+    return records
+
+def build_property_records(account, properties_response):
+    """רשומות UserAccount מתשובת properties.list של חשבון Analytics"""
+    records = []
+    
+    with timed('parse'):
+        for property_data in properties_response.get('properties', []):
+            property_id = property_data['name'].split('/')[-1]  # לקבל רק את המספר
+            display_name = property_data.get('displayName', f'Property {property_id}')
             
-            sites = search_console.sites().list().execute()
-            print(f"📋 Search Console response: {sites}")
+            records.append({
+                'account_type': 'google_analytics',
+                'account_id': property_id,
+                'account_name': f"{display_name} ({account.get('displayName', 'Unknown Account')})",
+                'website_url': property_data.get('websiteUrl', '')
+            })
+    
+    return records
+
+def build_site_records(sites_response):
+    """רשומות UserAccount מתשובת sites.list של Search Console"""
+    records = []
+    
+    site_entries = sites_response.get('siteEntry', [])
+    log.info(f"📈 Found {len(site_entries)} Search Console sites")
+    
+    with timed('parse'):
+        for site in site_entries:
+            site_url = site['siteUrl']
+            permission_level = site.get('permissionLevel', 'unknown')
             
-            site_entries = sites.get('siteEntry', [])
-            print(f"📈 Found {len(site_entries)} Search Console sites")
+            log.info(f"  - Site: {site_url}, Permission: {permission_level}")
             
-            for site in site_entries:
-                site_url = site['siteUrl']
-                permission_level = site.get('permissionLevel', 'unknown')
-                
-                print(f"  - Site: {site_url}, Permission: {permission_level}")
-                
-                account = UserAccount(
+            records.append({
+                'account_type': 'search_console',
+                'account_id': site_url,
+                'account_name': f"{site_url} ({permission_level})",
+                'website_url': site_url
+            })
+    
+    return records
+
+def fetch_google_accounts(user_id, credentials):
+    """
+    קבלת רשימת חשבונות Google Analytics ו-Search Console
+    
+    נמדד כ-operation 'accounts' ב-/metrics: client_build, upstream, parse, db
+    """
+    with operation_scope('accounts'):
+        # גילוי Analytics ו-Search Console במקביל
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            analytics_future = submit_in_context(executor, list_analytics_properties, credentials)
+            search_console_future = submit_in_context(executor, list_search_console_sites, credentials)
+            records = analytics_future.result() + search_console_future.result()
+        
+        save_google_accounts(user_id, records)
+
+def save_google_accounts(user_id, records):
+    """החלפת חשבונות Google של המשתמש ברשומות שנמצאו בגילוי"""
+    try:
+        with timed('db'):
+            # מחיקת חשבונות Google קיימים - רק אחרי שהגילוי הסתיים
+            UserAccount.query.filter_by(user_id=user_id).filter(
+                UserAccount.account_type.in_(['google_analytics', 'search_console'])
+            ).delete()
+            
+            for record in records:
+                db.session.add(UserAccount(
                     user_id=user_id,
-                    account_type='search_console',
-                    account_id=site_url,
-                    account_name=f"{site_url} ({permission_level})",
-                    website_url=site_url,
-                    is_active=False  # משתמש יבחר מה לחבר
-                )
-                db.session.add(account)
+                    is_active=False,  # משתמש יבחר מה לחבר
+                    **record
+                ))
             
-        except Exception as e:
-            print(f"Search Console API error: {e}")
-            print(f"Error type: {type(e)}")
-            print("💡 Tip: Check if Search Console API is enabled")
-        
-        db.session.commit()
+            db.session.commit()
         
     except Exception as e:
-        print(f"Error fetching Google accounts: {e}")
+        log.error(f"Error saving Google accounts: {e}")
         db.session.rollback()
 
 # Facebook OAuth
@@ -310,7 +351,7 @@ def facebook_callback():
             f"code={code}"
         )
         
-        response = requests.get(token_url)
+        response = http_session.get(token_url)
         token_data = response.json()
         
         if 'error' in token_data:
@@ -326,14 +367,15 @@ def facebook_callback():
         
         user_id = session['user_id']
         
-        # שמירת Facebook token
+        # שמירת Facebook token וקבלת רשימת חשבונות המודעות
         save_facebook_token(user_id, access_token, token_data)
+        fetch_facebook_accounts(user_id, access_token)
         
         flash('התחברת בהצלחה לפייסבוק Ads!', 'success')
         return redirect(url_for('dashboard'))
         
     except Exception as e:
-        print(f"Facebook callback error: {e}")
+        log.error(f"Facebook callback error: {e}")
         flash(f'שגיאה בהתחברות לפייסבוק: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
 
@@ -359,12 +401,50 @@ def save_facebook_token(user_id, access_token, token_data):
         db.session.add(facebook_token)
         db.session.commit()
         
-        print("✅ Facebook token saved successfully")
+        log.info("✅ Facebook token saved successfully")
         
     except Exception as e:
-        print(f"Error saving Facebook token: {e}")
+        log.error(f"Error saving Facebook token: {e}")
         db.session.rollback()
 
+def fetch_facebook_accounts(user_id, access_token):
+    """קבלת רשימת חשבונות מודעות מ-Facebook"""
+    try:
+        from facebook_ads import FacebookAdsService
+        
+        records = []
+        for ad_account in FacebookAdsService(access_token).list_ad_accounts():
+            records.append({
+                'account_type': 'facebook_ads',
+                'account_id': ad_account['account_id'],
+                'account_name': f"{ad_account.get('name', ad_account['account_id'])} ({ad_account.get('currency', '')})",
+                'website_url': ''
+            })
+        
+        log.info(f"📣 Found {len(records)} Facebook ad accounts")
+        
+        # מחיקת חשבונות מודעות קיימים - רק אחרי שהגילוי הסתיים
+        UserAccount.query.filter_by(user_id=user_id, account_type='facebook_ads').delete()
+        
+        for record in records:
+            db.session.add(UserAccount(
+                user_id=user_id,
+                is_active=False,  # משתמש יבחר מה לחבר
+                **record
+            ))
+        
+        db.session.commit()
+        
+    except Exception as e:
+        log.error(f"Facebook Ads API error: {e}")
+        db.session.rollback()
+
+def refresh_facebook_accounts(user_id):
+    """רענון חשבונות המודעות אם יש Facebook token בתוקף"""
+    facebook_token = FacebookToken.query.filter_by(user_id=user_id).first()
+    if facebook_token and not facebook_token.is_expired():
+        fetch_facebook_accounts(user_id, facebook_token.access_token)
+
 def create_or_update_user(user_info, provider):
     """יצירת או עדכון משתמש"""
     try:
@@ -390,7 +470,7 @@ def create_or_update_user(user_info, provider):
         return user
         
     except Exception as e:
-        print(f"Error creating/updating user: {e}")
+        log.error(f"Error creating/updating user: {e}")
         db.session.rollback()
         return None
 
@@ -409,23 +489,17 @@ def auth_status():
     
     user_id = session['user_id']
     
-    # בדיקת Google tokens
-    google_token = GoogleToken.query.filter_by(user_id=user_id).first()
-    google_connected = google_token is not None and not google_token.is_expired()
-    
-    # בדיקת Facebook tokens
-    facebook_token = FacebookToken.query.filter_by(user_id=user_id).first() 
-    facebook_connected = facebook_token is not None and not facebook_token.is_expired()
-    
-    # קבלת חשבונות
-    accounts = UserAccount.query.filter_by(user_id=user_id, is_active=True).all()
+    # משתמש, tokens וחשבונות - בשאילתה אחת
+    identity = get_identity()
+    if not identity:
+        return jsonify({'authenticated': False})
     
     return jsonify({
         'authenticated': True,
         'user_id': user_id,
         'user_email': session.get('user_email'),
         'user_name': session.get('user_name'),
-        'google_connected': google_connected,
-        'facebook_connected': facebook_connected,
-        'accounts': [acc.to_dict() for acc in accounts]
+        'google_connected': identity.google_connected,
+        'facebook_connected': identity.facebook_connected,
+        'accounts': [acc.to_dict() for acc in identity.active_accounts]
     })
\ No newline at end of file
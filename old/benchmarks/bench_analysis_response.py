@@ -0,0 +1,97 @@
+"""
+Bytes on the wire and serialization time of a 50k-keyword search-keywords response
+
+    python benchmarks/bench_analysis_response.py [keywords] [iterations]
+
+The keywords are scored by SearchConsoleService.score_rows into a
+KeywordReport, wrapped like an /api/analyze payload, then encoded the way
+Flask's jsonify did (row dicts through stdlib json, ASCII escaped) and the
+way json_response.build_response does (orjson when installed, then gzip or
+brotli per Accept-Encoding). No network calls are made.
+"""
+from datetime import date, datetime, timedelta
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.oauth2.credentials import Credentials
+from search_console import SearchConsoleService
+from json_response import build_response, orjson, brotli
+
+def search_console_rows(count):
+    """Raw searchAnalytics.query rows with Search Console's value shapes (clicks / impressions as numbers)"""
+    random.seed(22)
+    rows = []
+    for i in range(count):
+        impressions = random.randint(10, 20000)
+        clicks = random.randint(0, impressions // 5)
+        rows.append({
+            'keys': [f'מילת חיפוש {i} keyword {i % 997}'],
+            'clicks': clicks,
+            'impressions': impressions,
+            'ctr': clicks / impressions,
+            'position': random.uniform(1, 60)
+        })
+    return rows
+
+def analysis_payload(count):
+    service = SearchConsoleService(Credentials(token='benchmark', expiry=datetime.utcnow() + timedelta(hours=1)))
+    keywords = service.score_rows(search_console_rows(count), ['query'])
+    result = service.build_result(keywords, date(2026, 9, 1), date(2026, 9, 30))
+    return {
+        'success': True,
+        'results': {
+            'keywords': result['keywords'],
+            'summary': result['summary'],
+            'date_range': result['date_range'],
+            'ai_insights': '<strong>תובנות מרכזיות</strong>',
+            'recommendations': '<strong>המלצות SEO</strong>'
+        },
+        'cache': 'miss',
+        'computed_at': datetime.utcnow().isoformat()
+    }
+
+def jsonify_body(payload):
+    """What Flask's jsonify sent: the report as a list of row dicts, stdlib json, ASCII escaped"""
+    results = dict(payload['results'], keywords=payload['results']['keywords'].to_list())
+    return json.dumps(dict(payload, results=results), ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+def median_ms(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+def main(count=50000, iterations=5):
+    payload = analysis_payload(count)
+    print(f"{count} keywords, median of {iterations} runs (orjson {'on' if orjson else 'off'}, "
+          f"brotli {'on' if brotli else 'off'})")
+    print(f"{'encoding':<34} {'time':>10} {'bytes':>12}")
+    
+    elapsed, _ = median_ms(payload['results']['keywords'].to_list, iterations)
+    print(f"{'row dicts only (in both below)':<34} {elapsed:>8.1f}ms {'-':>12}")
+    
+    elapsed, body = median_ms(lambda: jsonify_body(payload), iterations)
+    print(f"{'jsonify (before)':<34} {elapsed:>8.1f}ms {len(body):>12,}")
+    
+    for name, accept_encoding in [('build_response, identity', None),
+                                  ('build_response, gzip', 'gzip'),
+                                  ('build_response, br', 'br, gzip')]:
+        elapsed, (status, body, headers) = median_ms(lambda: build_response(payload, accept_encoding), iterations)
+        print(f"{name:<34} {elapsed:>8.1f}ms {len(body):>12,}")
+    
+    etag = dict(headers)['ETag']
+    elapsed, (status, body, headers) = median_ms(lambda: build_response(payload, 'br, gzip', etag), iterations)
+    print(f"{'build_response, If-None-Match hit':<34} {elapsed:>8.1f}ms {len(body):>12,}  ({status})")
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    main(*arguments)
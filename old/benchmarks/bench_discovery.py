@@ -0,0 +1,50 @@
+"""
+Client build latency per analysis: googleapiclient build() vs the shared discovery pool
+
+    python benchmarks/bench_discovery.py [iterations]
+
+build() parses the service's discovery document on every call;
+client_pool.get_client parses it once per process and only binds the
+user's credentials. No network calls are made.
+"""
+from datetime import datetime, timedelta
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+from google_clients import client_pool, GOOGLE_SERVICES
+
+# Google clients built by one analysis of each action
+ANALYSIS_CLIENTS = {
+    'traffic-quality': [('analyticsdata', 'v1beta')],
+    'search-keywords': [('searchconsole', 'v1')],
+    'accounts refresh': [('analyticsadmin', 'v1beta'), ('searchconsole', 'v1')],
+}
+
+def median_ms(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main(iterations=20):
+    credentials = Credentials(token='benchmark', expiry=datetime.utcnow() + timedelta(hours=1))
+    client_pool.warm_up(GOOGLE_SERVICES)
+    
+    print(f"{'analysis':<18} {'build()':>10} {'pooled':>10} {'saved':>10}")
+    for analysis, services in ANALYSIS_CLIENTS.items():
+        built = median_ms(lambda: [build(name, version, credentials=credentials, cache_discovery=False)
+                                   for name, version in services], iterations)
+        pooled = median_ms(lambda: [client_pool.get_client(name, version, credentials)
+                                    for name, version in services], iterations)
+        print(f"{analysis:<18} {built:>8.2f}ms {pooled:>8.2f}ms {built - pooled:>8.2f}ms")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,145 @@
+"""
+Concurrent reads and writes on one SQLite file: default rollback journal vs the app's WAL setup
+
+    python benchmarks/bench_sqlite_concurrency.py [seconds] [readers] [writers]
+
+Every reader and writer is its own process, like gunicorn workers sharing
+dtv3.db. Readers run the dashboard identity query and a 30 day traffic
+aggregation over the local analytics store; writers replace one stored day
+of daily metrics per transaction, like metrics_store.store_ranges. The WAL
+run uses config.get_engine_options and database.configure_sqlite.
+"""
+from datetime import date, timedelta
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config, get_engine_options
+from database import db, configure_sqlite, User, UserAccount, AnalyticsDailyMetric
+
+PROPERTY_ID = '1'
+SOURCES = 200
+DAYS = 90
+LAST_DAY = date(2026, 1, 31)
+
+users = User.__table__
+accounts = UserAccount.__table__
+metrics = AnalyticsDailyMetric.__table__
+
+def make_engine(path, wal):
+    uri = f'sqlite:///{path}'
+    if not wal:
+        return create_engine(uri)
+    
+    engine = create_engine(uri, **get_engine_options(uri))
+    configure_sqlite(engine, Config.SQLITE_SYNCHRONOUS)
+    return engine
+
+def daily_rows(day):
+    return [{
+        'property_id': PROPERTY_ID, 'date': day, 'channel_group': 'Organic Search',
+        'source_medium': f'source{source} / organic', 'sessions': source + 1, 'users': source + 1,
+        'bounced_sessions': 0.5, 'session_duration': 60.0, 'page_views': 2.0, 'conversions': 0.0
+    } for source in range(SOURCES)]
+
+def seed(path, wal):
+    engine = make_engine(path, wal)
+    db.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(users.insert(), [{'id': 1, 'email': 'bench@example.com', 'name': 'Bench'}])
+        connection.execute(accounts.insert(), [
+            {'user_id': 1, 'account_type': 'google_analytics', 'account_id': str(i),
+             'account_name': f'Account {i}', 'is_active': True}
+            for i in range(30)
+        ])
+        for offset in range(DAYS):
+            connection.execute(metrics.insert(), daily_rows(LAST_DAY - timedelta(days=offset)))
+    engine.dispose()
+
+def read(connection):
+    connection.execute(select(users, accounts).outerjoin(accounts, accounts.c.user_id == users.c.id)
+                       .where(users.c.id == 1)).fetchall()
+    sessions = func.sum(metrics.c.sessions)
+    connection.execute(
+        select(metrics.c.source_medium, sessions)
+        .where(metrics.c.property_id == PROPERTY_ID,
+               metrics.c.date >= LAST_DAY - timedelta(days=29), metrics.c.date <= LAST_DAY)
+        .group_by(metrics.c.source_medium).order_by(sessions.desc()).limit(10)
+    ).fetchall()
+
+def write(connection, day):
+    connection.execute(metrics.delete().where(metrics.c.property_id == PROPERTY_ID, metrics.c.date == day))
+    connection.execute(metrics.insert(), daily_rows(day))
+
+def run_worker(path, wal, role, seconds, start_event, results):
+    engine = make_engine(path, wal)
+    latencies = []
+    locked = 0
+    
+    start_event.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                if role == 'read':
+                    read(connection)
+                else:
+                    write(connection, LAST_DAY - timedelta(days=len(latencies) % DAYS))
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            locked += 1
+    
+    engine.dispose()
+    results.put((role, latencies, locked))
+
+def run_mode(wal, seconds, readers, writers):
+    directory = tempfile.mkdtemp(prefix='dtv3-bench-')
+    path = os.path.join(directory, 'bench.db')
+    seed(path, wal)
+    
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    roles = ['read'] * readers + ['write'] * writers
+    processes = [multiprocessing.Process(target=run_worker, args=(path, wal, role, seconds, start_event, results))
+                 for role in roles]
+    for process in processes:
+        process.start()
+    start_event.set()
+    
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    
+    summary = {}
+    for role in ('read', 'write'):
+        latencies = sorted(latency for r, values, _ in collected if r == role for latency in values)
+        summary[role] = {
+            'per_second': len(latencies) / seconds,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+            'locked': sum(locked for r, _, locked in collected if r == role)
+        }
+    return summary
+
+def main(seconds=5, readers=6, writers=2):
+    print(f"{readers} reader and {writers} writer processes, {seconds}s per mode, "
+          f"{SOURCES * DAYS} stored rows")
+    print(f"{'mode':<18} {'reads/s':>9} {'read p50':>10} {'read p99':>10} {'writes/s':>9} "
+          f"{'write p99':>10} {'locked':>7}")
+    for name, wal in [('rollback journal', False), ('WAL', True)]:
+        summary = run_mode(wal, seconds, readers, writers)
+        reads, writes = summary['read'], summary['write']
+        print(f"{name:<18} {reads['per_second']:>9.0f} {reads['p50_ms']:>8.2f}ms {reads['p99_ms']:>8.2f}ms "
+              f"{writes['per_second']:>9.0f} {writes['p99_ms']:>8.2f}ms {reads['locked'] + writes['locked']:>7}")
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    main(*arguments)
@@ -0,0 +1,165 @@
+"""
+Many concurrent /api/analyze/stream clients against one worker with a fixed thread pool
+
+    python benchmarks/load_sse_streams.py [streams] [threads]
+
+The app is served by a WSGI server with `threads` request threads, like one
+gunicorn gthread worker (Procfile: --threads 16). `streams` clients open
+traffic-quality SSE streams at once - every Google call answers after
+GOOGLE_LATENCY_SECONDS from a local fake - while another client keeps
+calling a regular endpoint. Run once with ANALYZE_STREAM_MAX_CONCURRENT and
+once without a limit: with the limit, extra streams get 503 right away and
+regular requests keep their latency; without it, streams take every
+thread and regular requests wait behind them.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Throwaway database, GA answered directly (no local store), no background threads or info logs
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='dtv3-load-'), 'load.db')
+os.environ['ANALYTICS_USE_LOCAL_STORE'] = 'false'
+os.environ['ANALYSIS_PREWARM_ENABLED'] = 'false'
+os.environ['GOOGLE_TOKEN_BACKGROUND_REFRESH'] = 'false'
+os.environ['LOG_LEVEL'] = 'WARNING'
+
+import requests
+from google.oauth2.credentials import Credentials
+import app as app_module
+from database import db, User, UserAccount
+
+GOOGLE_LATENCY_SECONDS = 0.5
+REGULAR_PATH = '/api/transport/stats'
+
+class PooledWSGIServer(WSGIServer):
+    """wsgiref server that handles requests on a fixed pool of threads, like a gunicorn gthread worker"""
+    
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+    
+    def process_request(self, request, client_address):
+        self.pool.submit(self.handle_in_thread, request, client_address)
+    
+    def handle_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def fake_google_request(self, method, url, *args, **kwargs):
+    """Every outbound call answers after GOOGLE_LATENCY_SECONDS with a small GA report"""
+    time.sleep(GOOGLE_LATENCY_SECONDS)
+    rows = [{
+        'dimensionValues': [{'value': 'Organic Search'}, {'value': f'source{i} / organic'}],
+        'metricValues': [{'value': str(100 + i)}, {'value': '50'}, {'value': '0.4'},
+                         {'value': '120'}, {'value': '3'}, {'value': '2'}]
+    } for i in range(20)]
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({'rows': rows, 'rowCount': len(rows)}).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.url = url
+    return response
+
+def seed(streams):
+    with app_module.app.app_context():
+        db.session.add(User(id=1, email='load@example.com', name='Load'))
+        db.session.add_all([
+            UserAccount(user_id=1, account_type='google_analytics', account_id=str(1000 + i),
+                        account_name=f'Property {i}', is_active=True)
+            for i in range(streams)
+        ])
+        db.session.commit()
+
+def session_cookie():
+    client = app_module.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    return client.get_cookie('session').value
+
+def get(url, cookie):
+    request = urllib.request.Request(url, headers={'Cookie': f'session={cookie}'})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def run(base_url, cookie, streams, stream_limit):
+    app_module.analysis_stream_slots = threading.BoundedSemaphore(stream_limit)
+    app_module.analysis_cache.clear()
+    outcomes = []
+    regular = []
+    done = threading.Event()
+    
+    def open_stream(i):
+        status, body = get(f'{base_url}/api/analyze/stream?action_id=traffic-quality'
+                           f'&analyticsAccount={1000 + i}&dateRange=30days', cookie)
+        outcomes.append('completed' if status == 200 and b'event: done' in body else str(status))
+    
+    def poll_regular():
+        while not done.is_set():
+            started = time.perf_counter()
+            get(base_url + REGULAR_PATH, cookie)
+            regular.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.05)
+    
+    poller = threading.Thread(target=poll_regular)
+    clients = [threading.Thread(target=open_stream, args=(i,)) for i in range(streams)]
+    started = time.perf_counter()
+    poller.start()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    poller.join()
+    
+    return Counter(outcomes), regular, elapsed
+
+def main(streams=40, threads=16):
+    requests.Session.request = fake_google_request
+    credentials = Credentials(token='load', expiry=datetime.utcnow() + timedelta(hours=1))
+    app_module.token_manager.get_credentials = lambda user_id: credentials
+    seed(streams)
+    cookie = session_cookie()
+    
+    server = PooledWSGIServer(('127.0.0.1', 0), threads)
+    server.set_app(app_module.app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    
+    limit = app_module.app.config['ANALYZE_STREAM_MAX_CONCURRENT']
+    print(f"{streams} concurrent streams, {threads} request threads, Google latency {GOOGLE_LATENCY_SECONDS}s")
+    print(f"{'stream limit':<14} {'streams':<28} {'regular p50':>12} {'regular max':>12} {'wall':>7}")
+    for name, stream_limit in [(str(limit), limit), ('none', streams)]:
+        outcomes, regular, elapsed = run(base_url, cookie, streams, stream_limit)
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
+        print(f"{name:<14} {summary:<28} {statistics.median(regular):>10.1f}ms {max(regular):>10.1f}ms "
+              f"{elapsed:>6.1f}s")
+    
+    server.shutdown()
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    main(*arguments)
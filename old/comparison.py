@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+COMPARISON_TYPES = ['previous', 'year']
+
+# Date range keys of the action pages - anything else is the 30-day default
+DATE_RANGE_DAYS = {'7days': 7, '30days': 30, '90days': 90}
+
+def get_date_range(date_range='30days', today=None):
+    """Translate a date range key to (start_date, end_date) - shared by every service"""
+    end_date = today or datetime.now().date()
+    return end_date - timedelta(days=DATE_RANGE_DAYS.get(date_range, 30)), end_date
+
+def get_comparison_range(start_date, end_date, comparison):
+    """
+    Calculate the comparison window for a date range
+    
+    'previous' - the window of the same length right before start_date
+    'year'     - the same dates one year earlier
+    """
+    if comparison == 'previous':
+        previous_end = start_date - timedelta(days=1)
+        return previous_end - (end_date - start_date), previous_end
+    
+    if comparison == 'year':
+        return shift_year(start_date), shift_year(end_date)
+    
+    raise ValueError(f"Unsupported comparison: {comparison}")
+
+def get_query_windows(start_date, end_date, previous_start, previous_end):
+    """
+    Date windows to request for a period and its comparison period
+    
+    One window when the periods touch or overlap ('previous'), otherwise
+    one per period - a 'year' comparison never fetches the days in between.
+    """
+    (first_start, first_end), (second_start, second_end) = sorted([
+        (previous_start, previous_end), (start_date, end_date)
+    ])
+    if second_start <= first_end + timedelta(days=1):
+        return [(first_start, max(first_end, second_end))]
+    return [(first_start, first_end), (second_start, second_end)]
+
+def shift_year(day):
+    """Same day one year earlier (Feb 29 becomes Feb 28)"""
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        return day.replace(year=day.year - 1, day=28)
+
+def format_date_range(start_date, end_date):
+    return {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d')
+    }
+
+def attach_comparison(rows, previous_by_key, key_fields, metrics):
+    """
+    Add a 'comparison' dict with per-metric deltas to each row
+    
+    previous_by_key maps a tuple of key_fields values to the matching row of
+    the comparison period. Rows without a previous match are compared to 0.
+    rows is a list of dicts or a columnar report (reports.py), which keeps
+    the comparisons as a column.
+    """
+    comparisons = []
+    
+    for row in rows:
+        previous = previous_by_key.get(tuple(row[field] for field in key_fields), {})
+        comparison = {}
+        
+        for metric in metrics:
+            current_value = row[metric]
+            previous_value = previous.get(metric, 0)
+            change = current_value - previous_value
+            comparison[metric] = {
+                'previous': previous_value,
+                'change': round(change, 2),
+                'change_percent': round(change / previous_value * 100, 1) if previous_value else None
+            }
+        
+        comparisons.append(comparison)
+    
+    if isinstance(rows, list):
+        for row, comparison in zip(rows, comparisons):
+            row['comparison'] = comparison
+    else:
+        rows.comparison = comparisons
+    
+    return rows
@@ -3,18 +3,110 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def get_database_uri():
+    """Database URI from DATABASE_URL (default: local SQLite)"""
+    uri = os.environ.get('DATABASE_URL') or 'sqlite:///dtv3.db'
+    # Heroku style URLs
+    if uri.startswith('postgres://'):
+        uri = uri.replace('postgres://', 'postgresql://', 1)
+    return uri
+
+def get_engine_options(uri):
+    """Connection pool settings - SQLite gets a busy timeout, servers get a sized pool"""
+    if uri.startswith('sqlite'):
+        return {
+            'connect_args': {
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 30)),
+                'check_same_thread': False
+            }
+        }
+    
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
 class Config:
     # Flask
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     
     # Database
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///dtv3.db'
+    SQLALCHEMY_DATABASE_URI = get_database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # WAL + NORMAL is safe and fast
+    
+    # Local analytics store
+    ANALYTICS_USE_LOCAL_STORE = os.environ.get('ANALYTICS_USE_LOCAL_STORE', 'true').lower() == 'true'
+    ANALYTICS_SETTLE_DAYS = int(os.environ.get('ANALYTICS_SETTLE_DAYS', 3))  # GA data settles late
+    ANALYTICS_RESYNC_MINUTES = int(os.environ.get('ANALYTICS_RESYNC_MINUTES', 60))
+    ANALYTICS_FANOUT_MAX_WORKERS = int(os.environ.get('ANALYTICS_FANOUT_MAX_WORKERS', 8))  # properties fetched at once
+    
+    # /api/analyze result cache
+    ANALYZE_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYZE_CACHE_MAX_ENTRIES', 256))
+    ANALYZE_CACHE_TTL_SECONDS = int(os.environ.get('ANALYZE_CACHE_TTL_SECONDS', 300))
+    ANALYZE_MAX_LIMIT = int(os.environ.get('ANALYZE_MAX_LIMIT', 1000))  # largest 'limit' of a ranked analysis
+    
+    # Off-peak pre-warming of traffic-quality / search-keywords (prewarm.py)
+    ANALYSIS_PREWARM_ENABLED = os.environ.get('ANALYSIS_PREWARM_ENABLED', 'true').lower() == 'true'
+    ANALYSIS_PREWARM_HOURS = os.environ.get('ANALYSIS_PREWARM_HOURS', '2-5')  # UTC, start inclusive - end exclusive
+    ANALYSIS_PREWARM_DATE_RANGE = os.environ.get('ANALYSIS_PREWARM_DATE_RANGE', '30days')  # action page defaults
+    ANALYSIS_PREWARM_COMPARISON = os.environ.get('ANALYSIS_PREWARM_COMPARISON', 'previous')
+    ANALYSIS_PREWARM_MAX_WORKERS = int(os.environ.get('ANALYSIS_PREWARM_MAX_WORKERS', 4))  # analyses at once, all users
+    ANALYSIS_PREWARM_MAX_PER_USER = int(os.environ.get('ANALYSIS_PREWARM_MAX_PER_USER', 1))  # analyses at once per user
+    ANALYSIS_PREWARM_MAX_AGE_HOURS = int(os.environ.get('ANALYSIS_PREWARM_MAX_AGE_HOURS', 26))  # served until then
+    ANALYSIS_PREWARM_CHECK_INTERVAL_SECONDS = int(os.environ.get('ANALYSIS_PREWARM_CHECK_INTERVAL_SECONDS', 300))
+    
+    # Parquet export of daily metrics (flask export-metrics, metrics_export.py)
+    METRICS_EXPORT_DIR = os.environ.get('METRICS_EXPORT_DIR', 'exports')
+    
+    # Observability - phase histograms at /metrics and the queued 'dtv3' logger (observability.py)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, /metrics requires "Authorization: Bearer <token>"
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))  # share of INFO/DEBUG records kept; warnings always are
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))  # records beyond it are dropped, never waited for
+    
+    # Background analysis jobs (/api/analyze/jobs)
+    ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+    ANALYSIS_JOB_MAX_PENDING = int(os.environ.get('ANALYSIS_JOB_MAX_PENDING', 100))
+    ANALYSIS_JOB_TTL_SECONDS = int(os.environ.get('ANALYSIS_JOB_TTL_SECONDS', 600))
+    
+    # Server-Sent Events streams (/api/analyze/stream) per process - keep below
+    # the gunicorn thread count so regular requests always have a free thread
+    ANALYZE_STREAM_MAX_CONCURRENT = int(os.environ.get('ANALYZE_STREAM_MAX_CONCURRENT', 8))
     
     # Google OAuth
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
     GOOGLE_REDIRECT_URI = os.environ.get('GOOGLE_REDIRECT_URI') or 'http://localhost:8080/auth/google/callback'
+    GOOGLE_DISCOVERY_MAX_WORKERS = int(os.environ.get('GOOGLE_DISCOVERY_MAX_WORKERS', 8))
+    
+    # Google token refresh
+    GOOGLE_TOKEN_BACKGROUND_REFRESH = os.environ.get('GOOGLE_TOKEN_BACKGROUND_REFRESH', 'true').lower() == 'true'
+    GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get('GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS', 300))
+    GOOGLE_TOKEN_REFRESH_INTERVAL_SECONDS = int(os.environ.get('GOOGLE_TOKEN_REFRESH_INTERVAL_SECONDS', 60))
+    GOOGLE_TOKEN_REFRESH_CLAIM_SECONDS = int(os.environ.get('GOOGLE_TOKEN_REFRESH_CLAIM_SECONDS', 30))  # one worker refreshes a token
+    
+    # Outbound HTTP (Google / Facebook) - shared pool, retry and backoff
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 20))  # connections per host
+    HTTP_TIMEOUT_SECONDS = int(os.environ.get('HTTP_TIMEOUT_SECONDS', 30))
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 4))
+    HTTP_BACKOFF_BASE_SECONDS = float(os.environ.get('HTTP_BACKOFF_BASE_SECONDS', 0.5))
+    HTTP_BACKOFF_MAX_SECONDS = float(os.environ.get('HTTP_BACKOFF_MAX_SECONDS', 30))
+    
+    # GA4 Data API property quota - per-property token bucket for runReport
+    GA4_REQUESTS_PER_SECOND = float(os.environ.get('GA4_REQUESTS_PER_SECOND', 1.0))
+    GA4_REQUEST_BURST = int(os.environ.get('GA4_REQUEST_BURST', 10))  # GA4 allows 10 concurrent requests per property
+    GA4_QUOTA_HOURLY_RESERVE = int(os.environ.get('GA4_QUOTA_HOURLY_RESERVE', 500))  # tokens kept free per hour
+    GA4_QUOTA_DAILY_RESERVE = int(os.environ.get('GA4_QUOTA_DAILY_RESERVE', 2000))  # tokens kept free per day
+    GA4_QUOTA_MAX_WAIT_SECONDS = float(os.environ.get('GA4_QUOTA_MAX_WAIT_SECONDS', 5))
+    
+    # Async mode (asgi.py) - non-blocking Google API transport
+    ASYNC_GOOGLE_MAX_CONNECTIONS = int(os.environ.get('ASYNC_GOOGLE_MAX_CONNECTIONS', 100))
+    ASYNC_GOOGLE_TIMEOUT_SECONDS = int(os.environ.get('ASYNC_GOOGLE_TIMEOUT_SECONDS', 30))
     
     # Google Analytics & Search Console Scopes
     GOOGLE_SCOPES = [
@@ -32,6 +124,9 @@ class Config:
     FACEBOOK_APP_SECRET = os.environ.get('FACEBOOK_APP_SECRET')
     FACEBOOK_REDIRECT_URI = os.environ.get('FACEBOOK_REDIRECT_URI') or 'http://localhost:8080/auth/facebook/callback'
     
+    # Facebook Graph API (Ads insights)
+    FACEBOOK_GRAPH_URL = os.environ.get('FACEBOOK_GRAPH_URL') or 'https://graph.facebook.com/v18.0'
+    
     # Facebook Ads Permissions
     FACEBOOK_PERMISSIONS = [
         'email',
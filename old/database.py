@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
 import json
 
@@ -34,7 +35,7 @@ class GoogleToken(db.Model):
     __tablename__ = 'google_tokens'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     access_token = db.Column(db.Text, nullable=False)
     refresh_token = db.Column(db.Text, nullable=True)
     token_uri = db.Column(db.String(200), nullable=True)
@@ -42,6 +43,7 @@ class GoogleToken(db.Model):
     client_secret = db.Column(db.Text, nullable=True)
     scopes = db.Column(db.Text, nullable=True)  # JSON string של scopes
     expires_at = db.Column(db.DateTime, nullable=True)
+    refreshing_until = db.Column(db.DateTime, nullable=True)  # תהליך שמרענן את הטוקן כרגע (token_manager)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -60,12 +62,16 @@ class GoogleToken(db.Model):
         if not self.expires_at:
             return False
         return datetime.utcnow() >= self.expires_at
+    
+    def is_connected(self):
+        """בדיקה אם הטוקן שמיש - בתוקף או שניתן לרענן אותו"""
+        return not self.is_expired() or bool(self.refresh_token)
 
 class FacebookToken(db.Model):
     __tablename__ = 'facebook_tokens'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     access_token = db.Column(db.Text, nullable=False)
     token_type = db.Column(db.String(20), default='Bearer')
     expires_at = db.Column(db.DateTime, nullable=True)
@@ -91,6 +97,9 @@ class FacebookToken(db.Model):
 
 class UserAccount(db.Model):
     __tablename__ = 'user_accounts'
+    __table_args__ = (
+        db.Index('ix_user_accounts_user_type_active', 'user_id', 'account_type', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -118,11 +127,126 @@ class UserAccount(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class AnalyticsDailyMetric(db.Model):
+    __tablename__ = 'analytics_daily_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('property_id', 'date', 'channel_group', 'source_medium',
+                            name='uq_analytics_daily_metric'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.String(100), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    channel_group = db.Column(db.String(100), nullable=False)
+    source_medium = db.Column(db.String(300), nullable=False)
+    
+    # נשמרים סכומים ולא ממוצעים כדי שאפשר יהיה לאגרגט כל טווח תאריכים
+    sessions = db.Column(db.Integer, default=0)
+    users = db.Column(db.Integer, default=0)
+    bounced_sessions = db.Column(db.Float, default=0)
+    session_duration = db.Column(db.Float, default=0)  # סך שניות
+    page_views = db.Column(db.Float, default=0)
+    conversions = db.Column(db.Float, default=0)
+    
+    def __repr__(self):
+        return f'<AnalyticsDailyMetric {self.property_id} {self.date}: {self.source_medium}>'
+
+class AnalyticsSyncState(db.Model):
+    __tablename__ = 'analytics_sync_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.String(100), unique=True, nullable=False)
+    first_date = db.Column(db.Date, nullable=False)  # היום הראשון השמור (הטווחים עצמם ב-AnalyticsSyncedRange)
+    last_date = db.Column(db.Date, nullable=False)  # היום האחרון השמור
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnalyticsSyncState {self.property_id}: {self.first_date} - {self.last_date}>'
+
+class AnalyticsSyncedRange(db.Model):
+    __tablename__ = 'analytics_synced_ranges'
+    
+    # טווחי הימים השמורים של נכס - לא בהכרח רצופים (למשל השוואה לשנה הקודמת)
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.String(100), nullable=False, index=True)
+    first_date = db.Column(db.Date, nullable=False)
+    last_date = db.Column(db.Date, nullable=False)
+    
+    def __repr__(self):
+        return f'<AnalyticsSyncedRange {self.property_id}: {self.first_date} - {self.last_date}>'
+
+class PrewarmedAnalysis(db.Model):
+    __tablename__ = 'prewarmed_analyses'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'action_id', 'account_id', 'date_range', 'comparison',
+                            name='uq_prewarmed_analysis'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    action_id = db.Column(db.String(50), nullable=False)
+    account_id = db.Column(db.String(100), nullable=False)
+    date_range = db.Column(db.String(20), nullable=False)
+    comparison = db.Column(db.String(20), nullable=False)
+    results = db.Column(db.LargeBinary, nullable=True)  # JSON של תוצאות הניתוח
+    computed_at = db.Column(db.DateTime, nullable=True)  # מתי חושבו התוצאות
+    claimed_at = db.Column(db.DateTime, nullable=True)  # מתי process תפס את החימום האחרון
+    
+    def __repr__(self):
+        return f'<PrewarmedAnalysis {self.action_id} {self.account_id}: {self.computed_at}>'
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    
+    # משימות ניתוח ברקע (jobs.py) - בטבלה ולא בזיכרון, כך שכל worker יכול לענות על מצבן
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    result = db.Column(db.LargeBinary, nullable=True)  # JSON של תוצאת הניתוח
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)  # נכתב יחד עם הסטטוס הסופי
+    
+    @property
+    def finished(self):
+        return self.finished_at is not None
+    
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.finished:
+            data.update(json.loads(self.result) if self.result else {})
+        else:
+            data['success'] = False
+        return data
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id}: {self.status}>'
+
+def configure_sqlite(engine, synchronous='NORMAL'):
+    """WAL mode - readers don't block the writer and vice versa"""
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.close()
+
 def init_db(app):
     """Initialize database with app"""
     db.init_app(app)
     
     with app.app_context():
-        # Create all tables
-        db.create_all()
-        print("✅ Database tables created successfully!")
\ No newline at end of file
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite(db.engine, app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL'))
+            # חיבורים שנפתחו לפני הגדרת ה-pragmas
+            db.engine.dispose()
+        
+        # הרצת migrations במקום create_all
+        from migrations import run_migrations
+        applied = run_migrations()
+        print(f"✅ Database ready ({applied} migration(s) applied)")
@@ -0,0 +1,354 @@
+from urllib.parse import urlencode
+import json
+from http_transport import http_session
+from scoring import batch_ad_quality_scores
+from comparison import get_date_range, get_comparison_range, format_date_range, attach_comparison
+from observability import log
+from config import Config
+
+class FacebookAPIError(Exception):
+    def __init__(self, error):
+        super().__init__(error.get('message', 'Unknown Graph API error'))
+        self.code = error.get('code')
+
+class FacebookAdsService:
+    # Insights levels fetched for a campaign analysis
+    INSIGHT_LEVELS = ['campaign', 'adset', 'ad']
+    
+    # Id/name fields per level (metrics are added to all of them)
+    LEVEL_FIELDS = {
+        'campaign': ['campaign_id', 'campaign_name'],
+        'adset': ['campaign_id', 'adset_id'],
+        'ad': ['campaign_id', 'ad_id']
+    }
+    METRIC_FIELDS = ['spend', 'impressions', 'clicks', 'actions']
+    
+    # Action types counted as conversions
+    CONVERSION_ACTIONS = ['purchase', 'lead', 'complete_registration']
+    
+    # Metrics compared between periods
+    COMPARISON_METRICS = ['spend', 'impressions', 'clicks', 'ctr', 'cpc', 'conversions', 'quality_score']
+    
+    # Graph API limits
+    MAX_BATCH_SIZE = 50
+    PAGE_SIZE = 500
+    
+    def __init__(self, access_token, graph_url=None):
+        """Initialize Facebook Ads service with the user's access token"""
+        self.access_token = access_token
+        self.graph_url = (graph_url or Config.FACEBOOK_GRAPH_URL).rstrip('/')
+    
+    def format_account_id(self, account_id):
+        """Format ad account ID as act_123456789"""
+        if not account_id.startswith('act_'):
+            account_id = f'act_{account_id}'
+        return account_id
+    
+    def request(self, method, path, params=None, data=None):
+        """
+        Call the Graph API over the shared transport and return the decoded JSON
+        
+        path is relative to graph_url, or an absolute paging.next URL (which
+        already carries the access token and cursor).
+        """
+        if path.startswith('http'):
+            url = path
+        else:
+            url = f'{self.graph_url}/{path}'
+            params = dict(params or {}, access_token=self.access_token)
+        
+        response = http_session.request(method, url, params=params, data=data)
+        payload = response.json()
+        
+        if isinstance(payload, dict) and 'error' in payload:
+            raise FacebookAPIError(payload['error'])
+        return payload
+    
+    def iter_pages(self, path=None, params=None, first_page=None):
+        """
+        Follow Graph API cursor paging and yield the data list of each page
+        
+        Pass first_page to continue from a page that was already fetched
+        (e.g. as part of a batch call). Only one page is held at a time.
+        """
+        page = first_page if first_page is not None else self.request('GET', path, params)
+        
+        while True:
+            data = page.get('data', [])
+            if data:
+                yield data
+            
+            next_url = page.get('paging', {}).get('next')
+            if not data or not next_url:
+                break
+            page = self.request('GET', next_url)
+    
+    def batch(self, batch_requests):
+        """
+        Send relative GET requests through the Graph batch endpoint
+        
+        Up to MAX_BATCH_SIZE requests share one HTTP call. Returns the decoded
+        body of every request in order; failed requests are returned as
+        FacebookAPIError instances instead of raising, so one bad request
+        doesn't discard the rest.
+        """
+        results = []
+        
+        for i in range(0, len(batch_requests), self.MAX_BATCH_SIZE):
+            chunk = batch_requests[i:i + self.MAX_BATCH_SIZE]
+            responses = self.request('POST', '', data={
+                'batch': json.dumps(chunk),
+                'include_headers': 'false'
+            })
+            
+            for item in responses:
+                if item is None:
+                    # Graph returns null for requests that didn't complete in time
+                    results.append(FacebookAPIError({'message': 'Batch request timed out'}))
+                    continue
+                
+                body = json.loads(item.get('body') or '{}')
+                if item.get('code') != 200 or 'error' in body:
+                    results.append(FacebookAPIError(body.get('error', {'message': f"HTTP {item.get('code')}"})))
+                else:
+                    results.append(body)
+        
+        return results
+    
+    def list_ad_accounts(self):
+        """Yield the user's ad accounts, following cursor paging"""
+        params = {'fields': 'account_id,name,account_status,currency', 'limit': self.PAGE_SIZE}
+        for accounts in self.iter_pages('me/adaccounts', params):
+            yield from accounts
+    
+    def iter_insights(self, account_id, date_ranges, levels=INSIGHT_LEVELS):
+        """
+        Stream insights rows as (level, rows) pages
+        
+        The first page of every level comes from a single batch call; the
+        remaining pages follow each level's cursor. date_ranges is a list of
+        (start_date, end_date) tuples sent as time_ranges, so every row
+        carries its period in date_start.
+        """
+        account_id = self.format_account_id(account_id)
+        time_ranges = json.dumps([
+            {'since': start.strftime('%Y-%m-%d'), 'until': end.strftime('%Y-%m-%d')}
+            for start, end in date_ranges
+        ])
+        
+        batch_requests = []
+        for level in levels:
+            params = {
+                'level': level,
+                'fields': ','.join(self.LEVEL_FIELDS[level] + self.METRIC_FIELDS),
+                'time_ranges': time_ranges,
+                'limit': self.PAGE_SIZE
+            }
+            batch_requests.append({'method': 'GET', 'relative_url': f'{account_id}/insights?{urlencode(params)}'})
+        
+        for level, first_page in zip(levels, self.batch(batch_requests)):
+            if isinstance(first_page, Exception):
+                raise first_page
+            
+            for rows in self.iter_pages(first_page=first_page):
+                yield level, rows
+    
+    def get_campaign_performance(self, account_id, date_range='30days', comparison=None, limit=20):
+        """
+        Get campaign performance from Facebook Ads insights
+        
+        Args:
+            account_id: Ad account ID (with or without the act_ prefix)
+            date_range: '7days', '30days', '90days', or custom
+            comparison: 'previous', 'year', or None
+        """
+        try:
+            start_date, end_date = get_date_range(date_range)
+            date_ranges = [(start_date, end_date)]
+            
+            # Comparison period is requested in the same insights calls
+            if comparison:
+                previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+                date_ranges.append((previous_start, previous_end))
+            
+            log.info(f"🔍 Fetching Facebook Ads insights for account: {account_id}")
+            log.info(f"📅 Date range: {start_date} to {end_date}")
+            
+            current_since = start_date.strftime('%Y-%m-%d')
+            campaign_rows = {'current': [], 'previous': []}
+            # campaign_id -> {'adset': count, 'ad': count} (current period)
+            structure = {}
+            
+            for level, rows in self.iter_insights(account_id, date_ranges):
+                for row in rows:
+                    period = 'current' if row.get('date_start') == current_since else 'previous'
+                    
+                    if level == 'campaign':
+                        campaign_rows[period].append(row)
+                    elif period == 'current':
+                        counts = structure.setdefault(row['campaign_id'], {'adset': 0, 'ad': 0})
+                        counts[level] += 1
+            
+            log.info("✅ Facebook Ads API calls successful")
+            
+            campaigns = self.build_campaigns(campaign_rows['current'], structure)
+            result = self.build_result(campaigns, start_date, end_date, limit)
+            
+            if comparison:
+                previous_campaigns = self.build_campaigns(campaign_rows['previous'], {})
+                previous_by_key = {(campaign['campaign_id'],): campaign for campaign in previous_campaigns}
+                attach_comparison(result['campaigns'], previous_by_key, ['campaign_id'], self.COMPARISON_METRICS)
+                
+                result['comparison'] = {
+                    'type': comparison,
+                    'date_range': format_date_range(previous_start, previous_end),
+                    'total_spend': round(sum(campaign['spend'] for campaign in previous_campaigns), 2)
+                }
+            
+            return result
+        
+        except Exception as e:
+            log.error(f"❌ Error fetching Facebook Ads data: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def count_conversions(self, actions):
+        """Sum conversion actions of an insights row"""
+        return int(sum(
+            float(action['value']) for action in actions or []
+            if action.get('action_type') in self.CONVERSION_ACTIONS
+        ))
+    
+    def build_campaigns(self, rows, structure):
+        """Build scored campaign rows from campaign-level insights rows"""
+        if not rows:
+            return []
+        
+        campaigns = []
+        for row in rows:
+            spend = float(row.get('spend', 0))
+            impressions = int(row.get('impressions', 0))
+            clicks = int(row.get('clicks', 0))
+            conversions = self.count_conversions(row.get('actions'))
+            counts = structure.get(row['campaign_id'], {'adset': 0, 'ad': 0})
+            
+            campaigns.append({
+                'campaign_id': row['campaign_id'],
+                'campaign': row.get('campaign_name', row['campaign_id']),
+                'spend': round(spend, 2),
+                'impressions': impressions,
+                'clicks': clicks,
+                'ctr': round((clicks / impressions * 100) if impressions > 0 else 0, 2),
+                'cpc': round(spend / clicks, 2) if clicks > 0 else 0,
+                'conversions': conversions,
+                'cost_per_conversion': round(spend / conversions, 2) if conversions > 0 else None,
+                'adsets': counts['adset'],
+                'ads': counts['ad']
+            })
+        
+        # Score all campaigns in one vectorized pass
+        quality_scores = batch_ad_quality_scores(
+            spend=[campaign['spend'] for campaign in campaigns],
+            impressions=[campaign['impressions'] for campaign in campaigns],
+            clicks=[campaign['clicks'] for campaign in campaigns],
+            conversions=[campaign['conversions'] for campaign in campaigns]
+        )
+        for campaign, quality_score in zip(campaigns, quality_scores):
+            campaign['quality_score'] = int(quality_score)
+        
+        return campaigns
+    
+    def build_result(self, campaigns, start_date, end_date, limit=20):
+        """Sort campaigns by spend and wrap them in the API result format"""
+        total_spend = sum(c['spend'] for c in campaigns)
+        total_impressions = sum(c['impressions'] for c in campaigns)
+        total_clicks = sum(c['clicks'] for c in campaigns)
+        
+        # Sort by spend (budget weight)
+        campaigns.sort(key=lambda x: x['spend'], reverse=True)
+        
+        return {
+            'success': True,
+            'campaigns': campaigns[:limit],
+            'date_range': format_date_range(start_date, end_date),
+            'summary': {
+                'total_spend': round(total_spend, 2),
+                'total_impressions': total_impressions,
+                'total_clicks': total_clicks,
+                'total_conversions': sum(c['conversions'] for c in campaigns),
+                'average_ctr': round((total_clicks / total_impressions * 100) if total_impressions > 0 else 0, 2),
+                'average_cpc': round(total_spend / total_clicks, 2) if total_clicks > 0 else 0,
+                'total_campaigns': len(campaigns),
+                'total_adsets': sum(c['adsets'] for c in campaigns),
+                'total_ads': sum(c['ads'] for c in campaigns)
+            }
+        }
+    
+    def generate_insights(self, campaigns, summary):
+        """Generate AI-like insights from the data"""
+        
+        if not campaigns:
+            return "לא נמצאו נתונים לניתוח"
+        
+        insights = []
+        
+        # Budget concentration
+        top_campaign = campaigns[0]
+        if summary['total_spend'] > 0:
+            share = top_campaign['spend'] / summary['total_spend'] * 100
+            insights.append(f"<strong>{top_campaign['campaign']}</strong> מקבל {share:.0f}% מהתקציב "
+                           f"({top_campaign['spend']:,.2f})")
+        
+        # Best quality campaign
+        best_campaign = max(campaigns, key=lambda x: x['quality_score'])
+        insights.append(f"<strong>{best_campaign['campaign']}</strong> הוא הקמפיין הכי יעיל "
+                       f"(ציון {best_campaign['quality_score']}, CTR {best_campaign['ctr']}%)")
+        
+        # Conversions
+        if summary['total_conversions'] > 0:
+            cost_per_conversion = summary['total_spend'] / summary['total_conversions']
+            insights.append(f"{summary['total_conversions']:,} המרות בעלות ממוצעת של {cost_per_conversion:,.2f} להמרה")
+        else:
+            insights.append("לא נמדדו המרות בתקופה - בדוק שהפיקסל מוגדר")
+        
+        # Low CTR
+        if summary['average_ctr'] < 1:
+            insights.append(f"ה-CTR הממוצע נמוך ({summary['average_ctr']}%) - המודעות לא מספיק מושכות")
+        
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{insight}</li>" for insight in insights]) + "</ul>"
+    
+    def generate_recommendations(self, campaigns, summary):
+        """Generate actionable recommendations"""
+        
+        if not campaigns:
+            return "אין מספיק נתונים להמלצות"
+        
+        recommendations = []
+        
+        # Scale the most efficient campaign
+        best_campaign = max(campaigns, key=lambda x: x['quality_score'])
+        recommendations.append(f"<strong>הגדל תקציב ל-{best_campaign['campaign']}</strong> - "
+                              f"הקמפיין הכי יעיל שלך")
+        
+        # Spend without conversions
+        wasted = [c for c in campaigns if c['conversions'] == 0 and c['spend'] > summary['total_spend'] * 0.1]
+        if wasted:
+            recommendations.append(f"<strong>בדוק את {wasted[0]['campaign']}</strong> - "
+                                  f"הוצאה של {wasted[0]['spend']:,.2f} ללא המרות")
+        
+        # Expensive clicks
+        if summary['average_cpc'] > 0:
+            expensive = [c for c in campaigns if c['cpc'] > summary['average_cpc'] * 2]
+            if expensive:
+                recommendations.append(f"<strong>הורד עלות לקליק ב-{expensive[0]['campaign']}</strong> - "
+                                      f"CPC של {expensive[0]['cpc']} לעומת ממוצע {summary['average_cpc']}")
+        
+        # Too few ads to test
+        single_ad = [c for c in campaigns if c['ads'] == 1]
+        if single_ad:
+            recommendations.append(f"<strong>הוסף מודעות ל-{single_ad[0]['campaign']}</strong> - "
+                                  f"מודעה אחת בלבד, אין מה להשוות")
+        
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
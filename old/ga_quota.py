@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import threading
+import time
+from config import Config
+
+# GA4 daily property quotas reset at midnight Pacific time, hourly ones on the hour
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+# Assumed cost of a runReport call before the property reported a real one
+DEFAULT_REQUEST_COST = 10
+
+# Weight of the newest call in the moving average of the request cost
+COST_SMOOTHING = 0.3
+
+# Slowest request rate the bucket drops to (one call per hour)
+MIN_REQUESTS_PER_SECOND = 1 / 3600
+
+class QuotaDeferred(Exception):
+    """Raised instead of sending a runReport call the property quota can't afford"""
+    
+    def __init__(self, property_id, retry_after, reason):
+        super().__init__(f"GA4 quota of property {property_id}: {reason} (retry in {retry_after:.0f}s)")
+        self.property_id = property_id
+        self.retry_after = retry_after
+        self.reason = reason
+    
+    def to_result(self):
+        """Error result in the services' {'success': False, ...} format"""
+        return {
+            'success': False,
+            'error': str(self),
+            'quota_deferred': True,
+            'retry_after': round(self.retry_after)
+        }
+
+def normalize_property_id(property_id):
+    return str(property_id).split('/')[-1]
+
+def current_hour():
+    return int(time.time() // 3600)
+
+def current_day():
+    return datetime.now(QUOTA_TIMEZONE).date()
+
+def seconds_to_next_hour():
+    return 3600 - time.time() % 3600
+
+def seconds_to_next_day():
+    now = datetime.now(QUOTA_TIMEZONE)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+class QuotaScheduler:
+    """
+    Per-property scheduler for GA4 Data API calls
+    
+    Every runReport asks for returnPropertyQuota and the remaining hourly
+    and daily tokens are recorded here. Before a call, reserve() takes a
+    slot from the property's token bucket: callers over the burst queue
+    for up to max_wait_seconds, and the refill rate is slowed so the
+    remaining hourly tokens last until the hour resets. A call that would
+    dig into the reserve (or wait too long) raises QuotaDeferred before
+    anything is sent, so callers can answer from cached data instead.
+    """
+    
+    def __init__(self, requests_per_second=1.0, burst=10, hourly_reserve=500,
+                 daily_reserve=2000, max_wait_seconds=5):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.hourly_reserve = hourly_reserve
+        self.daily_reserve = daily_reserve
+        self.max_wait_seconds = max_wait_seconds
+        self._properties = {}
+        self._lock = threading.Lock()
+    
+    def _state(self, property_id):
+        property_id = normalize_property_id(property_id)
+        state = self._properties.get(property_id)
+        if state is None:
+            state = self._properties[property_id] = {
+                'tokens': float(self.burst),
+                'refilled_at': time.monotonic(),
+                'hourly_remaining': None, 'hour': None,
+                'daily_remaining': None, 'day': None,
+                'cost': None,
+                'updated_at': None
+            }
+        return state
+    
+    def _remaining(self, state):
+        """Remaining (hourly, daily) tokens - None when unknown or reset since the last report"""
+        hourly = state['hourly_remaining'] if state['hour'] == current_hour() else None
+        daily = state['daily_remaining'] if state['day'] == current_day() else None
+        return hourly, daily
+    
+    def _exhaustion_wait(self, state):
+        """Seconds until a call no longer eats into the reserve (0 when it can go now)"""
+        hourly, daily = self._remaining(state)
+        cost = state['cost'] or DEFAULT_REQUEST_COST
+        if daily is not None and daily - cost < self.daily_reserve:
+            return seconds_to_next_day()
+        if hourly is not None and hourly - cost < self.hourly_reserve:
+            return seconds_to_next_hour()
+        return 0
+    
+    def _rate(self, state):
+        """Bucket refill rate, lowered so the spendable hourly tokens last the hour"""
+        hourly, _ = self._remaining(state)
+        if hourly is None:
+            return self.requests_per_second
+        
+        cost = state['cost'] or DEFAULT_REQUEST_COST
+        calls_left = max(0, hourly - self.hourly_reserve) / cost
+        return max(MIN_REQUESTS_PER_SECOND, min(self.requests_per_second, calls_left / seconds_to_next_hour()))
+    
+    def would_exhaust(self, property_id):
+        """True when the next call would use up the property's quota reserve"""
+        with self._lock:
+            return self._exhaustion_wait(self._state(property_id)) > 0
+    
+    def reserve(self, property_id):
+        """
+        Take a slot for one runReport call
+        
+        Returns the seconds the caller has to wait before sending it (0 to
+        send now). Raises QuotaDeferred when the call would exhaust the
+        quota or the wait would exceed max_wait_seconds.
+        """
+        with self._lock:
+            state = self._state(property_id)
+            wait = self._exhaustion_wait(state)
+            if wait:
+                raise QuotaDeferred(property_id, wait, 'quota nearly exhausted')
+            
+            rate = self._rate(state)
+            now = time.monotonic()
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['refilled_at']) * rate)
+            state['refilled_at'] = now
+            
+            # Negative tokens are callers already queued ahead of this one
+            wait = max(0.0, (1 - state['tokens']) / rate)
+            if wait > self.max_wait_seconds:
+                raise QuotaDeferred(property_id, wait, 'too many queued requests')
+            
+            state['tokens'] -= 1
+            return wait
+    
+    def acquire(self, property_id):
+        """Blocking reserve() - sleeps until the slot is due"""
+        wait = self.reserve(property_id)
+        if wait:
+            time.sleep(wait)
+    
+    def record(self, property_id, property_quota):
+        """Update the property from the propertyQuota object of a runReport response"""
+        if not property_quota:
+            return
+        
+        hourly = property_quota.get('tokensPerHour', {})
+        daily = property_quota.get('tokensPerDay', {})
+        
+        with self._lock:
+            state = self._state(property_id)
+            if 'remaining' in hourly:
+                state['hourly_remaining'] = hourly['remaining']
+                state['hour'] = current_hour()
+            if 'remaining' in daily:
+                state['daily_remaining'] = daily['remaining']
+                state['day'] = current_day()
+            
+            consumed = hourly.get('consumed') or daily.get('consumed')
+            if consumed:
+                if state['cost'] is None:
+                    state['cost'] = float(consumed)
+                else:
+                    state['cost'] += COST_SMOOTHING * (consumed - state['cost'])
+            state['updated_at'] = datetime.utcnow()
+    
+    def mark_exhausted(self, property_id):
+        """GA answered 429 even after retries - treat the hourly quota as used up"""
+        with self._lock:
+            state = self._state(property_id)
+            state['hourly_remaining'] = 0
+            state['hour'] = current_hour()
+            state['updated_at'] = datetime.utcnow()
+    
+    def snapshot(self, property_id):
+        with self._lock:
+            state = self._state(property_id)
+            hourly, daily = self._remaining(state)
+            return {
+                'tokens_per_hour_remaining': hourly,
+                'tokens_per_day_remaining': daily,
+                'avg_request_cost': round(state['cost'], 1) if state['cost'] else None,
+                'updated_at': state['updated_at'].isoformat() if state['updated_at'] else None
+            }
+    
+    def clear(self):
+        with self._lock:
+            self._properties.clear()
+
+quota_scheduler = QuotaScheduler(
+    requests_per_second=Config.GA4_REQUESTS_PER_SECOND,
+    burst=Config.GA4_REQUEST_BURST,
+    hourly_reserve=Config.GA4_QUOTA_HOURLY_RESERVE,
+    daily_reserve=Config.GA4_QUOTA_DAILY_RESERVE,
+    max_wait_seconds=Config.GA4_QUOTA_MAX_WAIT_SECONDS
+)
@@ -0,0 +1,72 @@
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from http_transport import GoogleAuthorizedHttp, http_session
+from token_manager import token_manager
+from observability import log, timed
+import json
+import threading
+
+class GoogleClientPool:
+    """Process-wide cache of parsed Google API discovery documents"""
+    
+    def __init__(self):
+        self._documents = {}
+        self._lock = threading.Lock()
+    
+    def get_document(self, service_name, version):
+        """Return the parsed discovery document, loading it once per process"""
+        key = (service_name, version)
+        document = self._documents.get(key)
+        if document is not None:
+            return document
+        
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                content = get_static_doc(service_name, version)
+                if content is None:
+                    return None
+                document = json.loads(content)
+                self._documents[key] = document
+                log.info(f"📦 Loaded discovery document: {service_name} {version}")
+        return document
+    
+    def get_client(self, service_name, version, credentials):
+        """
+        Build a client bound to the given user credentials
+        
+        The discovery document is shared across requests, so only the
+        per-user authorized HTTP object is created here. Requests go through
+        the shared pooled transport (retries, backoff, per-host metrics);
+        expired or rejected tokens are renewed through the token manager.
+        """
+        with timed('client_build'):
+            http = GoogleAuthorizedHttp(credentials, http_session, refresh=token_manager.refresh_credentials)
+            document = self.get_document(service_name, version)
+            if document is None:
+                # Not shipped with googleapiclient - fall back to regular discovery
+                return build(service_name, version, http=http, cache_discovery=False)
+            return build_from_document(document, http=http)
+    
+    def warm_up(self, services):
+        """Preload discovery documents, e.g. at application startup"""
+        for service_name, version in services:
+            self.get_document(service_name, version)
+    
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+# Services used by the application
+GOOGLE_SERVICES = [
+    ('analyticsdata', 'v1beta'),
+    ('analyticsadmin', 'v1beta'),
+    ('searchconsole', 'v1'),
+    ('oauth2', 'v2'),
+]
+
+client_pool = GoogleClientPool()
+
+def get_google_client(service_name, version, credentials):
+    """Shortcut for client_pool.get_client"""
+    return client_pool.get_client(service_name, version, credentials)
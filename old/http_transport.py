@@ -0,0 +1,228 @@
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from config import Config
+from observability import log, timed
+
+# Statuses that are always worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Google error reasons that signal quota / rate limiting (returned as 403)
+GOOGLE_QUOTA_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded', 'backendError'}
+
+# Facebook Graph API throttling error codes (returned as 400/403)
+FACEBOOK_THROTTLE_CODES = {4, 17, 32, 613, 80000, 80001, 80002, 80003, 80004, 80005, 80006, 80008, 80009, 80014}
+
+def is_retryable(status_code, body):
+    """
+    Decide whether a response should be retried
+    
+    body is the decoded JSON error body (or None). Besides 429/5xx, Google
+    and Facebook report quota exhaustion as 400/403 with a reason or code
+    in the error object.
+    """
+    if status_code in RETRY_STATUSES:
+        return True
+    if status_code not in (400, 403) or not isinstance(body, dict):
+        return False
+    
+    error = body.get('error')
+    if not isinstance(error, dict):
+        return False
+    if error.get('status') == 'RESOURCE_EXHAUSTED':
+        return True
+    if error.get('code') in FACEBOOK_THROTTLE_CODES:
+        return True
+    return any(isinstance(item, dict) and item.get('reason') in GOOGLE_QUOTA_REASONS
+               for item in error.get('errors', []))
+
+def parse_retry_after(value):
+    """Retry-After in seconds (the HTTP-date form is ignored)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, base_seconds, max_seconds):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+def retry_delay(attempt, retry_after=None):
+    """Delay before the next attempt - the server's Retry-After wins if it sent one"""
+    delay = parse_retry_after(retry_after)
+    if delay is None:
+        delay = backoff_delay(attempt, Config.HTTP_BACKOFF_BASE_SECONDS, Config.HTTP_BACKOFF_MAX_SECONDS)
+    return min(delay, Config.HTTP_BACKOFF_MAX_SECONDS)
+
+class TransportStats:
+    """Per-host request, error, retry and latency counters"""
+    
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+    
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {
+                'requests': 0, 'errors': 0, 'retries': 0,
+                'total_latency': 0.0, 'max_latency': 0.0
+            }
+        return stats
+    
+    def record(self, host, latency, status_code):
+        """Record one attempt; status_code is None for connection errors"""
+        with self._lock:
+            stats = self._host(host)
+            stats['requests'] += 1
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            if status_code is None or status_code >= 400:
+                stats['errors'] += 1
+    
+    def record_retry(self, host):
+        with self._lock:
+            self._host(host)['retries'] += 1
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                host: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'avg_latency_ms': round(stats['total_latency'] / stats['requests'] * 1000, 1) if stats['requests'] else 0,
+                    'max_latency_ms': round(stats['max_latency'] * 1000, 1)
+                }
+                for host, stats in self._hosts.items()
+            }
+    
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+
+class TransportSession(requests.Session):
+    """
+    requests.Session shared by every outbound call
+    
+    Keeps a keep-alive pool per host with at most pool_maxsize connections
+    (callers wait for a free one instead of opening more), retries 429/5xx
+    and quota errors with jittered exponential backoff, and records per-host
+    metrics. Anything that accepts a requests session - google-auth token
+    refresh, the googleapiclient adapter below, the Graph API client - goes
+    through it.
+    """
+    
+    def __init__(self, stats, pool_maxsize=20, max_retries=4):
+        super().__init__()
+        self.stats = stats
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=pool_maxsize, pool_block=True)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+    
+    def request(self, method, url, *args, **kwargs):
+        # Phase 'upstream' of the current operation - retries and backoff included
+        with timed('upstream'):
+            return self._request(method, url, *args, **kwargs)
+    
+    def _request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', Config.HTTP_TIMEOUT_SECONDS)
+        host = urlsplit(url).hostname
+        attempt = 0
+        
+        while True:
+            start = time.monotonic()
+            retry_after = None
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.stats.record(host, time.monotonic() - start, None)
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self.stats.record(host, time.monotonic() - start, response.status_code)
+                if attempt >= self.max_retries or not self.should_retry(response):
+                    return response
+                retry_after = response.headers.get('Retry-After')
+            
+            delay = retry_delay(attempt, retry_after)
+            self.stats.record_retry(host)
+            log.warning(f"🔁 Retrying {method} {host} in {delay:.2f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+            attempt += 1
+    
+    def should_retry(self, response):
+        if response.status_code < 400:
+            return False
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return is_retryable(response.status_code, body)
+
+class GoogleAuthorizedHttp:
+    """
+    httplib2.Http-compatible adapter for googleapiclient
+    
+    googleapiclient only calls request() on its http object; this sends
+    those requests through the shared TransportSession instead of a new
+    httplib2 connection per client, with the user's credentials applied.
+    
+    refresh(credentials, rejected) renews the credentials in place when
+    they expire or Google rejects them (token_manager.refresh_credentials,
+    which shares the refresh with other requests and processes); without
+    it google-auth refreshes the credentials directly.
+    """
+    
+    def __init__(self, credentials, session, refresh=None):
+        self.credentials = credentials
+        self.session = session
+        self.refresh = refresh
+        self._auth_request = GoogleAuthRequest(session=session)
+    
+    def refresh_credentials(self, rejected=False):
+        if self.refresh is not None:
+            self.refresh(self.credentials, rejected)
+        else:
+            self.credentials.refresh(self._auth_request)
+    
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        request_headers = dict(headers or {})
+        # Expired while the client was held (long analyses) - renewed here,
+        # so before_request only adds the bearer token
+        if not self.credentials.valid:
+            self.refresh_credentials()
+        self.credentials.before_request(self._auth_request, method, uri, request_headers)
+        
+        response = self.session.request(method, uri, data=body, headers=request_headers)
+        
+        # Token revoked/expired server-side - refresh once and retry
+        if response.status_code == 401 and getattr(self.credentials, 'refresh_token', None):
+            self.refresh_credentials(rejected=True)
+            self.credentials.apply(request_headers)
+            response = self.session.request(method, uri, data=body, headers=request_headers)
+        
+        info = dict(response.headers)
+        info['status'] = str(response.status_code)
+        # requests already decoded the body
+        info.pop('content-encoding', None)
+        info.pop('Content-Encoding', None)
+        return httplib2.Response(info), response.content
+    
+    def close(self):
+        """The session is shared - nothing to close per client"""
+
+transport_stats = TransportStats()
+
+http_session = TransportSession(
+    transport_stats,
+    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+    max_retries=Config.HTTP_MAX_RETRIES
+)
@@ -0,0 +1,51 @@
+from flask import g, session
+from sqlalchemy.orm import joinedload
+from database import db, User
+
+class Identity:
+    """The logged-in user with tokens and accounts, loaded once per request"""
+    
+    def __init__(self, user):
+        self.user = user
+        self.google_token = user.google_tokens[0] if user.google_tokens else None
+        self.facebook_token = user.facebook_tokens[0] if user.facebook_tokens else None
+        self.accounts = user.accounts
+    
+    @property
+    def google_connected(self):
+        return self.google_token is not None and self.google_token.is_connected()
+    
+    @property
+    def facebook_connected(self):
+        return self.facebook_token is not None and not self.facebook_token.is_expired()
+    
+    @property
+    def active_accounts(self):
+        return [acc for acc in self.accounts if acc.is_active]
+    
+    def accounts_by_type(self, active_only=True):
+        """Split accounts to google_analytics / search_console / facebook_ads lists"""
+        accounts = self.active_accounts if active_only else self.accounts
+        grouped = {'google_analytics': [], 'search_console': [], 'facebook_ads': []}
+        for acc in accounts:
+            grouped.setdefault(acc.account_type, []).append(acc)
+        return grouped
+
+def load_identity(user_id):
+    """Load user, Google/Facebook tokens and accounts in a single query"""
+    user = db.session.query(User).options(
+        joinedload(User.google_tokens),
+        joinedload(User.facebook_tokens),
+        joinedload(User.accounts)
+    ).filter(User.id == user_id).first()
+    
+    return Identity(user) if user else None
+
+def get_identity():
+    """Identity of the current request, memoized on flask.g"""
+    if 'user_id' not in session:
+        return None
+    
+    if 'identity' not in g:
+        g.identity = load_identity(session['user_id'])
+    return g.identity
@@ -0,0 +1,115 @@
+class TrafficInsightStats:
+    """
+    Everything AnalyticsService.generate_insights / generate_recommendations read, in one pass
+    
+    Rows are fed with add() as they arrive - a list, a generator or pages of
+    a full export - and only references to the few rows the insights name
+    are kept. On rows sorted by quality score (the build_result order) the
+    picks match the first/last row of the sorted list.
+    """
+    
+    __slots__ = ('count', 'best', 'worst', 'highest_volume',
+                 'first_high_bounce', 'first_low_engagement', 'first_untracked_conversions')
+    
+    # Thresholds of generate_recommendations
+    HIGH_BOUNCE_RATE = 60
+    LOW_PAGES_PER_SESSION = 2
+    CONVERSION_TRACKING_SESSIONS = 100
+    
+    def __init__(self):
+        self.count = 0
+        self.best = None
+        self.worst = None
+        self.highest_volume = None
+        self.first_high_bounce = None
+        self.first_low_engagement = None
+        self.first_untracked_conversions = None
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """Stats of an iterable of rows (returned as is if already stats)"""
+        if isinstance(rows, cls):
+            return rows
+        stats = cls()
+        stats.add_many(rows)
+        return stats
+    
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+    
+    def add(self, source):
+        self.count += 1
+        
+        # Ties: best keeps the first row, worst the last - like [0] / [-1] of the sorted list
+        if self.best is None or source['quality_score'] > self.best['quality_score']:
+            self.best = source
+        if self.worst is None or source['quality_score'] <= self.worst['quality_score']:
+            self.worst = source
+        if self.highest_volume is None or source['sessions'] > self.highest_volume['sessions']:
+            self.highest_volume = source
+        
+        if self.first_high_bounce is None and source['bounce_rate'] > self.HIGH_BOUNCE_RATE:
+            self.first_high_bounce = source
+        if self.first_low_engagement is None and source['pages_per_session'] < self.LOW_PAGES_PER_SESSION:
+            self.first_low_engagement = source
+        if (self.first_untracked_conversions is None
+                and source['sessions'] > self.CONVERSION_TRACKING_SESSIONS and source['conversions'] == 0):
+            self.first_untracked_conversions = source
+
+class KeywordInsightStats:
+    """
+    Everything SearchConsoleService.generate_insights / generate_recommendations read, in one pass
+    
+    Same contract as TrafficInsightStats; on rows sorted by clicks the top
+    keyword is the first row of the sorted list.
+    """
+    
+    __slots__ = ('count', 'top', 'high_ctr_count', 'low_position_count',
+                 'first_opportunity', 'first_low_ctr', 'first_position_4_to_10')
+    
+    def __init__(self):
+        self.count = 0
+        self.top = None
+        self.high_ctr_count = 0
+        self.low_position_count = 0
+        self.first_opportunity = None
+        self.first_low_ctr = None
+        self.first_position_4_to_10 = None
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """Stats of an iterable of rows (returned as is if already stats)"""
+        if isinstance(rows, cls):
+            return rows
+        stats = cls()
+        stats.add_many(rows)
+        return stats
+    
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+    
+    def add(self, keyword):
+        self.count += 1
+        impressions = keyword['impressions']
+        position = keyword['position']
+        ctr = keyword['ctr']
+        
+        if self.top is None or keyword['clicks'] > self.top['clicks']:
+            self.top = keyword
+        
+        if ctr > 5:
+            self.high_ctr_count += 1
+        if impressions > 1000 and position > 10:
+            self.low_position_count += 1
+        
+        # Low hanging fruit - ranked on page 1-2 but not at the top
+        if self.first_opportunity is None and impressions > 500 and 5 < position <= 20:
+            self.first_opportunity = keyword
+        if self.first_low_ctr is None and impressions > 1000 and ctr < 2:
+            self.first_low_ctr = keyword
+        if self.first_position_4_to_10 is None and 4 <= position <= 10:
+            self.first_position_4_to_10 = keyword
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+import uuid
+from database import db, AnalysisJob
+from config import Config
+from json_response import dumps
+from observability import log
+
+# Job states: queued -> importing -> analyzing -> completed / failed
+# ('importing' is the same status the traffic-quality-cached route returns)
+
+class JobFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+class JobManager:
+    """
+    Runs analysis jobs on a bounded thread pool and keeps their results for a while
+    
+    Jobs live in the analysis_jobs table, so a job submitted to one gunicorn
+    worker can be polled through any other; only the thread pool is per
+    process. Job rows are written through their own session, never the
+    session of the analysis that runs in the job.
+    """
+    
+    def __init__(self, max_workers=4, max_pending=100, result_ttl_seconds=600):
+        self.max_pending = max_pending
+        self.result_ttl = timedelta(seconds=result_ttl_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+    
+    def submit(self, app, user_id, params, func):
+        """
+        Queue func(user_id, params, report_progress) and return the job
+        
+        func runs inside an application context and must return a result dict
+        with a 'success' key (the same payload /api/analyze returns).
+        """
+        with Session(db.engine, expire_on_commit=False) as session:
+            self._prune(session)
+            pending = session.query(AnalysisJob).filter(AnalysisJob.finished_at.is_(None)).count()
+            if pending >= self.max_pending:
+                raise JobFullError()
+            
+            job = AnalysisJob(id=uuid.uuid4().hex, user_id=user_id, status='queued',
+                              created_at=datetime.utcnow())
+            session.add(job)
+            session.commit()
+        
+        self._executor.submit(self._run, app, job.id, user_id, params, func)
+        return job
+    
+    def _run(self, app, job_id, user_id, params, func):
+        with app.app_context():
+            try:
+                result = func(user_id, params, lambda stage: self._update(job_id, status=stage))
+                status = 'completed' if result.get('success') else 'failed'
+            except Exception as e:
+                log.error(f"❌ Analysis job {job_id} failed: {e}")
+                result = {'success': False, 'error': str(e)}
+                status = 'failed'
+            finally:
+                db.session.remove()
+            
+            # Final status, result and finished_at in one write - a finished job always has finished_at
+            try:
+                self._update(job_id, status=status, result=dumps(result), finished_at=datetime.utcnow())
+            except Exception as e:
+                log.error(f"❌ Could not store the result of analysis job {job_id}: {e}")
+    
+    def _update(self, job_id, **values):
+        with Session(db.engine) as session:
+            session.query(AnalysisJob).filter_by(id=job_id).update(values, synchronize_session=False)
+            session.commit()
+    
+    def get(self, job_id, user_id):
+        """Return the job if it belongs to the user"""
+        return AnalysisJob.query.filter_by(id=job_id, user_id=user_id).first()
+    
+    def _prune(self, session):
+        """Drop finished jobs older than the result TTL, and jobs of workers that died before finishing"""
+        deadline = datetime.utcnow() - self.result_ttl
+        session.query(AnalysisJob).filter(or_(
+            AnalysisJob.finished_at < deadline,
+            and_(AnalysisJob.finished_at.is_(None), AnalysisJob.created_at < deadline)
+        )).delete(synchronize_session=False)
+
+job_manager = JobManager(
+    max_workers=Config.ANALYSIS_JOB_WORKERS,
+    max_pending=Config.ANALYSIS_JOB_MAX_PENDING,
+    result_ttl_seconds=Config.ANALYSIS_JOB_TTL_SECONDS
+)
@@ -0,0 +1,92 @@
+from werkzeug.http import parse_accept_header, parse_etags
+from reports import json_default
+import gzip
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:  # optional - stdlib json fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional - gzip only
+    brotli = None
+
+# Bodies below this size are sent as is - compression wouldn't pay for itself
+MIN_COMPRESS_BYTES = 1024
+
+# On-the-fly levels - on a 9 MB body brotli 3 is within 9% of quality 5's
+# size at a third of its CPU, gzip 4 within 9% of level 6's at two thirds
+GZIP_LEVEL = 4
+BROTLI_QUALITY = 3
+
+SUPPORTED_ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+def dumps(payload):
+    """UTF-8 JSON bytes of a payload (reports serialize as their rows)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def encode_analysis(payload):
+    """
+    (body, etag) of an analysis response - etag is the bare (unquoted) tag
+    
+    The ETag hashes payload['results'] only - the envelope ('cache',
+    'property_quota') changes between identical analyses. results is
+    serialized once and spliced into the envelope, so the hash costs no
+    second serialization. Payloads without results get no ETag.
+    """
+    if 'results' not in payload:
+        return dumps(payload), None
+    
+    results_body = dumps(payload['results'])
+    envelope = dumps({key: value for key, value in payload.items() if key != 'results'})
+    body = b'{"results":' + results_body + (b',' + envelope[1:] if len(envelope) > 2 else b'}')
+    return body, hashlib.blake2b(results_body, digest_size=16).hexdigest()
+
+def choose_encoding(accept_encoding, size):
+    """'br', 'gzip' or None from an Accept-Encoding header (q-values honoured)"""
+    if not accept_encoding or size < MIN_COMPRESS_BYTES:
+        return None
+    return parse_accept_header(accept_encoding).best_match(SUPPORTED_ENCODINGS)
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def is_not_modified(if_none_match, etag):
+    """Whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires)"""
+    return bool(etag and if_none_match) and parse_etags(if_none_match).contains_weak(etag)
+
+def build_response(payload, accept_encoding=None, if_none_match=None):
+    """
+    (status, body, headers) of an analysis response - shared by app.py and asgi.py
+    
+    The body is orjson-encoded when orjson is installed, compressed with
+    brotli or gzip per Accept-Encoding, and carries a weak ETag of the
+    results so an unchanged re-analysis answers 304.
+    
+    status is 304 with an empty body when the client's copy is current.
+    headers is a list of (name, value) strings.
+    """
+    body, etag = encode_analysis(payload)
+    headers = [('Vary', 'Accept-Encoding'), ('Cache-Control', 'private, no-cache')]
+    if etag:
+        headers.append(('ETag', f'W/"{etag}"'))
+        if is_not_modified(if_none_match, etag):
+            return 304, b'', headers
+    
+    encoding = choose_encoding(accept_encoding, len(body))
+    if encoding:
+        body = compress(body, encoding)
+        headers.append(('Content-Encoding', encoding))
+    
+    headers += [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+    return 200, body, headers
@@ -0,0 +1,214 @@
+import heapq
+from analytics import AnalyticsService
+from search_console import SearchConsoleService
+from comparison import get_date_range, format_date_range
+from ga_quota import QuotaDeferred
+from url_join import PartitionedHashJoin, normalize_host, normalize_url, host_matcher, site_host
+from observability import log
+
+class LandingPageService:
+    """
+    Landing pages report: GA4 landingPage metrics joined with Search Console page metrics
+    
+    Both inputs are paged from the APIs and hash-joined on the normalized URL
+    (see url_join), so the full join of hundreds of thousands of URLs runs
+    in bounded memory. The report keeps only the top pages and running
+    totals.
+    """
+    
+    # Spill partitions of the join - each holds roughly 1/JOIN_PARTITIONS of the URLs
+    JOIN_PARTITIONS = 16
+    
+    # GA rows per page - a parsed page is the largest object held while joining
+    ANALYTICS_PAGE_SIZE = 25000
+    
+    # Pages with search impressions but almost no engagement in GA
+    HIGH_BOUNCE_RATE = 70
+    
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.analytics_service = AnalyticsService(credentials)
+        self.search_service = SearchConsoleService(credentials)
+    
+    def iter_joined_pages(self, property_id, site_url, start_date, end_date):
+        """
+        Yield one row per normalized URL (full outer join of both sources)
+        
+        'match' is 'both', 'analytics' or 'search'. GA rows of hosts the
+        Search Console property doesn't cover are skipped - they can't match.
+        """
+        join = PartitionedHashJoin(partitions=self.JOIN_PARTITIONS)
+        covers_host = host_matcher(site_url)
+        
+        for rows in self.analytics_service.iter_landing_page_pages(property_id, start_date, end_date,
+                                                                       self.ANALYTICS_PAGE_SIZE):
+            for row in rows:
+                host, landing_page = (value['value'] for value in row['dimensionValues'])
+                if landing_page.startswith('('):  # (not set)
+                    continue
+                host = normalize_host(host)
+                if not covers_host(host):
+                    continue
+                key = normalize_url(landing_page, host)
+                
+                metrics = row['metricValues']
+                sessions = int(metrics[0]['value'])
+                # Additive sums - the join merges rows of URLs that normalize alike
+                join.add_left(key, (
+                    sessions,
+                    int(metrics[1]['value']),
+                    float(metrics[2]['value']) * sessions,
+                    float(metrics[3]['value']) * sessions,
+                    float(metrics[4]['value'])
+                ))
+        
+        default_host = site_host(site_url)
+        for rows in self.search_service.iter_search_analytics_pages(site_url, start_date, end_date, ['page']):
+            for row in rows:
+                join.add_right(normalize_url(row['keys'][0], default_host), (
+                    row['clicks'],
+                    row['impressions'],
+                    row['position'] * row['impressions']
+                ))
+        
+        for key, analytics_values, search_values in join:
+            yield self.build_page_row(key, analytics_values, search_values)
+    
+    def build_page_row(self, url, analytics_values, search_values):
+        sessions, users, bounced, duration, conversions = analytics_values or (0, 0, 0.0, 0.0, 0.0)
+        clicks, impressions, weighted_position = search_values or (0, 0, 0.0)
+        
+        return {
+            'url': url,
+            'match': 'both' if analytics_values and search_values else ('analytics' if analytics_values else 'search'),
+            'sessions': sessions,
+            'users': users,
+            'bounce_rate': round(bounced / sessions * 100, 1) if sessions else 0,
+            'avg_session_duration_seconds': round(duration / sessions, 1) if sessions else 0,
+            'conversions': int(conversions),
+            'clicks': clicks,
+            'impressions': impressions,
+            'ctr': round(clicks / impressions * 100, 2) if impressions else 0,
+            'position': round(weighted_position / impressions, 1) if impressions else None
+        }
+    
+    def get_landing_pages_report(self, property_id, site_url, date_range='30days', limit=20):
+        """
+        Get the landing pages report
+        
+        Args:
+            property_id: GA4 Property ID
+            site_url: Search Console property ('https://example.com/' or 'sc-domain:example.com')
+            date_range: '7days', '30days', '90days', or custom
+            limit: top pages returned (by search clicks, then sessions)
+        """
+        try:
+            start_date, end_date = get_date_range(date_range)
+            
+            log.info(f"🔍 Joining landing pages of {property_id} with {site_url}")
+            log.info(f"📅 Date range: {start_date} to {end_date}")
+            
+            summary = {
+                'total_pages': 0, 'matched_pages': 0, 'analytics_only_pages': 0, 'search_only_pages': 0,
+                'total_sessions': 0, 'total_clicks': 0, 'total_impressions': 0
+            }
+            top_pages = []
+            match_counters = {'both': 'matched_pages', 'analytics': 'analytics_only_pages', 'search': 'search_only_pages'}
+            
+            for index, page in enumerate(self.iter_joined_pages(property_id, site_url, start_date, end_date)):
+                summary['total_pages'] += 1
+                summary[match_counters[page['match']]] += 1
+                summary['total_sessions'] += page['sessions']
+                summary['total_clicks'] += page['clicks']
+                summary['total_impressions'] += page['impressions']
+                
+                # Bounded heap - the index breaks ties without comparing dicts
+                entry = (page['clicks'], page['sessions'], -index, page)
+                if len(top_pages) < limit:
+                    heapq.heappush(top_pages, entry)
+                elif entry > top_pages[0]:
+                    heapq.heapreplace(top_pages, entry)
+            
+            log.info(f"✅ Landing pages joined: {summary['total_pages']:,} URLs, {summary['matched_pages']:,} matched")
+            
+            summary['match_rate'] = round(summary['matched_pages'] / summary['total_pages'] * 100, 1) if summary['total_pages'] else 0
+            return {
+                'success': True,
+                'pages': [entry[-1] for entry in sorted(top_pages, reverse=True)],
+                'date_range': format_date_range(start_date, end_date),
+                'summary': summary
+            }
+        
+        except QuotaDeferred as e:
+            log.warning(f"⏳ {e}")
+            return e.to_result()
+        
+        except Exception as e:
+            log.error(f"❌ Error joining landing pages: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def generate_insights(self, pages, summary):
+        """Generate AI-like insights from the landing pages data"""
+        
+        if not pages:
+            return "לא נמצאו נתונים לניתוח"
+        
+        insights = []
+        top_page = pages[0]
+        
+        insights.append(f"<strong>{top_page['url']}</strong> הוא דף הנחיתה שמקבל הכי הרבה קליקים מגוגל "
+                        f"({top_page['clicks']:,} קליקים, {top_page['sessions']:,} ביקורים)")
+        
+        insights.append(f"{summary['matched_pages']:,} מתוך {summary['total_pages']:,} הדפים "
+                        f"({summary['match_rate']}%) מופיעים גם ב-Analytics וגם ב-Search Console")
+        
+        if summary['search_only_pages']:
+            insights.append(f"{summary['search_only_pages']:,} דפים מופיעים בחיפוש בגוגל "
+                            f"אבל לא היו דפי נחיתה ב-Analytics")
+        
+        high_bounce = [p for p in pages if p['match'] == 'both' and p['bounce_rate'] > self.HIGH_BOUNCE_RATE]
+        if high_bounce:
+            insights.append(f"ל-{len(high_bounce)} מהדפים המובילים בחיפוש יש שיעור נטישה גבוה "
+                            f"(מעל {self.HIGH_BOUNCE_RATE}%) - התוכן לא עונה על מה שחיפשו")
+        
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{insight}</li>" for insight in insights]) + "</ul>"
+    
+    def generate_recommendations(self, pages, summary):
+        """Generate actionable recommendations"""
+        
+        if not pages:
+            return "אין מספיק נתונים להמלצות"
+        
+        recommendations = []
+        
+        # Focus on top performer
+        top_page = pages[0]
+        recommendations.append(f"<strong>המשך לחזק את {top_page['url']}</strong> - "
+                               f"זה דף הנחיתה שמביא הכי הרבה קליקים מגוגל")
+        
+        high_bounce = [p for p in pages if p['match'] == 'both' and p['bounce_rate'] > self.HIGH_BOUNCE_RATE]
+        if high_bounce:
+            page = high_bounce[0]
+            recommendations.append(f"<strong>שפר את התוכן של {page['url']}</strong> - "
+                                   f"{page['clicks']:,} קליקים מגוגל אבל {page['bounce_rate']}% נטישה")
+        
+        no_conversions = [p for p in pages if p['sessions'] > 100 and p['conversions'] == 0]
+        if no_conversions:
+            page = no_conversions[0]
+            recommendations.append(f"<strong>הוסף קריאה לפעולה ב-{page['url']}</strong> - "
+                                   f"{page['sessions']:,} ביקורים ללא המרות")
+        
+        low_ctr = [p for p in pages if p['impressions'] > 1000 and p['ctr'] < 2]
+        if low_ctr:
+            page = low_ctr[0]
+            recommendations.append(f"<strong>שפר את ה-Title וה-Meta Description של {page['url']}</strong> - "
+                                   f"CTR נמוך ({page['ctr']}%) למרות הרבה הצגות")
+        
+        if summary['search_only_pages'] > summary['matched_pages']:
+            recommendations.append("<strong>בדוק את הטמעת Analytics</strong> - "
+                                   "רוב הדפים שמופיעים בחיפוש לא נמדדים ב-Analytics")
+        
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
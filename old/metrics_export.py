@@ -0,0 +1,318 @@
+from datetime import timedelta
+from itertools import groupby
+from urllib.parse import quote
+import heapq
+import os
+from database import db, AnalyticsDailyMetric, UserAccount
+from metrics_store import sync_property, normalize_property_id, score_traffic_totals, INSERT_BATCH_SIZE
+from analytics import AnalyticsService
+from search_console import SearchConsoleService
+from comparison import get_comparison_range
+from config import Config
+from observability import log
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional - only needed for the Parquet export
+    pa = None
+
+# Partition file inside each <dataset>/<key>=<value>/date=YYYY-MM-DD/ directory
+PART_FILE = 'part-0.parquet'
+
+PARQUET_COMPRESSION = 'zstd'
+
+# Metric columns of the traffic dataset - additive sums, as in analytics_daily_metrics
+TRAFFIC_METRICS = [
+    'sessions', 'users', 'bounced_sessions', 'session_duration', 'page_views', 'conversions'
+]
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The Parquet export needs pyarrow (pip install pyarrow)")
+
+def dictionary_type():
+    return pa.dictionary(pa.int32(), pa.string())
+
+def traffic_schema():
+    """channel_group / source_medium repeat across days - both are dictionary encoded"""
+    return pa.schema(
+        [('channel_group', dictionary_type()), ('source_medium', dictionary_type()),
+         ('sessions', pa.int64()), ('users', pa.int64())] +
+        [(name, pa.float64()) for name in TRAFFIC_METRICS[2:]]
+    )
+
+def keyword_schema(dimensions):
+    """Search Console dimensions (query, page, country, device) dictionary encoded, API metrics as is"""
+    return pa.schema(
+        [(name, dictionary_type()) for name in dimensions] +
+        [('clicks', pa.int64()), ('impressions', pa.int64()),
+         ('ctr', pa.float64()), ('position', pa.float64())]
+    )
+
+def iter_days(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+def partition_path(root, dataset, key_name, key, day):
+    """<root>/<dataset>/<key_name>=<key>/date=YYYY-MM-DD/part-0.parquet (Hive layout)"""
+    return os.path.join(root, dataset, f'{key_name}={quote(key, safe="")}',
+                        f'date={day.isoformat()}', PART_FILE)
+
+def write_partition(table, path):
+    """Write one day atomically - a re-export replaces the day, readers never see half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(
+        table, temp_path,
+        compression=PARQUET_COMPRESSION,
+        use_dictionary=[field.name for field in table.schema if pa.types.is_dictionary(field.type)]
+    )
+    os.replace(temp_path, path)
+
+def build_table(schema, rows):
+    """Arrow table from row tuples in schema order"""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema)
+
+def export_traffic(analytics_service, property_id, start_date, end_date, root):
+    """
+    Export a property's per-day traffic metrics - returns the number of days written
+    
+    Rows come from the local metrics store, synced first, so Google is
+    only asked for the days the store is missing or still settling. Days
+    without traffic get an empty partition, so the reader can tell them
+    from days that were never exported.
+    """
+    require_pyarrow()
+    property_id = normalize_property_id(property_id)
+    sync_property(analytics_service, property_id, start_date, end_date)
+    
+    schema = traffic_schema()
+    rows = db.session.query(
+        AnalyticsDailyMetric.date,
+        AnalyticsDailyMetric.channel_group,
+        AnalyticsDailyMetric.source_medium,
+        *(getattr(AnalyticsDailyMetric, name) for name in TRAFFIC_METRICS)
+    ).filter(
+        AnalyticsDailyMetric.property_id == property_id,
+        AnalyticsDailyMetric.date >= start_date,
+        AnalyticsDailyMetric.date <= end_date
+    ).order_by(AnalyticsDailyMetric.date).yield_per(INSERT_BATCH_SIZE)
+    
+    days = {day: [] for day in iter_days(start_date, end_date)}
+    for day, day_rows in groupby(rows, key=lambda row: row[0]):
+        days[day] = [row[1:] for row in day_rows]
+    
+    for day, day_rows in days.items():
+        write_partition(build_table(schema, day_rows),
+                        partition_path(root, 'traffic', 'property', property_id, day))
+    
+    log.info(f"📦 Exported {len(days)} day(s) of Analytics traffic for property {property_id}")
+    return len(days)
+
+def export_keywords(search_service, site_url, start_date, end_date, root, dimensions=('query',)):
+    """
+    Export a site's per-day Search Console rows - returns the number of days written
+    
+    Each day is its own query (no 'date' dimension): a day's partition is
+    written as soon as its pages arrive, and per-day queries are not cut
+    by the API's per-query row cap as early as one long range.
+    """
+    require_pyarrow()
+    dimensions = list(dimensions)
+    schema = keyword_schema(dimensions)
+    
+    days = 0
+    for day in iter_days(start_date, end_date):
+        rows = []
+        for page in search_service.iter_search_analytics_pages(site_url, day, day, dimensions):
+            rows.extend((*row['keys'], row['clicks'], row['impressions'], row['ctr'], row['position'])
+                        for row in page)
+        
+        write_partition(build_table(schema, rows), partition_path(root, 'keywords', 'site', site_url, day))
+        days += 1
+    
+    log.info(f"📦 Exported {days} day(s) of Search Console keywords for site {site_url}")
+    return days
+
+def export_active_accounts(get_credentials, start_date, end_date, root=None):
+    """
+    Export every active Analytics property and Search Console site
+    
+    get_credentials(user_id) returns the user's Google credentials (None
+    when they must reconnect). A property or site linked by several users
+    is exported once. Returns {'properties': n, 'sites': n, 'failed': n}.
+    """
+    require_pyarrow()
+    root = root or Config.METRICS_EXPORT_DIR
+    accounts = UserAccount.query.filter(
+        UserAccount.account_type.in_(['google_analytics', 'search_console']),
+        UserAccount.is_active == True
+    ).order_by(UserAccount.user_id).all()
+    
+    exported = set()
+    counts = {'properties': 0, 'sites': 0, 'failed': 0}
+    for user_id, user_accounts in groupby(accounts, key=lambda account: account.user_id):
+        user_accounts = [account for account in user_accounts
+                         if (account.account_type, account.account_id) not in exported]
+        if not user_accounts:
+            continue
+        
+        credentials = get_credentials(user_id)
+        if not credentials:
+            log.warning(f"⚠️  Skipping export for user {user_id}: Google is not connected")
+            continue
+        
+        for account in user_accounts:
+            try:
+                if account.account_type == 'google_analytics':
+                    export_traffic(AnalyticsService(credentials), account.account_id, start_date, end_date, root)
+                    counts['properties'] += 1
+                else:
+                    export_keywords(SearchConsoleService(credentials), account.account_id, start_date, end_date, root)
+                    counts['sites'] += 1
+                exported.add((account.account_type, account.account_id))
+            
+            except Exception as e:
+                db.session.rollback()
+                log.error(f"❌ Export of {account.account_id} failed: {e}")
+                counts['failed'] += 1
+    
+    return counts
+
+class ArchiveAnalyticsService(AnalyticsService):
+    """AnalyticsService for archived data - scoring and result building only"""
+    
+    def __init__(self):
+        # No googleapiclient client - nothing is fetched from Google
+        self.credentials = None
+
+class ArchiveSearchConsoleService(SearchConsoleService):
+    """SearchConsoleService for archived data - scoring and result building only"""
+    
+    def __init__(self):
+        # No googleapiclient client - nothing is fetched from Google
+        self.credentials = None
+
+class MetricsArchive:
+    """
+    Reads the Parquet export back for offline re-analysis
+    
+    Partition files are memory-mapped, so reading a long range costs page
+    cache rather than heap, and only the days of the requested range are
+    opened. traffic_quality and search_keywords aggregate the days with
+    Arrow and score them with the services' own scoring functions, giving
+    the /api/analyze result format without calling Google.
+    
+    The tree is Hive-partitioned, so pyarrow.dataset, pandas or DuckDB can
+    also read it directly.
+    """
+    
+    def __init__(self, root=None):
+        require_pyarrow()
+        self.root = root or Config.METRICS_EXPORT_DIR
+        self.analytics_service = ArchiveAnalyticsService()
+        self.search_service = ArchiveSearchConsoleService()
+    
+    def read(self, dataset, key_name, key, start_date, end_date, columns=None):
+        """
+        One table of the exported days in the range, with a 'date' column
+        
+        Returns None when no day of the range was exported.
+        """
+        tables = []
+        for day in iter_days(start_date, end_date):
+            path = partition_path(self.root, dataset, key_name, key, day)
+            if not os.path.exists(path):
+                continue
+            
+            table = pq.read_table(path, columns=columns, memory_map=True)
+            tables.append(table.append_column('date', pa.array([day] * table.num_rows, pa.date32())))
+        
+        if not tables:
+            return None
+        # Each file has its own dictionaries - group_by needs them unified
+        return pa.concat_tables(tables).unify_dictionaries()
+    
+    def read_traffic(self, property_id, start_date, end_date, columns=None):
+        return self.read('traffic', 'property', normalize_property_id(property_id), start_date, end_date, columns)
+    
+    def read_keywords(self, site_url, start_date, end_date, columns=None):
+        return self.read('keywords', 'site', site_url, start_date, end_date, columns)
+    
+    def traffic_totals(self, property_id, start_date, end_date):
+        """Per-source sums over the range (score_traffic_totals format), most sessions first"""
+        table = self.read_traffic(property_id, start_date, end_date)
+        if table is None:
+            return None
+        
+        totals = table.group_by(['channel_group', 'source_medium']).aggregate(
+            [(name, 'sum') for name in TRAFFIC_METRICS]
+        )
+        columns = [totals.column(name).to_pylist() for name in
+                   ['channel_group', 'source_medium'] + [f'{name}_sum' for name in TRAFFIC_METRICS]]
+        return sorted(zip(*columns), key=lambda total: total[2], reverse=True)
+    
+    def traffic_quality(self, property_id, start_date, end_date, comparison=None, sort=None, limit=None):
+        """Traffic quality result of archived days - same format as metrics_store.get_traffic_quality_data"""
+        service = self.analytics_service
+        totals = self.traffic_totals(property_id, start_date, end_date)
+        if totals is None:
+            return {'success': False, 'error': f'No exported Analytics data for property {property_id}'}
+        
+        if sort or limit:
+            traffic_sources = score_traffic_totals(service, totals)
+            result = service.build_ranked_result(traffic_sources, start_date, end_date, sort, limit)
+        else:
+            traffic_sources = score_traffic_totals(service, totals[:service.DEFAULT_LIMIT])
+            result = service.build_result(traffic_sources, start_date, end_date)
+        
+        if comparison:
+            previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+            previous_totals = self.traffic_totals(property_id, previous_start, previous_end) or []
+            service.add_comparison(result, score_traffic_totals(service, previous_totals), comparison,
+                                   previous_start, previous_end)
+        
+        return result
+    
+    def keyword_rows(self, site_url, start_date, end_date):
+        """Per-keyword totals over the range as API-style rows (position impression-weighted)"""
+        table = self.read_keywords(site_url, start_date, end_date,
+                                   columns=['query', 'clicks', 'impressions', 'position'])
+        if table is None:
+            return None
+        
+        table = table.append_column('weighted_position',
+                                    pc.multiply(table.column('position'), table.column('impressions')))
+        totals = table.group_by(['query']).aggregate(
+            [('clicks', 'sum'), ('impressions', 'sum'), ('weighted_position', 'sum')]
+        )
+        return self.search_service.totals_to_rows(
+            (keyword, (clicks, impressions, weighted_position))
+            for keyword, clicks, impressions, weighted_position in zip(
+                totals.column('query').to_pylist(),
+                totals.column('clicks_sum').to_pylist(),
+                totals.column('impressions_sum').to_pylist(),
+                totals.column('weighted_position_sum').to_pylist()
+            )
+        )
+    
+    def search_keywords(self, site_url, start_date, end_date, sort=None, limit=None):
+        """Top keywords of archived days - same format as SearchConsoleService.get_top_search_keywords"""
+        service = self.search_service
+        rows = self.keyword_rows(site_url, start_date, end_date)
+        if rows is None:
+            return {'success': False, 'error': f'No exported Search Console data for site {site_url}'}
+        
+        if sort or limit:
+            ranker = service.start_keyword_ranking(limit or service.DEFAULT_LIMIT)
+            service.add_keyword_ranking_rows(ranker, rows)
+            return service.build_ranked_result(ranker, sort or 'clicks', start_date, end_date)
+        
+        top_rows = heapq.nlargest(service.DEFAULT_LIMIT, rows, key=lambda row: row['clicks'])
+        return service.build_result(service.score_rows(top_rows, ['query']), start_date, end_date)
@@ -0,0 +1,244 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from database import db, AnalyticsDailyMetric, AnalyticsSyncState, AnalyticsSyncedRange
+from config import Config
+from comparison import get_date_range, get_comparison_range
+from ga_quota import quota_scheduler, QuotaDeferred
+from observability import log, timed
+
+INSERT_BATCH_SIZE = 5000
+
+def normalize_property_id(property_id):
+    """Store property IDs without the 'properties/' prefix"""
+    return property_id.split('/')[-1]
+
+def merge_ranges(ranges):
+    """Sorted (first, last) date ranges with overlapping and adjacent ranges joined"""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+def get_missing_ranges(covered, synced_at, start_date, end_date, today=None):
+    """
+    Calculate which date ranges need to be fetched from GA
+    
+    covered is the list of (first_date, last_date) ranges already stored -
+    they don't have to be adjacent, so a 'year' comparison syncs its two
+    periods and not the year between them. Returns the days of the window
+    not stored yet, plus a rolling re-fetch of the last ANALYTICS_SETTLE_DAYS
+    days when the last sync is older than ANALYTICS_RESYNC_MINUTES (GA data
+    keeps changing for a few days).
+    """
+    today = today or datetime.now().date()
+    ranges = []
+    
+    # ימים בחלון שלא נכללים באף טווח שמור
+    day = start_date
+    for first, last in merge_ranges(covered):
+        if last < day:
+            continue
+        if first > end_date:
+            break
+        if first > day:
+            ranges.append((day, first - timedelta(days=1)))
+        day = last + timedelta(days=1)
+    if day <= end_date:
+        ranges.append((day, end_date))
+    
+    # רענון ימים שעדיין מתעדכנים
+    if covered and synced_at is not None and \
+            datetime.utcnow() - synced_at >= timedelta(minutes=Config.ANALYTICS_RESYNC_MINUTES):
+        settle_from = max(start_date, today - timedelta(days=Config.ANALYTICS_SETTLE_DAYS))
+        if settle_from <= end_date:
+            ranges.append((settle_from, end_date))
+    
+    return merge_ranges(ranges)
+
+def sync_property(analytics_service, property_id, start_date, end_date):
+    """
+    Incrementally sync daily GA rows for a property into the local store
+    
+    The missing days are fetched from GA first - paging and quota waits
+    included - and only then written in one short transaction, so no write
+    lock is held during the network calls. Returns the number of API ranges
+    fetched (0 when the store is fresh).
+    """
+    property_id = normalize_property_id(property_id)
+    with timed('db'):
+        state = AnalyticsSyncState.query.filter_by(property_id=property_id).first()
+        covered = [(synced.first_date, synced.last_date)
+                   for synced in AnalyticsSyncedRange.query.filter_by(property_id=property_id)]
+    ranges = get_missing_ranges(covered, state.synced_at if state else None, start_date, end_date)
+    
+    # מכסת GA של הנכס כמעט נוצלה - אם הטווח כבר שמור, מוותרים על הרענון
+    if (ranges and not get_missing_ranges(covered, None, start_date, end_date)
+            and quota_scheduler.would_exhaust(property_id)):
+        log.warning(f"⏳ GA4 quota low for property {property_id} - answering from the local store without resync")
+        return 0
+    
+    if not ranges:
+        return 0
+    
+    fetched = [
+        (range_start, range_end, list(analytics_service.fetch_daily_rows(property_id, range_start, range_end)))
+        for range_start, range_end in ranges
+    ]
+    
+    with timed('db'):
+        store_ranges(property_id, fetched)
+    log.info(f"✅ Synced {len(ranges)} date range(s) for property {property_id}")
+    
+    return len(ranges)
+
+def store_ranges(property_id, fetched):
+    """
+    Replace the stored days of the fetched ranges and record them as covered - one transaction
+    
+    fetched is a list of (range_start, range_end, rows). The covered ranges
+    are re-read inside the transaction and merged with the fetched ones, so
+    ranges stored meanwhile by another process are kept. When that process
+    synced the same property at the same time (duplicate sync state or daily
+    rows), the transaction is rolled back and redone once on top of what it
+    stored.
+    """
+    for attempt in range(2):
+        try:
+            for range_start, range_end, rows in fetched:
+                # מחיקת ימים קיימים בטווח לפני הכנסה מחדש
+                AnalyticsDailyMetric.query.filter(
+                    AnalyticsDailyMetric.property_id == property_id,
+                    AnalyticsDailyMetric.date >= range_start,
+                    AnalyticsDailyMetric.date <= range_end
+                ).delete(synchronize_session=False)
+                
+                for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+                    db.session.bulk_insert_mappings(AnalyticsDailyMetric, [
+                        dict(row, property_id=property_id) for row in rows[offset:offset + INSERT_BATCH_SIZE]
+                    ])
+            
+            # הטווחים השמורים אחרי הסנכרון - מאוחדים מחדש
+            stored = AnalyticsSyncedRange.query.filter_by(property_id=property_id).all()
+            covered = merge_ranges([(synced.first_date, synced.last_date) for synced in stored] +
+                                   [(range_start, range_end) for range_start, range_end, _ in fetched])
+            for synced in stored:
+                db.session.delete(synced)
+            db.session.add_all([
+                AnalyticsSyncedRange(property_id=property_id, first_date=first, last_date=last)
+                for first, last in covered
+            ])
+            
+            state = AnalyticsSyncState.query.filter_by(property_id=property_id).first()
+            if state is None:
+                db.session.add(AnalyticsSyncState(property_id=property_id, first_date=covered[0][0],
+                                                  last_date=covered[-1][1]))
+            else:
+                # רק סנכרון של הימים האחרונים מאפס את שעון הרענון
+                if any(range_end >= state.last_date for _, range_end, _ in fetched):
+                    state.synced_at = datetime.utcnow()
+                state.first_date = covered[0][0]
+                state.last_date = covered[-1][1]
+            
+            db.session.commit()
+            return
+        
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+
+def query_traffic_sources(analytics_service, property_id, start_date, end_date, limit=10):
+    """Aggregate stored daily rows into scored traffic sources"""
+    property_id = normalize_property_id(property_id)
+    sessions = func.sum(AnalyticsDailyMetric.sessions)
+    
+    with timed('db'):
+        rows = db.session.query(
+            AnalyticsDailyMetric.channel_group,
+            AnalyticsDailyMetric.source_medium,
+            sessions,
+            func.sum(AnalyticsDailyMetric.users),
+            func.sum(AnalyticsDailyMetric.bounced_sessions),
+            func.sum(AnalyticsDailyMetric.session_duration),
+            func.sum(AnalyticsDailyMetric.page_views),
+            func.sum(AnalyticsDailyMetric.conversions)
+        ).filter(
+            AnalyticsDailyMetric.property_id == property_id,
+            AnalyticsDailyMetric.date >= start_date,
+            AnalyticsDailyMetric.date <= end_date
+        ).group_by(
+            AnalyticsDailyMetric.channel_group,
+            AnalyticsDailyMetric.source_medium
+        ).order_by(sessions.desc()).limit(limit).all()  # limit=None returns all sources
+    
+    return score_traffic_totals(analytics_service, rows)
+
+def score_traffic_totals(analytics_service, totals):
+    """
+    Scored TrafficReport from per-source sums of the stored daily metrics
+    
+    Each total is (channel_group, source_medium, sessions, users,
+    bounced_sessions, session_duration, page_views, conversions) - also
+    used by the Parquet archive reader (metrics_export.py).
+    """
+    parsed_rows = []
+    for channel_group, source_medium, total_sessions, users, bounced, duration, page_views, conversions in totals:
+        total_sessions = int(total_sessions or 0)
+        divisor = total_sessions or 1
+        parsed_rows.append((
+            channel_group, source_medium, total_sessions, int(users or 0),
+            (bounced or 0) / divisor * 100,
+            (duration or 0) / divisor,
+            (page_views or 0) / divisor,
+            int(conversions or 0)
+        ))
+    
+    return analytics_service.build_traffic_sources(parsed_rows)
+
+def get_traffic_quality_data(analytics_service, property_id, date_range='30days', comparison=None,
+                             sort=None, limit=None):
+    """
+    Traffic quality data answered from the local store
+    
+    Same result format as AnalyticsService.get_traffic_quality_data,
+    including the comparison period and the sort / limit rankings when requested.
+    """
+    try:
+        start_date, end_date = get_date_range(date_range)
+        sync_property(analytics_service, property_id, start_date, end_date)
+        
+        if sort or limit:
+            # דירוג כל המקורות, לא רק 10 המובילים בביקורים
+            traffic_sources = query_traffic_sources(analytics_service, property_id, start_date, end_date,
+                                                    limit=None)
+            result = analytics_service.build_ranked_result(traffic_sources, start_date, end_date, sort, limit)
+        else:
+            traffic_sources = query_traffic_sources(analytics_service, property_id, start_date, end_date)
+            result = analytics_service.build_result(traffic_sources, start_date, end_date)
+        
+        if comparison:
+            previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+            sync_property(analytics_service, property_id, previous_start, previous_end)
+            previous_sources = query_traffic_sources(analytics_service, property_id,
+                                                     previous_start, previous_end, limit=None)
+            analytics_service.add_comparison(result, previous_sources, comparison,
+                                             previous_start, previous_end)
+        
+        return result
+    
+    except QuotaDeferred as e:
+        db.session.rollback()
+        log.warning(f"⏳ {e}")
+        return e.to_result()
+    
+    except Exception as e:
+        db.session.rollback()
+        log.error(f"❌ Error reading Analytics data from local store: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
@@ -0,0 +1,214 @@
+from datetime import datetime
+from sqlalchemy import (Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, LargeBinary, MetaData,
+                        String, Table, Text, UniqueConstraint, inspect, text)
+from database import db
+
+# טבלת מעקב אחרי migrations שהורצו
+VERSION_TABLE = 'schema_migrations'
+
+# Migrations keep their own frozen DDL - later model changes must not change
+# what an old migration creates
+
+def initial_schema(connection):
+    """Base tables (no-op for databases created by the old db.create_all)"""
+    metadata = MetaData()
+    
+    Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('email', String(120), unique=True, nullable=False),
+        Column('name', String(100), nullable=False),
+        Column('google_id', String(50), unique=True, nullable=True),
+        Column('facebook_id', String(50), unique=True, nullable=True),
+        Column('created_at', DateTime),
+        Column('is_active', Boolean)
+    )
+    Table(
+        'google_tokens', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('access_token', Text, nullable=False),
+        Column('refresh_token', Text, nullable=True),
+        Column('token_uri', String(200), nullable=True),
+        Column('client_id', String(200), nullable=True),
+        Column('client_secret', Text, nullable=True),
+        Column('scopes', Text, nullable=True),
+        Column('expires_at', DateTime, nullable=True),
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime)
+    )
+    Table(
+        'facebook_tokens', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('access_token', Text, nullable=False),
+        Column('token_type', String(20)),
+        Column('expires_at', DateTime, nullable=True),
+        Column('permissions', Text, nullable=True),
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime)
+    )
+    Table(
+        'user_accounts', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('account_type', String(20), nullable=False),
+        Column('account_id', String(100), nullable=False),
+        Column('account_name', String(200), nullable=False),
+        Column('website_url', String(300), nullable=True),
+        Column('is_active', Boolean),
+        Column('created_at', DateTime)
+    )
+    Table(
+        'analytics_daily_metrics', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('property_id', String(100), nullable=False, index=True),
+        Column('date', Date, nullable=False),
+        Column('channel_group', String(100), nullable=False),
+        Column('source_medium', String(300), nullable=False),
+        Column('sessions', Integer),
+        Column('users', Integer),
+        Column('bounced_sessions', Float),
+        Column('session_duration', Float),
+        Column('page_views', Float),
+        Column('conversions', Float),
+        UniqueConstraint('property_id', 'date', 'channel_group', 'source_medium',
+                         name='uq_analytics_daily_metric')
+    )
+    Table(
+        'analytics_sync_state', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('property_id', String(100), unique=True, nullable=False),
+        Column('first_date', Date, nullable=False),
+        Column('last_date', Date, nullable=False),
+        Column('synced_at', DateTime)
+    )
+    
+    metadata.create_all(bind=connection, checkfirst=True)
+
+def add_lookup_indexes(connection):
+    """Composite account lookup index and token user_id indexes"""
+    indexes = [
+        ('ix_user_accounts_user_type_active', 'user_accounts', 'user_id, account_type, is_active'),
+        ('ix_google_tokens_user_id', 'google_tokens', 'user_id'),
+        ('ix_facebook_tokens_user_id', 'facebook_tokens', 'user_id'),
+    ]
+    
+    existing = set()
+    inspector = inspect(connection)
+    for table_name in ['user_accounts', 'google_tokens', 'facebook_tokens']:
+        existing.update(index['name'] for index in inspector.get_indexes(table_name))
+    
+    for name, table_name, columns in indexes:
+        if name not in existing:
+            connection.execute(text(f'CREATE INDEX {name} ON {table_name} ({columns})'))
+
+def add_prewarmed_analyses(connection):
+    """Table of analyses precomputed off-peak (prewarm.py)"""
+    metadata = MetaData()
+    # Only referenced by the foreign key - created by migration 1
+    Table('users', metadata, Column('id', Integer, primary_key=True))
+    prewarmed_analyses = Table(
+        'prewarmed_analyses', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('action_id', String(50), nullable=False),
+        Column('account_id', String(100), nullable=False),
+        Column('date_range', String(20), nullable=False),
+        Column('comparison', String(20), nullable=False),
+        Column('results', LargeBinary, nullable=True),
+        Column('computed_at', DateTime, nullable=True),
+        Column('claimed_at', DateTime, nullable=True),
+        UniqueConstraint('user_id', 'action_id', 'account_id', 'date_range', 'comparison',
+                         name='uq_prewarmed_analysis')
+    )
+    prewarmed_analyses.create(bind=connection, checkfirst=True)
+
+def add_analytics_synced_ranges(connection):
+    """Stored day ranges per property - the local store may hold non-adjacent periods"""
+    synced_ranges = Table(
+        'analytics_synced_ranges', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('property_id', String(100), nullable=False, index=True),
+        Column('first_date', Date, nullable=False),
+        Column('last_date', Date, nullable=False)
+    )
+    synced_ranges.create(bind=connection, checkfirst=True)
+    
+    # Stores synced before were one contiguous range per property
+    connection.execute(text(
+        'INSERT INTO analytics_synced_ranges (property_id, first_date, last_date) '
+        'SELECT property_id, first_date, last_date FROM analytics_sync_state'
+    ))
+
+def add_google_token_refresh_claim(connection):
+    """google_tokens.refreshing_until - cross-process claim of a token refresh (token_manager.py)"""
+    columns = [column['name'] for column in inspect(connection).get_columns('google_tokens')]
+    if 'refreshing_until' not in columns:
+        connection.execute(text('ALTER TABLE google_tokens ADD COLUMN refreshing_until TIMESTAMP'))
+
+def add_analysis_jobs(connection):
+    """Background analysis jobs (jobs.py) - shared by all worker processes"""
+    metadata = MetaData()
+    # Only referenced by the foreign key - created by migration 1
+    Table('users', metadata, Column('id', Integer, primary_key=True))
+    analysis_jobs = Table(
+        'analysis_jobs', metadata,
+        Column('id', String(32), primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('status', String(20), nullable=False),
+        Column('result', LargeBinary, nullable=True),
+        Column('created_at', DateTime),
+        Column('finished_at', DateTime, nullable=True)
+    )
+    analysis_jobs.create(bind=connection, checkfirst=True)
+
+# (version, description, function) - append only, never reorder
+MIGRATIONS = [
+    (1, 'initial schema', initial_schema),
+    (2, 'lookup indexes on user_accounts and token tables', add_lookup_indexes),
+    (3, 'prewarmed analyses table', add_prewarmed_analyses),
+    (4, 'analytics synced ranges table', add_analytics_synced_ranges),
+    (5, 'google token refresh claim column', add_google_token_refresh_claim),
+    (6, 'analysis jobs table', add_analysis_jobs),
+]
+
+def get_current_version(connection):
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(200) NOT NULL, '
+        'applied_at TIMESTAMP NOT NULL)'
+    ))
+    return connection.execute(text(f'SELECT MAX(version) FROM {VERSION_TABLE}')).scalar() or 0
+
+def run_migrations():
+    """Apply pending migrations in order, each in its own transaction"""
+    with db.engine.connect() as connection:
+        with connection.begin():
+            current_version = get_current_version(connection)
+    
+    applied = 0
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        
+        try:
+            with db.engine.begin() as connection:
+                migrate(connection)
+                connection.execute(
+                    text(f'INSERT INTO {VERSION_TABLE} (version, description, applied_at) '
+                         'VALUES (:version, :description, :applied_at)'),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+        except Exception:
+            # Another worker may have applied it at the same time
+            with db.engine.begin() as connection:
+                if get_current_version(connection) >= version:
+                    continue
+            raise
+        
+        print(f"🗄️  Migration {version} applied: {description}")
+        applied += 1
+    
+    return applied
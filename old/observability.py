@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import bisect
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from config import Config
+
+# Phase histogram buckets in seconds - from a cached lookup to a slow paged report
+PHASE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Labelled Prometheus histogram kept in-process"""
+    
+    def __init__(self, name, documentation, label_names, buckets=PHASE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+    
+    def render(self, constant_labels):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        names = self.label_names + tuple(constant_labels)
+        with self._lock:
+            series_items = [(values, list(series)) for values, series in sorted(self._series.items())]
+        
+        for values, series in series_items:
+            labels = format_labels(names, values + tuple(constant_labels.values()))
+            count = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), series[:-1]):
+                count += bucket_count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {format_value(series[-1])}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+class Counter:
+    """Labelled Prometheus counter kept in-process"""
+    
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def render(self, constant_labels):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        names = self.label_names + tuple(constant_labels)
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.append(f'{self.name}{{{format_labels(names, values + tuple(constant_labels.values()))}}} {value}')
+        return lines
+
+class MetricsRegistry:
+    """
+    Metrics of this process in the Prometheus text format (/metrics)
+    
+    Every sample carries a worker="<pid>" label: each gunicorn worker keeps
+    its own series, so whichever worker answers a scrape, its counters only
+    go up - sum() across workers in the queries.
+    """
+    
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    
+    def __init__(self):
+        self.metrics = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self):
+        constant_labels = {'worker': str(os.getpid())}
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(constant_labels))
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+phase_seconds = registry.register(Histogram(
+    'dtv3_phase_seconds',
+    'Time spent in each phase of an operation (one observation per call).',
+    ['operation', 'phase']
+))
+
+log_records = registry.register(Counter(
+    'dtv3_log_records_total',
+    'Log records by level and outcome (written, sampled_out, dropped).',
+    ['level', 'outcome']
+))
+
+# Operation the current request / job / thread works for - the label of
+# phases timed deep inside shared code (transport, client pool, scoring)
+current_operation = ContextVar('current_operation', default='other')
+
+@contextmanager
+def timed(phase, operation=None):
+    """Time a block into dtv3_phase_seconds{operation, phase}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_seconds.observe(time.perf_counter() - start, operation or current_operation.get(), phase)
+
+@contextmanager
+def operation_scope(operation):
+    """Label the phases timed inside the block with operation, and time the block as phase 'total'"""
+    token = current_operation.set(operation)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_seconds.observe(time.perf_counter() - start, operation, 'total')
+        current_operation.reset(token)
+
+def submit_in_context(executor, func, *args):
+    """executor.submit that keeps the caller's operation label in the worker thread"""
+    return executor.submit(copy_context().run, func, *args)
+
+# Logging - records are queued by the request thread and written by a
+# listener thread, so a slow stdout never blocks a request
+
+class SamplingFilter(logging.Filter):
+    """Passes every WARNING and above, and a sample_rate share of the rest"""
+    
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return True
+        log_records.inc(record.levelname, 'sampled_out')
+        return False
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking"""
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            log_records.inc(record.levelname, 'written')
+        except queue.Full:
+            log_records.inc(record.levelname, 'dropped')
+
+log = logging.getLogger('dtv3')
+_listener = None
+
+def setup_logging(level=None, sample_rate=None, queue_size=None):
+    """Route the 'dtv3' logger through a bounded queue to stdout (once per process)"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    records = queue.Queue(maxsize=queue_size or Config.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+    
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter('%(message)s'))
+    
+    log.setLevel(level or Config.LOG_LEVEL)
+    log.addHandler(handler)
+    log.propagate = False
+    
+    _listener = QueueListener(records, output)
+    _listener.start()
+    # Flush what is still queued on shutdown
+    atexit.register(_listener.stop)
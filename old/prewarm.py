@@ -0,0 +1,269 @@
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+import threading
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from database import db, UserAccount, PrewarmedAnalysis
+from json_response import dumps, loads
+from config import Config
+from observability import log
+
+# account_type -> (action_id, request parameter of the account)
+PREWARM_ACTIONS = {
+    'google_analytics': ('traffic-quality', 'analyticsAccount'),
+    'search_console': ('search-keywords', 'searchAccount'),
+}
+
+def parse_hours(hours):
+    """'2-5' -> (2, 5); the window may wrap midnight ('22-4')"""
+    start, end = (int(hour) for hour in hours.split('-'))
+    return start, end
+
+class AnalysisPrewarmer:
+    """
+    Precomputes dashboard analyses for every active account off-peak
+    
+    Once per off-peak window (UTC hours) a background thread runs the
+    traffic-quality / search-keywords analysis of each active Google
+    Analytics / Search Console account with the action page's default
+    parameters and stores the results in prewarmed_analyses, where
+    /api/analyze of any worker finds them (see load).
+    
+    At most max_workers analyses run at once, and at most max_per_user of
+    them for the same user: users are served round robin, so a user with
+    fifty properties doesn't hold up everyone else's first one. Each
+    analysis is claimed in the database first, so when every worker
+    process runs a prewarmer an account is still analyzed once per window.
+    """
+    
+    def __init__(self, hours='2-5', date_range='30days', comparison='previous', max_workers=4,
+                 max_per_user=1, max_age_hours=26, check_interval_seconds=300):
+        self.hours = parse_hours(hours)
+        self.date_range = date_range
+        self.comparison = comparison
+        self.max_workers = max_workers
+        self.max_per_user = max_per_user
+        self.max_age = timedelta(hours=max_age_hours)
+        self.check_interval_seconds = check_interval_seconds
+        self._last_window = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def window_start(self, now):
+        """Start of the off-peak window that contains now, None outside it"""
+        start, end = self.hours
+        hour = now.hour
+        if not (start <= hour < end if start <= end else hour >= start or hour < end):
+            return None
+        
+        window_start = now.replace(hour=start, minute=0, second=0, microsecond=0)
+        if window_start > now:
+            # Wrapped window, opened yesterday
+            window_start -= timedelta(days=1)
+        return window_start
+    
+    def is_prewarmed(self, action_id, date_range, comparison, sort=None, limit=None):
+        """Whether an analysis with these parameters is one that gets prewarmed"""
+        return (any(action == action_id for action, _ in PREWARM_ACTIONS.values()) and
+                date_range == self.date_range and comparison == self.comparison and
+                not sort and not limit)
+    
+    def load(self, user_id, action_id, account_id):
+        """
+        (results, computed_at) of a prewarmed analysis, None when missing or too old
+        
+        Only served while the account is still active.
+        """
+        if not account_id:
+            return None
+        
+        prewarmed = db.session.query(PrewarmedAnalysis.results, PrewarmedAnalysis.computed_at).join(
+            UserAccount,
+            (UserAccount.user_id == PrewarmedAnalysis.user_id) &
+            (UserAccount.account_id == PrewarmedAnalysis.account_id)
+        ).filter(
+            PrewarmedAnalysis.user_id == user_id,
+            PrewarmedAnalysis.action_id == action_id,
+            PrewarmedAnalysis.account_id == account_id,
+            PrewarmedAnalysis.date_range == self.date_range,
+            PrewarmedAnalysis.comparison == self.comparison,
+            PrewarmedAnalysis.results.isnot(None),
+            PrewarmedAnalysis.computed_at >= datetime.utcnow() - self.max_age,
+            UserAccount.is_active == True
+        ).first()
+        if prewarmed is None:
+            return None
+        return loads(prewarmed.results), prewarmed.computed_at
+    
+    def collect_tasks(self):
+        """{user_id: deque of (action_id, account_id, /api/analyze parameters)} for every active account"""
+        accounts = UserAccount.query.filter(
+            UserAccount.account_type.in_(list(PREWARM_ACTIONS)),
+            UserAccount.is_active == True
+        ).order_by(UserAccount.user_id, UserAccount.id).all()
+        
+        tasks = {}
+        for account in accounts:
+            action_id, account_param = PREWARM_ACTIONS[account.account_type]
+            tasks.setdefault(account.user_id, deque()).append((action_id, account.account_id, {
+                'action_id': action_id,
+                account_param: account.account_id,
+                'dateRange': self.date_range,
+                'comparison': self.comparison
+            }))
+        return tasks
+    
+    def claim(self, user_id, action_id, account_id, window_start):
+        """Claim an analysis for this window - False when another process already did"""
+        key = {
+            'user_id': user_id,
+            'action_id': action_id,
+            'account_id': account_id,
+            'date_range': self.date_range,
+            'comparison': self.comparison
+        }
+        now = datetime.utcnow()
+        try:
+            updated = PrewarmedAnalysis.query.filter_by(**key).filter(or_(
+                PrewarmedAnalysis.claimed_at.is_(None),
+                PrewarmedAnalysis.claimed_at < window_start
+            )).update({'claimed_at': now}, synchronize_session=False)
+            
+            if not updated:
+                if PrewarmedAnalysis.query.filter_by(**key).first() is not None:
+                    db.session.rollback()
+                    return False
+                db.session.add(PrewarmedAnalysis(claimed_at=now, **key))
+            
+            db.session.commit()
+            return True
+        
+        except IntegrityError:
+            # Another process inserted the same analysis first
+            db.session.rollback()
+            return False
+    
+    def save(self, user_id, action_id, account_id, results):
+        PrewarmedAnalysis.query.filter_by(
+            user_id=user_id,
+            action_id=action_id,
+            account_id=account_id,
+            date_range=self.date_range,
+            comparison=self.comparison
+        ).update({'results': dumps(results), 'computed_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+    
+    def prewarm(self, app, analyze, user_id, task, window_start):
+        """Claim, analyze and store one analysis - True when it was stored"""
+        action_id, account_id, data = task
+        
+        with app.app_context():
+            try:
+                if not self.claim(user_id, action_id, account_id, window_start):
+                    return False
+                
+                payload = analyze(user_id, data)
+                # 'stale' - GA quota was low and the cached result came back
+                if not payload.get('success') or payload.get('cache') == 'stale':
+                    log.warning(f"⚠️  Prewarm of {action_id} for {account_id} skipped: {payload.get('error', 'stale result')}")
+                    return False
+                
+                self.save(user_id, action_id, account_id, payload['results'])
+                return True
+            
+            except Exception as e:
+                db.session.rollback()
+                log.error(f"❌ Prewarm of {action_id} for {account_id} failed: {e}")
+                return False
+            finally:
+                db.session.remove()
+    
+    def next_task(self, users, tasks, running):
+        """Next (user_id, task) round robin among users below max_per_user, None if all are busy"""
+        for _ in range(len(users)):
+            user_id = users.popleft()
+            if running[user_id] >= self.max_per_user:
+                users.append(user_id)
+                continue
+            
+            task = tasks[user_id].popleft()
+            if tasks[user_id]:
+                users.append(user_id)
+            return user_id, task
+        return None
+    
+    def run(self, app, analyze, window_start):
+        """
+        Prewarm every active account of every user - returns the number stored
+        
+        analyze(user_id, data) runs one analysis, bypassing the caches, and
+        returns the /api/analyze payload. Stops handing out analyses when the
+        window closes; the rest wait for the next one.
+        """
+        with app.app_context():
+            try:
+                tasks = self.collect_tasks()
+            finally:
+                db.session.remove()
+        
+        users = deque(tasks)
+        running = Counter()
+        pending = {}
+        stored = 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-prewarm') as executor:
+            while users or pending:
+                while users and len(pending) < self.max_workers and not self._stop_event.is_set() and \
+                        self.window_start(datetime.utcnow()) == window_start:
+                    task = self.next_task(users, tasks, running)
+                    if task is None:
+                        break
+                    
+                    user_id, task = task
+                    running[user_id] += 1
+                    pending[executor.submit(self.prewarm, app, analyze, user_id, task, window_start)] = user_id
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running[pending.pop(future)] -= 1
+                    stored += future.result()
+        
+        return stored
+    
+    def start(self, app, analyze):
+        """Start the scheduler thread - runs once per off-peak window"""
+        if self._thread is not None:
+            return
+        
+        def loop():
+            while not self._stop_event.wait(self.check_interval_seconds):
+                window_start = self.window_start(datetime.utcnow())
+                if window_start is None or window_start == self._last_window:
+                    continue
+                
+                self._last_window = window_start
+                try:
+                    stored = self.run(app, analyze, window_start)
+                    log.info(f"🔥 Prewarmed {stored} analyses")
+                except Exception as e:
+                    log.error(f"❌ Prewarm loop error: {e}")
+        
+        self._thread = threading.Thread(target=loop, name='analysis-prewarm', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+
+analysis_prewarmer = AnalysisPrewarmer(
+    hours=Config.ANALYSIS_PREWARM_HOURS,
+    date_range=Config.ANALYSIS_PREWARM_DATE_RANGE,
+    comparison=Config.ANALYSIS_PREWARM_COMPARISON,
+    max_workers=Config.ANALYSIS_PREWARM_MAX_WORKERS,
+    max_per_user=Config.ANALYSIS_PREWARM_MAX_PER_USER,
+    max_age_hours=Config.ANALYSIS_PREWARM_MAX_AGE_HOURS,
+    check_interval_seconds=Config.ANALYSIS_PREWARM_CHECK_INTERVAL_SECONDS
+)
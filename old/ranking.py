@@ -0,0 +1,43 @@
+import heapq
+
+class MultiTopK:
+    """
+    Top `limit` rows under several rankings at once, in a single pass
+    
+    rankings maps a name to a key function; higher keys rank first. Each
+    ranking keeps a min-heap of at most `limit` entries, so memory is
+    O(limit * rankings) however many rows stream through. Rows with equal
+    keys keep their arrival order, like a stable sort(reverse=True).
+    """
+    
+    def __init__(self, limit, rankings):
+        self.limit = limit
+        self.rankings = rankings
+        self.count = 0
+        self._heaps = {name: [] for name in rankings}
+    
+    def add(self, row):
+        # Earlier rows win ties: -count is larger for them
+        order = -self.count
+        self.count += 1
+        
+        for name, key in self.rankings.items():
+            heap = self._heaps[name]
+            entry = (key(row), order, row)
+            if len(heap) < self.limit:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+    
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+    
+    def top(self, name):
+        """Rows of one ranking, best first"""
+        return [entry[2] for entry in sorted(self._heaps[name], key=lambda entry: entry[:2], reverse=True)]
+    
+    def labels(self, label):
+        """{ranking: [label(row), ...]} for every ranking - a compact view of all of them"""
+        return {name: [label(row) for row in self.top(name)] for name in self.rankings}
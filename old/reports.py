@@ -0,0 +1,202 @@
+from abc import ABC, abstractmethod
+from array import array
+
+# potential_clicks of keywords already at a top 3 position
+FULL_POTENTIAL = -1.0
+
+def format_traffic_potential(potential_clicks):
+    """Traffic potential label of a keyword from its additional potential clicks"""
+    if potential_clicks < 0:
+        return "מיצוי מלא"
+    elif potential_clicks < 10:
+        return "פוטנציאל נמוך"
+    elif potential_clicks < 100:
+        return f"פוטנציאל בינוני (+{int(potential_clicks)})"
+    else:
+        return f"פוטנציאל גבוה (+{int(potential_clicks)})"
+
+class ColumnarReport(ABC):
+    """
+    Report rows stored column by column
+    
+    Numbers live in typed arrays and strings in plain lists (shared with the
+    API response, not copied), so a row costs a few dozen bytes instead of
+    a ~10 key dict with its own floats and display strings. Display strings
+    are formatted only when a row is read: indexing or iterating a report
+    returns the same row dicts the services used to build, and to_list() is
+    what gets serialized (see json_default).
+    
+    Subclasses list their columns in COLUMNS as (name, typecode); typecode
+    None means a list column. Counts are whole numbers ('q') - append()
+    passes them through int(), since the APIs may send them as floats.
+    """
+    
+    COLUMNS = ()
+    
+    def __init__(self):
+        self.columns = {name: array(typecode) if typecode else [] for name, typecode in self.COLUMNS}
+        # Per-row comparison dicts (attach_comparison), None when not compared
+        self.comparison = None
+    
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self.row(index)
+    
+    def __iter__(self):
+        return map(self.build_row, *self.row_columns())
+    
+    def row(self, index):
+        return self.build_row(*(column[index] for column in self.row_columns()))
+    
+    def row_columns(self):
+        """Columns passed to build_row, comparison last when present"""
+        columns = list(self.columns.values())
+        if self.comparison is not None:
+            columns.append(self.comparison)
+        return columns
+    
+    @abstractmethod
+    def build_row(self, *values):
+        """Row dict from one value per column (comparison last when present)"""
+    
+    def to_list(self):
+        return list(self)
+    
+    def column(self, name):
+        return self.columns[name]
+    
+    def take(self, indexes):
+        """New report with the rows at indexes, in that order"""
+        report = self.empty_like()
+        for name, values in self.columns.items():
+            target = report.columns[name]
+            target.extend(values[index] for index in indexes)
+        if self.comparison is not None:
+            report.comparison = [self.comparison[index] for index in indexes]
+        return report
+    
+    def empty_like(self):
+        return type(self)()
+    
+    def sort_by(self, name, reverse=True):
+        """Stable in-place sort on one column - same order as list.sort(key=row[name])"""
+        values = self.columns[name]
+        order = sorted(range(len(self)), key=values.__getitem__, reverse=reverse)
+        sorted_report = self.take(order)
+        self.columns = sorted_report.columns
+        self.comparison = sorted_report.comparison
+        return self
+
+class TrafficReport(ColumnarReport):
+    """Traffic source rows (AnalyticsService.build_traffic_sources)"""
+    
+    COLUMNS = (
+        ('source', None),
+        ('source_medium', None),
+        ('sessions', 'q'),
+        ('users', 'q'),
+        ('avg_session_duration_seconds', 'd'),
+        ('bounce_rate', 'd'),
+        ('pages_per_session', 'd'),
+        ('conversions', 'q'),
+        ('quality_score', 'q')
+    )
+    
+    def append(self, channel_group, source_medium, sessions, users,
+               bounce_rate, avg_duration, pages_per_session, conversions, quality_score):
+        columns = self.columns
+        columns['source'].append(channel_group)
+        columns['source_medium'].append(source_medium)
+        columns['sessions'].append(int(sessions))
+        columns['users'].append(int(users))
+        columns['avg_session_duration_seconds'].append(avg_duration)
+        columns['bounce_rate'].append(round(bounce_rate, 1))
+        columns['pages_per_session'].append(round(pages_per_session, 1))
+        columns['conversions'].append(int(conversions))
+        columns['quality_score'].append(int(quality_score))
+    
+    def build_row(self, source, source_medium, sessions, users, avg_duration,
+                  bounce_rate, pages_per_session, conversions, quality_score, *comparison):
+        row = {
+            'source': source,
+            'source_medium': source_medium,
+            'sessions': sessions,
+            'users': users,
+            # Format session duration as MM:SS
+            'avg_session_duration': f"{int(avg_duration // 60)}:{int(avg_duration % 60):02d}",
+            'avg_session_duration_seconds': avg_duration,
+            'bounce_rate': bounce_rate,
+            'pages_per_session': pages_per_session,
+            'conversions': conversions,
+            'quality_score': quality_score
+        }
+        if comparison:
+            row['comparison'] = comparison[0]
+        return row
+
+class KeywordReport(ColumnarReport):
+    """
+    Search Console rows (SearchConsoleService.score_rows format)
+    
+    Dimension columns come first, named like the row keys ('keyword' for
+    query, then 'page', 'country', ...). traffic_potential is kept as the
+    number of additional clicks (FULL_POTENTIAL when already at the top)
+    and turned into its label on read.
+    """
+    
+    METRIC_COLUMNS = (
+        ('clicks', 'q'),
+        ('impressions', 'q'),
+        ('ctr', 'd'),
+        ('position', 'd'),
+        ('quality_score', 'q'),
+        ('potential_clicks', 'd')
+    )
+    
+    def __init__(self, dimensions=('query',)):
+        self.dimensions = tuple(dimensions)
+        self.COLUMNS = tuple(('keyword' if name == 'query' else name, None)
+                             for name in self.dimensions) + self.METRIC_COLUMNS
+        super().__init__()
+        self.keys = [name for name, _ in self.COLUMNS[:len(self.dimensions)]]
+    
+    def empty_like(self):
+        return type(self)(self.dimensions)
+    
+    def append(self, keys, clicks, impressions, ctr, position, quality_score, potential_clicks):
+        columns = self.columns
+        for name, value in zip(self.keys, keys):
+            columns[name].append(value)
+        columns['clicks'].append(int(clicks))
+        columns['impressions'].append(int(impressions))
+        columns['ctr'].append(round(ctr, 2))
+        columns['position'].append(round(position, 1))
+        columns['quality_score'].append(int(quality_score))
+        columns['potential_clicks'].append(potential_clicks)
+    
+    def build_row(self, *values):
+        count = len(self.keys)
+        clicks, impressions, ctr, position, quality_score, potential_clicks = values[count:count + 6]
+        
+        row = dict(zip(self.keys, values))
+        row['clicks'] = clicks
+        row['impressions'] = impressions
+        row['ctr'] = ctr
+        row['position'] = position
+        row['quality_score'] = quality_score
+        row['traffic_potential'] = format_traffic_potential(potential_clicks)
+        if len(values) > count + 6:
+            row['comparison'] = values[-1]
+        return row
+
+def json_default(obj):
+    """default= hook for json.dumps - reports serialize as their list of row dicts"""
+    if isinstance(obj, ColumnarReport):
+        return obj.to_list()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -1,6 +1,14 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
+from google_clients import get_google_client
+from scoring import batch_keyword_quality_scores
+from insight_stats import KeywordInsightStats
+from comparison import get_date_range, get_comparison_range, get_query_windows, format_date_range, attach_comparison
+from ranking import MultiTopK
+from reports import KeywordReport, FULL_POTENTIAL, format_traffic_potential
+from observability import log, timed
+from datetime import datetime
+from itertools import islice
+import heapq
 import json
 
 class SearchConsoleService:
@@ -8,9 +16,24 @@ class SearchConsoleService:
         """Initialize Search Console service with user credentials"""
         self.credentials = credentials
         # Google Search Console API
-        self.search_console = build('searchconsole', 'v1', credentials=credentials)
+        self.search_console = get_google_client('searchconsole', 'v1', credentials)
     
-    def get_top_search_keywords(self, site_url, date_range='30days', comparison=None):
+    # Metrics compared between periods
+    COMPARISON_METRICS = ['clicks', 'impressions', 'ctr', 'position', 'quality_score']
+    
+    # Dimensions supported by the streaming export
+    SUPPORTED_DIMENSIONS = ['query', 'page', 'country', 'device', 'date']
+    
+    # Search Console API maximum rows per request
+    MAX_ROW_LIMIT = 25000
+    
+    # Rankings of the 'sort' parameter - all of them are tracked in the same pass
+    RANKINGS = ['clicks', 'quality_score', 'traffic_potential', 'impressions']
+    
+    # Keywords returned when no limit is given
+    DEFAULT_LIMIT = 20
+    
+    def get_top_search_keywords(self, site_url, date_range='30days', comparison=None, sort=None, limit=None):
         """
         Get top search keywords data from Google Search Console
         
@@ -18,31 +41,27 @@ class SearchConsoleService:
             site_url: Site URL (format: https://example.com/)
             date_range: '7days', '30days', '90days', or custom
             comparison: 'previous', 'year', or None
+            sort: one of RANKINGS - ranks every keyword of the period
+            limit: keywords returned (default: DEFAULT_LIMIT)
+        
+        Without sort and limit the result is the top 20 keywords by clicks.
         """
         try:
-            # Build date range
-            end_date = datetime.now().date()
+            start_date, end_date = get_date_range(date_range)
             
-            if date_range == '7days':
-                start_date = end_date - timedelta(days=7)
-            elif date_range == '30days':
-                start_date = end_date - timedelta(days=30)
-            elif date_range == '90days':
-                start_date = end_date - timedelta(days=90)
-            else:
-                start_date = end_date - timedelta(days=30)  # default
+            if comparison:
+                return self.get_keywords_with_comparison(site_url, start_date, end_date, comparison,
+                                                         limit or self.DEFAULT_LIMIT, sort)
             
-            # Build the request
-            request = {
-                'startDate': start_date.strftime('%Y-%m-%d'),
-                'endDate': end_date.strftime('%Y-%m-%d'),
-                'dimensions': ['query'],  # Search keywords
-                'rowLimit': 20,  # Top 20 keywords
-                'startRow': 0
-            }
+            if sort or limit:
+                return self.get_ranked_keywords(site_url, start_date, end_date,
+                                                sort or 'clicks', limit or self.DEFAULT_LIMIT)
+            
+            # Top 20 search keywords
+            request = self.build_search_analytics_request(start_date, end_date, ['query'], 20)
             
-            print(f"🔍 Fetching Search Console data for site: {site_url}")
-            print(f"📅 Date range: {start_date} to {end_date}")
+            log.info(f"🔍 Fetching Search Console data for site: {site_url}")
+            log.info(f"📅 Date range: {start_date} to {end_date}")
             
             # Make the API call
             response = self.search_console.searchanalytics().query(
@@ -50,64 +69,308 @@ class SearchConsoleService:
                 body=request
             ).execute()
             
-            print("✅ Search Console API call successful")
+            log.info("✅ Search Console API call successful")
             
             # Process the response
-            keywords_data = []
-            total_clicks = 0
-            total_impressions = 0
-            
-            if 'rows' in response:
-                for row in response['rows']:
-                    keyword = row['keys'][0]  # The search query
-                    clicks = row['clicks']
-                    impressions = row['impressions']
-                    ctr = row['ctr'] * 100  # Convert to percentage
-                    position = row['position']
-                    
-                    total_clicks += clicks
-                    total_impressions += impressions
-                    
-                    # Calculate keyword quality score
-                    quality_score = self.calculate_keyword_quality_score(
-                        clicks, impressions, ctr, position
-                    )
-                    
-                    keywords_data.append({
-                        'keyword': keyword,
-                        'clicks': clicks,
-                        'impressions': impressions,
-                        'ctr': round(ctr, 2),
-                        'position': round(position, 1),
-                        'quality_score': quality_score,
-                        'traffic_potential': self.calculate_traffic_potential(impressions, position, ctr)
-                    })
+            keywords_data = self.score_rows(response.get('rows', []), ['query'])
             
-            # Sort by clicks (traffic volume)
-            keywords_data.sort(key=lambda x: x['clicks'], reverse=True)
-            
-            return {
-                'success': True,
-                'keywords': keywords_data,
-                'date_range': {
-                    'start_date': start_date.strftime('%Y-%m-%d'),
-                    'end_date': end_date.strftime('%Y-%m-%d')
-                },
-                'summary': {
-                    'total_clicks': total_clicks,
-                    'total_impressions': total_impressions,
-                    'average_ctr': round((total_clicks / total_impressions * 100) if total_impressions > 0 else 0, 2),
-                    'total_keywords': len(keywords_data)
-                }
-            }
+            return self.build_result(keywords_data, start_date, end_date)
             
         except Exception as e:
-            print(f"❌ Error fetching Search Console data: {e}")
+            log.error(f"❌ Error fetching Search Console data: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def build_result(self, keywords_data, start_date, end_date, ranked=False):
+        """Sort keywords by clicks (unless already ranked) and wrap them in the API result format"""
+        total_clicks = sum(keywords_data.column('clicks'))
+        total_impressions = sum(keywords_data.column('impressions'))
+        
+        # Sort by clicks (traffic volume)
+        if not ranked:
+            keywords_data.sort_by('clicks')
+        
+        return {
+            'success': True,
+            'keywords': keywords_data,
+            'date_range': format_date_range(start_date, end_date),
+            'summary': {
+                'total_clicks': total_clicks,
+                'total_impressions': total_impressions,
+                'average_ctr': round((total_clicks / total_impressions * 100) if total_impressions > 0 else 0, 2),
+                'total_keywords': len(keywords_data)
+            }
+        }
+    
+    def get_ranked_keywords(self, site_url, start_date, end_date, sort='clicks', limit=DEFAULT_LIMIT):
+        """
+        Top keywords by any of RANKINGS, over every keyword of the period
+        
+        All pages are streamed through one MultiTopK, so every ranking is
+        known after a single pass and memory stays at one page plus
+        limit rows per ranking. The result carries the keywords of each
+        ranking under 'rankings'.
+        """
+        ranker = self.start_keyword_ranking(limit)
+        
+        log.info(f"🔍 Ranking Search Console keywords for site: {site_url} (by {sort}, top {limit})")
+        log.info(f"📅 Date range: {start_date} to {end_date}")
+        
+        for rows in self.iter_search_analytics_pages(site_url, start_date, end_date, ['query']):
+            self.add_keyword_ranking_rows(ranker, rows)
+        
+        return self.build_ranked_result(ranker, sort, start_date, end_date)
+    
+    def start_keyword_ranking(self, limit):
+        """MultiTopK over (raw row, quality score) pairs - rows are only scored if they make a top list"""
+        return MultiTopK(limit, {
+            'clicks': lambda item: item[0]['clicks'],
+            'quality_score': lambda item: item[1],
+            'traffic_potential': lambda item: self.estimate_additional_clicks(
+                item[0]['impressions'], item[0]['position'], item[0]['ctr'] * 100
+            ),
+            'impressions': lambda item: item[0]['impressions']
+        })
+    
+    def add_keyword_ranking_rows(self, ranker, rows):
+        """Feed a page of raw ['query'] rows to a keyword ranker"""
+        if not rows:
+            return
+        
+        with timed('score'):
+            quality_scores = batch_keyword_quality_scores(
+                clicks=[row['clicks'] for row in rows],
+                impressions=[row['impressions'] for row in rows],
+                ctr=[row['ctr'] * 100 for row in rows],
+                position=[row['position'] for row in rows]
+            )
+            ranker.add_many(zip(rows, map(int, quality_scores)))
+    
+    def finish_keyword_ranking(self, ranker, sort):
+        """(scored rows of the `sort` ranking, {ranking: [keyword, ...]})"""
+        keywords_data = self.score_rows([row for row, _ in ranker.top(sort)], ['query'])
+        return keywords_data, ranker.labels(lambda item: item[0]['keys'][0])
+    
+    def build_ranked_result(self, ranker, sort, start_date, end_date):
+        """API result of a keyword ranker"""
+        keywords_data, rankings = self.finish_keyword_ranking(ranker, sort)
+        
+        result = self.build_result(keywords_data, start_date, end_date, ranked=True)
+        result['summary']['ranked_keywords'] = ranker.count
+        result['sort'] = sort
+        result['rankings'] = rankings
+        return result
+    
+    def get_keywords_with_comparison(self, site_url, start_date, end_date, comparison, limit=20, sort=None):
+        """
+        Top keywords with deltas against a comparison period
+        
+        Queries with the 'date' dimension - one query when the periods are
+        adjacent, one per period otherwise - and splits the rows locally.
+        Only per-keyword running totals are kept, so memory is bounded by the
+        number of distinct keywords, not rows.
+        """
+        state = self.start_keyword_comparison(site_url, start_date, end_date, comparison)
+        
+        for query_start, query_end in state['query_windows']:
+            for rows in self.iter_search_analytics_pages(site_url, query_start, query_end, ['query', 'date']):
+                self.add_keyword_comparison_rows(state, rows)
+        
+        return self.build_keyword_comparison_result(state, limit, sort)
+    
+    def start_keyword_comparison(self, site_url, start_date, end_date, comparison):
+        """Running state for get_keywords_with_comparison (shared with the async transport)"""
+        previous_start, previous_end = get_comparison_range(start_date, end_date, comparison)
+        
+        log.info(f"🔍 Fetching Search Console data with comparison for site: {site_url}")
+        log.info(f"📅 Date range: {start_date} to {end_date}, compared to {previous_start} to {previous_end}")
+        
+        return {
+            'comparison': comparison,
+            'start_date': start_date,
+            'end_date': end_date,
+            'previous_start': previous_start,
+            'previous_end': previous_end,
+            'query_windows': get_query_windows(start_date, end_date, previous_start, previous_end),
+            # keyword -> [clicks, impressions, position * impressions]
+            'current_totals': {},
+            'previous_totals': {}
+        }
+    
+    def add_keyword_comparison_rows(self, state, rows):
+        """Fold a page of ['query', 'date'] rows into the per-period keyword totals"""
+        start_date, end_date = state['start_date'], state['end_date']
+        previous_start, previous_end = state['previous_start'], state['previous_end']
+        
+        with timed('parse'):
+            for row in rows:
+                keyword, day = row['keys']
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+                
+                if start_date <= day <= end_date:
+                    totals = state['current_totals']
+                elif previous_start <= day <= previous_end:
+                    totals = state['previous_totals']
+                else:
+                    continue
+                
+                keyword_totals = totals.get(keyword)
+                if keyword_totals is None:
+                    keyword_totals = totals[keyword] = [0, 0, 0.0]
+                keyword_totals[0] += row['clicks']
+                keyword_totals[1] += row['impressions']
+                # Search Console position is an impression-weighted average
+                keyword_totals[2] += row['position'] * row['impressions']
+    
+    def build_keyword_comparison_result(self, state, limit=20, sort=None):
+        """Top keywords of the current period with deltas against the previous one"""
+        current_totals = state['current_totals']
+        previous_totals = state['previous_totals']
+        
+        if sort:
+            # Rank every keyword's totals, a page of rows at a time
+            ranker = self.start_keyword_ranking(limit)
+            keyword_totals = iter(current_totals.items())
+            while True:
+                rows = self.totals_to_rows(islice(keyword_totals, self.MAX_ROW_LIMIT))
+                if not rows:
+                    break
+                self.add_keyword_ranking_rows(ranker, rows)
+            keywords_data, rankings = self.finish_keyword_ranking(ranker, sort)
+        else:
+            top_keywords = heapq.nlargest(limit, current_totals.items(), key=lambda item: item[1][0])
+            keywords_data = self.score_rows(self.totals_to_rows(top_keywords), ['query'])
+        
+        previous_rows = self.totals_to_rows(
+            (keyword, previous_totals[keyword]) for keyword in keywords_data.column('keyword')
+            if keyword in previous_totals
+        )
+        previous_by_key = {
+            (keyword_data['keyword'],): keyword_data
+            for keyword_data in self.score_rows(previous_rows, ['query'])
+        }
+        
+        result = self.build_result(keywords_data, state['start_date'], state['end_date'], ranked=bool(sort))
+        if sort:
+            result['summary']['ranked_keywords'] = ranker.count
+            result['sort'] = sort
+            result['rankings'] = rankings
+        attach_comparison(result['keywords'], previous_by_key, ['keyword'], self.COMPARISON_METRICS)
+        
+        # Same keywords as the current summary's totals
+        result['comparison'] = {
+            'type': state['comparison'],
+            'date_range': format_date_range(state['previous_start'], state['previous_end']),
+            'total_clicks': sum(row['clicks'] for row in previous_rows),
+            'total_impressions': sum(row['impressions'] for row in previous_rows)
+        }
+        return result
+    
+    def totals_to_rows(self, keyword_totals):
+        """Convert aggregated (keyword, [clicks, impressions, weighted position]) to API-style rows"""
+        rows = []
+        for keyword, (clicks, impressions, weighted_position) in keyword_totals:
+            rows.append({
+                'keys': [keyword],
+                'clicks': clicks,
+                'impressions': impressions,
+                'ctr': clicks / impressions if impressions else 0,
+                'position': weighted_position / impressions if impressions else 0
+            })
+        return rows
+    
+    def iter_search_analytics_pages(self, site_url, start_date, end_date,
+                                    dimensions=None, page_size=MAX_ROW_LIMIT):
+        """
+        Page through searchanalytics().query and yield raw row pages
+        
+        Only one page is held in memory at a time. Iteration stops on the
+        first short page, which is how the API signals the end of the data.
+        """
+        dimensions = list(dimensions or ['query'])
+        unsupported = [d for d in dimensions if d not in self.SUPPORTED_DIMENSIONS]
+        if unsupported:
+            raise ValueError(f"Unsupported Search Console dimensions: {unsupported}")
+        
+        page_size = max(1, min(int(page_size), self.MAX_ROW_LIMIT))
+        start_row = 0
+        
+        while True:
+            request = self.build_search_analytics_request(start_date, end_date, dimensions,
+                                                          page_size, start_row)
+            
+            response = self.search_console.searchanalytics().query(
+                siteUrl=site_url,
+                body=request
+            ).execute()
+            
+            rows = response.get('rows', [])
+            if rows:
+                yield rows
+            
+            if len(rows) < page_size:
+                break
+            start_row += page_size
+    
+    def build_search_analytics_request(self, start_date, end_date, dimensions, row_limit, start_row=0):
+        """searchanalytics.query request body"""
+        return {
+            'startDate': start_date.strftime('%Y-%m-%d'),
+            'endDate': end_date.strftime('%Y-%m-%d'),
+            'dimensions': list(dimensions),
+            'rowLimit': row_limit,
+            'startRow': start_row
+        }
+    
+    def stream_keywords(self, site_url, date_range='30days', dimensions=None,
+                        page_size=MAX_ROW_LIMIT):
+        """
+        Stream scored keyword rows, one page at a time
+        
+        Yields KeywordReport pages whose rows read in the same format as
+        get_top_search_keywords, with one extra key per requested dimension
+        ('page', 'country', ...). Scoring runs per page, so memory stays
+        bounded by page_size.
+        """
+        dimensions = list(dimensions or ['query'])
+        start_date, end_date = get_date_range(date_range)
+        
+        log.info(f"🔍 Streaming Search Console data for site: {site_url} ({', '.join(dimensions)})")
+        
+        for rows in self.iter_search_analytics_pages(site_url, start_date, end_date,
+                                                     dimensions, page_size):
+            yield self.score_rows(rows, dimensions)
+    
+    def score_rows(self, rows, dimensions):
+        """Convert a page of raw API rows to a scored KeywordReport (rows read as keyword dicts)"""
+        keywords_data = KeywordReport(dimensions)
+        if not rows:
+            return keywords_data
+        
+        with timed('score'):
+            # Score the whole page in one vectorized pass
+            quality_scores = batch_keyword_quality_scores(
+                clicks=[row['clicks'] for row in rows],
+                impressions=[row['impressions'] for row in rows],
+                ctr=[row['ctr'] * 100 for row in rows],
+                position=[row['position'] for row in rows]
+            )
+            
+            for row, quality_score in zip(rows, quality_scores):
+                impressions = row['impressions']
+                ctr = row['ctr'] * 100  # Convert to percentage
+                position = row['position']
+                
+                # The traffic potential label is formatted when the row is read
+                keywords_data.append(
+                    row['keys'], row['clicks'], impressions, ctr, position, int(quality_score),
+                    FULL_POTENTIAL if position <= 3 else self.estimate_additional_clicks(impressions, position, ctr)
+                )
+        
+        return keywords_data
+    
     def calculate_keyword_quality_score(self, clicks, impressions, ctr, position):
         """
         Calculate keyword quality score based on multiple factors
@@ -141,34 +404,40 @@ class SearchConsoleService:
         
         return round(quality_score)
     
-    def calculate_traffic_potential(self, impressions, position, current_ctr):
-        """Calculate potential traffic if keyword was optimized"""
+    def estimate_additional_clicks(self, impressions, position, current_ctr):
+        """Clicks a keyword would gain at a top 3 position (0 if already there)"""
         
         # Estimate CTR for position 1-3 based on industry averages
         potential_ctr = 25.0  # 25% CTR for top 3 positions
         
         if position <= 3:
-            return "מיצוי מלא"
-        else:
-            potential_clicks = impressions * (potential_ctr / 100)
-            current_clicks = impressions * (current_ctr / 100)
-            additional_potential = max(0, potential_clicks - current_clicks)
-            
-            if additional_potential < 10:
-                return "פוטנציאל נמוך"
-            elif additional_potential < 100:
-                return f"פוטנציאל בינוני (+{int(additional_potential)})"
-            else:
-                return f"פוטנציאל גבוה (+{int(additional_potential)})"
+            return 0
+        
+        potential_clicks = impressions * (potential_ctr / 100)
+        current_clicks = impressions * (current_ctr / 100)
+        return max(0, potential_clicks - current_clicks)
+    
+    def calculate_traffic_potential(self, impressions, position, current_ctr):
+        """Calculate potential traffic if keyword was optimized"""
+        
+        if position <= 3:
+            return format_traffic_potential(FULL_POTENTIAL)
+        return format_traffic_potential(self.estimate_additional_clicks(impressions, position, current_ctr))
     
     def generate_insights(self, keywords_data, summary):
-        """Generate AI-like insights from the keywords data"""
+        """
+        Generate AI-like insights from the keywords data
+        
+        keywords_data is any iterable of scored rows (consumed once) or a
+        KeywordInsightStats built while streaming them.
+        """
+        stats = KeywordInsightStats.from_rows(keywords_data)
         
-        if not keywords_data:
+        if not stats.count:
             return "לא נמצאו נתונים לניתוח"
         
         insights = []
-        top_keyword = keywords_data[0]
+        top_keyword = stats.top
         
         # Top performer insight
         insights.append(f"<strong>'{top_keyword['keyword']}'</strong> היא מילת החיפוש שמביאה הכי הרבה תנועה "
@@ -185,16 +454,13 @@ class SearchConsoleService:
                            f"צריך אופטימיזציה")
         
         # CTR insights
-        high_ctr_keywords = [k for k in keywords_data if k['ctr'] > 5]
-        if high_ctr_keywords:
-            insights.append(f"יש לך {len(high_ctr_keywords)} מילות חיפוש עם CTR גבוה (מעל 5%) - "
+        if stats.high_ctr_count:
+            insights.append(f"יש לך {stats.high_ctr_count} מילות חיפוש עם CTR גבוה (מעל 5%) - "
                            f"זה מצוין!")
         
         # Low hanging fruit
-        high_impressions_low_position = [k for k in keywords_data 
-                                       if k['impressions'] > 1000 and k['position'] > 10]
-        if high_impressions_low_position:
-            insights.append(f"יש {len(high_impressions_low_position)} מילות חיפוש עם הרבה impressions "
+        if stats.low_position_count:
+            insights.append(f"יש {stats.low_position_count} מילות חיפוש עם הרבה impressions "
                            f"אבל דירוג נמוך - הזדמנות זהב לשיפור!")
         
         # Overall performance
@@ -207,44 +473,40 @@ class SearchConsoleService:
         return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{insight}</li>" for insight in insights]) + "</ul>"
     
     def generate_recommendations(self, keywords_data, summary):
-        """Generate actionable SEO recommendations"""
+        """Generate actionable SEO recommendations (rows or KeywordInsightStats, like generate_insights)"""
+        stats = KeywordInsightStats.from_rows(keywords_data)
         
-        if not keywords_data:
+        if not stats.count:
             return "אין מספיק נתונים להמלצות"
         
         recommendations = []
         
         # Focus on top performer
-        top_keyword = keywords_data[0]
+        top_keyword = stats.top
         recommendations.append(f"<strong>המשך לחזק את התוכן עבור '{top_keyword['keyword']}'</strong> - "
                               f"זו מילת החיפוש הכי מניבה שלך")
         
         # Low hanging fruit opportunities
-        opportunities = [k for k in keywords_data 
-                        if k['impressions'] > 500 and k['position'] > 5 and k['position'] <= 20]
-        if opportunities:
-            keyword = opportunities[0]['keyword']
-            recommendations.append(f"<strong>שפר דירוג עבור '{keyword}'</strong> - "
-                                  f"מקום {opportunities[0]['position']:.1f} עם הרבה פוטנציאל")
+        opportunity = stats.first_opportunity
+        if opportunity:
+            recommendations.append(f"<strong>שפר דירוג עבור '{opportunity['keyword']}'</strong> - "
+                                  f"מקום {opportunity['position']:.1f} עם הרבה פוטנציאל")
         
         # CTR optimization
-        low_ctr_keywords = [k for k in keywords_data 
-                           if k['impressions'] > 1000 and k['ctr'] < 2]
-        if low_ctr_keywords:
-            keyword = low_ctr_keywords[0]['keyword']
-            recommendations.append(f"<strong>שפר את הTitle וMeta Description עבור '{keyword}'</strong> - "
-                                  f"CTR נמוך ({low_ctr_keywords[0]['ctr']}%) למרות הרבה הצגות")
+        low_ctr = stats.first_low_ctr
+        if low_ctr:
+            recommendations.append(f"<strong>שפר את הTitle וMeta Description עבור '{low_ctr['keyword']}'</strong> - "
+                                  f"CTR נמוך ({low_ctr['ctr']}%) למרות הרבה הצגות")
         
         # Position improvement
-        positions_4_to_10 = [k for k in keywords_data if k['position'] >= 4 and k['position'] <= 10]
-        if positions_4_to_10:
-            keyword = positions_4_to_10[0]['keyword']
-            recommendations.append(f"<strong>דחף את '{keyword}' לעמוד הראשון</strong> - "
-                                  f"כרגע במקום {positions_4_to_10[0]['position']:.1f}")
+        near_top = stats.first_position_4_to_10
+        if near_top:
+            recommendations.append(f"<strong>דחף את '{near_top['keyword']}' לעמוד הראשון</strong> - "
+                                  f"כרגע במקום {near_top['position']:.1f}")
         
         # Content gap analysis
-        if len(keywords_data) < 50:
+        if stats.count < 50:
             recommendations.append(f"<strong>הרחב את היקף מילות החיפוש</strong> - "
-                                  f"יש לך רק {len(keywords_data)} מילות חיפוש פעילות")
+                                  f"יש לך רק {stats.count} מילות חיפוש פעילות")
         
-        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
\ No newline at end of file
+        return "<ul class='mb-0 mt-2'>" + "".join([f"<li>{rec}</li>" for rec in recommendations]) + "</ul>"
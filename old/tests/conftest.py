@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import pytest
+
+OLD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, OLD_DIR)
+
+# Isolated SQLite database and no background threads - set before app.py is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='dtv3-tests-'), 'test.db')
+os.environ['ANALYSIS_PREWARM_ENABLED'] = 'false'
+os.environ['GOOGLE_TOKEN_BACKGROUND_REFRESH'] = 'false'
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    
+    # Templates are kept at the repository root, next to old/
+    templates = os.path.join(os.path.dirname(OLD_DIR), 'templates')
+    if not os.path.isdir(os.path.join(OLD_DIR, 'templates')) and os.path.isdir(templates):
+        flask_app.template_folder = templates
+        flask_app.__dict__.pop('jinja_loader', None)
+    
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+@pytest.fixture
+def db(app):
+    """
+    The app's database, emptied after each test
+    
+    No app context is kept open during the test - every test client request
+    gets its own, like in production (flask.g and the session are per request).
+    """
+    from database import db as database
+    
+    yield database
+    with app.app_context():
+        for table in reversed(database.metadata.sorted_tables):
+            database.session.execute(table.delete())
+        database.session.commit()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import pytest
+from google.oauth2.credentials import Credentials
+from analytics import AnalyticsService
+from ga_quota import QuotaDeferred
+
+REQUEST = {'action_id': 'traffic-quality-all', 'dateRange': '30days'}
+CACHE_KEY = (1, 'traffic-quality-all', None, '30days', 'none', None, None)
+
+@pytest.fixture
+def app_module(app):
+    import app as module
+    yield module
+    module.analysis_cache.clear()
+
+@pytest.fixture
+def deferred_client(app, app_module, db, client, monkeypatch):
+    """Logged-in user with two GA properties whose quota defers every batch call"""
+    from database import User, UserAccount
+    
+    with app.app_context():
+        db.session.add(User(id=1, email='user@example.com', name='User'))
+        db.session.add_all([
+            UserAccount(user_id=1, account_type='google_analytics', account_id=account_id,
+                        account_name=f'Property {account_id}', is_active=True)
+            for account_id in ('111', '222')
+        ])
+        db.session.commit()
+    
+    credentials = Credentials(token='test', expiry=datetime.utcnow() + timedelta(hours=1))
+    monkeypatch.setattr(app_module.token_manager, 'get_credentials', lambda user_id: credentials)
+    
+    def deferred(self, property_id, requests):
+        raise QuotaDeferred(property_id, 120, 'hourly tokens almost used')
+    monkeypatch.setattr(AnalyticsService, 'run_batch_reports', deferred)
+    
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    return client
+
+def test_fanout_with_every_property_deferred_serves_stale_results(app_module, deferred_client, monkeypatch):
+    # An expired entry - get() misses, get_stale() still returns it
+    computed_at = datetime(2026, 10, 1, 12, 0)
+    stale_results = {
+        'traffic_sources': [{'source': 'google / organic', 'sessions': 10}],
+        'total_sessions': 10,
+        'date_range': {'start': '2026-09-01', 'end': '2026-09-30'},
+        'properties': [{'property_id': '111', 'total_sessions': 10}],
+        'ai_insights': 'insights',
+        'recommendations': 'recommendations'
+    }
+    monkeypatch.setattr(app_module.analysis_cache, 'ttl_seconds', 0)
+    app_module.analysis_cache.set(CACHE_KEY, (stale_results, computed_at))
+    
+    response = deferred_client.post('/api/analyze', json=REQUEST)
+    
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert body['cache'] == 'stale'
+    assert body['computed_at'] == computed_at.isoformat()
+    assert body['results'] == stale_results
+
+def test_fanout_with_every_property_deferred_and_no_cache_returns_quota_error(deferred_client):
+    response = deferred_client.post('/api/analyze', json=REQUEST)
+    
+    body = response.get_json()
+    assert body['success'] is False
+    assert 'נסה שוב בעוד 2 דקות' in body['error']
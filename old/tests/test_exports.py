@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import pytest
+from google.oauth2.credentials import Credentials
+
+EXPORTS = ['/api/export/landing-pages?property=111&site=sc-domain:example.com',
+           '/api/export/search-keywords?site=sc-domain:example.com']
+
+@pytest.fixture
+def user_client(app, db, client):
+    from database import User
+    
+    with app.app_context():
+        db.session.add(User(id=1, email='user@example.com', name='User'))
+        db.session.commit()
+    
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    return client
+
+def add_accounts(app, db):
+    """The exports' Analytics property and Search Console site"""
+    from database import UserAccount
+    
+    with app.app_context():
+        db.session.add_all([
+            UserAccount(user_id=1, account_type='google_analytics', account_id='111',
+                        account_name='Property', is_active=True),
+            UserAccount(user_id=1, account_type='search_console', account_id='sc-domain:example.com',
+                        account_name='Site', is_active=True)
+        ])
+        db.session.commit()
+
+@pytest.fixture
+def connected(app, db, monkeypatch):
+    import app as app_module
+    
+    add_accounts(app, db)
+    credentials = Credentials(token='test', expiry=datetime.utcnow() + timedelta(hours=1))
+    monkeypatch.setattr(app_module.token_manager, 'get_credentials', lambda user_id: credentials)
+
+@pytest.mark.parametrize('url', EXPORTS)
+def test_export_without_google_connection_is_401(app, db, user_client, url):
+    add_accounts(app, db)
+    
+    response = user_client.get(url)
+    
+    assert response.status_code == 401
+    assert response.get_json()['success'] is False
+
+@pytest.mark.parametrize('url', [url.replace('111', '999').replace('example.com', 'missing.com') for url in EXPORTS])
+def test_export_of_a_missing_account_is_404(user_client, connected, url):
+    response = user_client.get(url)
+    
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
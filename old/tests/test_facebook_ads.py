@@ -0,0 +1,216 @@
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+import json
+import threading
+import pytest
+from facebook_ads import FacebookAdsService, FacebookAPIError
+
+ACCESS_TOKEN = 'test-token'
+GRAPH_VERSION = '/v18.0'
+
+class FakeGraph:
+    """
+    Graph API answers for the fake server: ad accounts, insights rows per
+    level (echoing the requested time_ranges as date_start) and the batch
+    endpoint. Cursor paging honours 'limit' and returns paging.next URLs.
+    """
+    
+    def __init__(self):
+        self.accounts = []
+        self.insights = {}  # level -> rows of one period, without the period fields
+        self.batch_failures = {}  # batch item index -> None (timed out) or error dict
+        self.requests = []  # (method, path)
+    
+    def route(self, path, query, host):
+        if query.get('access_token') != ACCESS_TOKEN:
+            return 400, {'error': {'message': 'Invalid OAuth access token', 'code': 190}}
+        
+        if path == '/me/adaccounts':
+            return 200, self.page(self.accounts, path, query, host)
+        
+        if path.endswith('/insights'):
+            rows = [
+                dict(row, date_start=time_range['since'], date_stop=time_range['until'])
+                for time_range in json.loads(query['time_ranges'])
+                for row in self.insights.get(query['level'], [])
+            ]
+            return 200, self.page(rows, path, query, host)
+        
+        return 404, {'error': {'message': 'Unknown path', 'code': 803}}
+    
+    def page(self, rows, path, query, host):
+        limit = int(query.get('limit', 25))
+        after = int(query.get('after', 0))
+        body = {'data': rows[after:after + limit], 'paging': {'cursors': {'after': str(after + limit)}}}
+        if after + limit < len(rows):
+            next_query = dict(query, after=str(after + limit))
+            body['paging']['next'] = f'http://{host}{GRAPH_VERSION}{path}?{urlencode(next_query)}'
+        return body
+    
+    def batch(self, items, access_token, host):
+        responses = []
+        for index, item in enumerate(items):
+            if index in self.batch_failures:
+                error = self.batch_failures[index]
+                responses.append(None if error is None else {'code': 400, 'body': json.dumps({'error': error})})
+                continue
+            
+            relative = urlparse('/' + item['relative_url'])
+            query = dict(parse_qs(relative.query, keep_blank_values=True), access_token=[access_token])
+            code, body = self.route(relative.path, {key: values[0] for key, values in query.items()}, host)
+            responses.append({'code': code, 'body': json.dumps(body)})
+        return responses
+
+class GraphHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def parsed(self):
+        url = urlparse(self.path)
+        path = url.path[len(GRAPH_VERSION):] if url.path.startswith(GRAPH_VERSION) else url.path
+        return path, {key: values[0] for key, values in parse_qs(url.query).items()}
+    
+    def do_GET(self):
+        path, query = self.parsed()
+        self.server.graph.requests.append(('GET', path))
+        self.send_json(*self.server.graph.route(path, query, self.headers['Host']))
+    
+    def do_POST(self):
+        path, query = self.parsed()
+        self.server.graph.requests.append(('POST', path))
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        items = json.loads(form['batch'][0])
+        self.send_json(200, self.server.graph.batch(items, query.get('access_token'), self.headers['Host']))
+
+@pytest.fixture(scope='module')
+def graph_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def graph(graph_server):
+    graph_server.graph = FakeGraph()
+    return graph_server.graph
+
+@pytest.fixture
+def service(graph_server, monkeypatch):
+    # Small pages, so a handful of rows already needs cursor paging
+    monkeypatch.setattr(FacebookAdsService, 'PAGE_SIZE', 2)
+    return FacebookAdsService(ACCESS_TOKEN, f'http://127.0.0.1:{graph_server.server_address[1]}{GRAPH_VERSION}')
+
+def campaign_row(campaign_id, spend, impressions, clicks, purchases=0):
+    return {
+        'campaign_id': campaign_id, 'campaign_name': f'Campaign {campaign_id}',
+        'spend': str(spend), 'impressions': str(impressions), 'clicks': str(clicks),
+        'actions': [{'action_type': 'purchase', 'value': str(purchases)},
+                    {'action_type': 'link_click', 'value': '99'}]
+    }
+
+def test_list_ad_accounts_follows_paging_next(service, graph):
+    graph.accounts = [{'account_id': str(i), 'name': f'Account {i}'} for i in range(5)]
+    
+    accounts = list(service.list_ad_accounts())
+    
+    assert [account['account_id'] for account in accounts] == ['0', '1', '2', '3', '4']
+    assert graph.requests == [('GET', '/me/adaccounts')] * 3
+
+def test_invalid_token_raises_graph_error(graph_server, graph):
+    service = FacebookAdsService('wrong', f'http://127.0.0.1:{graph_server.server_address[1]}{GRAPH_VERSION}')
+    
+    with pytest.raises(FacebookAPIError) as error:
+        list(service.list_ad_accounts())
+    assert error.value.code == 190
+
+def test_insights_first_pages_come_from_one_batch_call(service, graph):
+    graph.insights = {
+        'campaign': [campaign_row('c1', 10, 100, 1), campaign_row('c2', 20, 200, 2), campaign_row('c3', 5, 50, 0)],
+        'adset': [{'campaign_id': 'c1', 'adset_id': 'a1'}],
+        'ad': [{'campaign_id': 'c1', 'ad_id': f'ad{i}'} for i in range(4)]
+    }
+    
+    pages = list(service.iter_insights('123', [(date(2026, 1, 1), date(2026, 1, 31))]))
+    
+    rows = {}
+    for level, page in pages:
+        assert len(page) <= FacebookAdsService.PAGE_SIZE
+        rows.setdefault(level, []).extend(page)
+    assert [row['campaign_id'] for row in rows['campaign']] == ['c1', 'c2', 'c3']
+    assert len(rows['adset']) == 1
+    assert [row['ad_id'] for row in rows['ad']] == ['ad0', 'ad1', 'ad2', 'ad3']
+    assert {row['date_start'] for level_rows in rows.values() for row in level_rows} == {'2026-01-01'}
+    
+    # One batch call for the first pages of all levels, then the cursors of the longer levels
+    assert graph.requests == [('POST', '/'), ('GET', '/act_123/insights'), ('GET', '/act_123/insights')]
+
+def test_batch_returns_timed_out_and_failed_items_in_place(service, graph):
+    graph.accounts = [{'account_id': '1', 'name': 'Account 1'}]
+    graph.batch_failures = {1: None, 2: {'message': '(#100) Invalid parameter', 'code': 100}}
+    request = {'method': 'GET', 'relative_url': 'me/adaccounts?limit=10'}
+    
+    results = service.batch([request] * 4)
+    
+    assert results[0]['data'] == graph.accounts
+    assert isinstance(results[1], FacebookAPIError) and str(results[1]) == 'Batch request timed out'
+    assert isinstance(results[2], FacebookAPIError) and results[2].code == 100
+    assert results[3]['data'] == graph.accounts
+
+def test_batch_is_split_into_calls_of_max_batch_size(service, graph):
+    graph.accounts = [{'account_id': '1', 'name': 'Account 1'}]
+    request = {'method': 'GET', 'relative_url': 'me/adaccounts'}
+    
+    results = service.batch([request] * (FacebookAdsService.MAX_BATCH_SIZE * 2 + 1))
+    
+    assert len(results) == FacebookAdsService.MAX_BATCH_SIZE * 2 + 1
+    assert graph.requests == [('POST', '/')] * 3
+
+def test_get_campaign_performance_with_comparison(service, graph):
+    graph.insights = {
+        'campaign': [campaign_row('c1', 100, 10000, 200, purchases=4),
+                     campaign_row('c2', 300, 20000, 100),
+                     campaign_row('c3', 50, 5000, 50, purchases=1)],
+        'adset': [{'campaign_id': 'c1', 'adset_id': 'a1'}, {'campaign_id': 'c1', 'adset_id': 'a2'},
+                  {'campaign_id': 'c2', 'adset_id': 'a3'}],
+        'ad': [{'campaign_id': 'c2', 'ad_id': 'ad1'}]
+    }
+    
+    result = service.get_campaign_performance('123', '30days', comparison='previous')
+    
+    assert result['success'] is True
+    # Sorted by spend, adsets / ads counted from the current period only
+    assert [campaign['campaign_id'] for campaign in result['campaigns']] == ['c2', 'c1', 'c3']
+    c2, c1, c3 = result['campaigns']
+    assert (c1['adsets'], c1['ads'], c2['adsets'], c2['ads'], c3['adsets'], c3['ads']) == (2, 0, 1, 1, 0, 0)
+    assert c1['conversions'] == 4 and c1['ctr'] == 2.0 and c1['cpc'] == 0.5 and c1['cost_per_conversion'] == 25.0
+    assert c2['cost_per_conversion'] is None
+    
+    summary = result['summary']
+    assert summary['total_spend'] == 450.0
+    assert summary['total_clicks'] == 350
+    assert summary['total_conversions'] == 5
+    assert (summary['total_campaigns'], summary['total_adsets'], summary['total_ads']) == (3, 3, 1)
+    
+    # The fake serves the same rows for both periods
+    assert result['comparison']['type'] == 'previous'
+    assert result['comparison']['total_spend'] == 450.0
+    assert c1['comparison']['spend']['change'] == 0
+
+def test_get_campaign_performance_reports_a_failed_level(service, graph):
+    graph.insights = {'campaign': [campaign_row('c1', 10, 100, 1)]}
+    graph.batch_failures = {2: {'message': '(#17) User request limit reached', 'code': 17}}
+    
+    result = service.get_campaign_performance('123', '7days')
+    
+    assert result == {'success': False, 'error': '(#17) User request limit reached'}
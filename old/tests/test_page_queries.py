@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import pytest
+
+# SQL statements a page may run - the identity (user, tokens, accounts) is one joined query
+MAX_PAGE_QUERIES = 1
+
+PAGES = ['/dashboard', '/profile', '/accounts', '/action/traffic-quality', '/action/facebook-campaigns',
+         '/auth/status']
+
+ACCOUNT_TYPES = ['google_analytics', 'search_console', 'facebook_ads']
+
+@contextmanager
+def count_queries(engine):
+    """Collect every SQL statement sent to the engine inside the block"""
+    statements = []
+    
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def seed_user(app, db, account_count):
+    from database import User, GoogleToken, FacebookToken, UserAccount
+    
+    with app.app_context():
+        db.session.add(User(id=1, email='user@example.com', name='User'))
+        db.session.add(GoogleToken(user_id=1, access_token='google', refresh_token='refresh',
+                                   expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.add(FacebookToken(user_id=1, access_token='facebook',
+                                     expires_at=datetime.utcnow() + timedelta(days=30)))
+        db.session.add_all([
+            UserAccount(user_id=1, account_type=ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)], account_id=str(i),
+                        account_name=f'Account {i}', is_active=i % 4 != 0)
+            for i in range(account_count)
+        ])
+        db.session.commit()
+        return db.engine
+
+def page_queries(app, db, client, page, account_count):
+    engine = seed_user(app, db, account_count)
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = 1
+    
+    with count_queries(engine) as statements:
+        response = client.get(page)
+    
+    assert response.status_code == 200, page
+    return statements
+
+@pytest.mark.parametrize('account_count', [3, 60])
+@pytest.mark.parametrize('page', PAGES)
+def test_page_runs_a_fixed_number_of_queries(app, db, client, page, account_count):
+    """The same small number of statements whether the user has 3 or 60 accounts (no N+1)"""
+    statements = page_queries(app, db, client, page, account_count)
+    assert len(statements) <= MAX_PAGE_QUERIES, statements
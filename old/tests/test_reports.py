@@ -0,0 +1,30 @@
+import json
+import pytest
+from reports import ColumnarReport, KeywordReport, TrafficReport, FULL_POTENTIAL, json_default
+
+def test_columnar_report_requires_build_row():
+    with pytest.raises(TypeError):
+        ColumnarReport()
+    
+    class NoRows(ColumnarReport):
+        COLUMNS = (('name', None),)
+    
+    with pytest.raises(TypeError):
+        NoRows()
+
+def test_keyword_counts_sent_as_floats_are_stored_as_ints():
+    report = KeywordReport()
+    report.append(('shoes',), 12.0, 340.0, 3.5294, 4.26, 71, FULL_POTENTIAL)
+    
+    row = report[0]
+    assert row['clicks'] == 12 and isinstance(row['clicks'], int)
+    assert row['impressions'] == 340 and isinstance(row['impressions'], int)
+    assert (row['ctr'], row['position'], row['traffic_potential']) == (3.53, 4.3, 'מיצוי מלא')
+
+def test_traffic_counts_sent_as_floats_are_stored_as_ints():
+    report = TrafficReport()
+    report.append('Organic Search', 'google / organic', 120.0, 80.0, 40.0, 95.5, 2.25, 3.0, 64)
+    
+    row = json.loads(json.dumps(report, default=json_default))[0]
+    assert (row['sessions'], row['users'], row['conversions']) == (120, 80, 3)
+    assert row['avg_session_duration'] == '1:35'
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import threading
+import time
+import pytest
+import requests
+from google.oauth2.credentials import Credentials
+from http_transport import GoogleAuthorizedHttp
+from token_manager import TokenManager
+
+class FakeGoogle:
+    """Session stand-in: answers 401 to every token except the one it issued last"""
+    
+    def __init__(self):
+        self.valid_token = 'new-0'
+        self.refreshes = 0
+        self.lock = threading.Lock()
+    
+    def refresh(self, credentials, request):
+        with self.lock:
+            self.refreshes += 1
+            self.valid_token = f'new-{self.refreshes}'
+        time.sleep(0.05)  # slow enough for concurrent callers to overlap
+        credentials.token = self.valid_token
+        credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+    
+    def request(self, method, uri, data=None, headers=None):
+        response = requests.Response()
+        response.status_code = 200 if headers.get('authorization') == f'Bearer {self.valid_token}' else 401
+        response._content = b'{}'
+        return response
+    
+    def close(self):
+        pass
+
+@pytest.fixture
+def google(monkeypatch):
+    google = FakeGoogle()
+    monkeypatch.setattr(Credentials, 'refresh', lambda credentials, request: google.refresh(credentials, request))
+    return google
+
+@pytest.fixture
+def manager(app, db):
+    from database import User, GoogleToken
+    
+    with app.app_context():
+        db.session.add(User(id=1, email='user@example.com', name='User'))
+        db.session.add(GoogleToken(user_id=1, access_token='revoked', refresh_token='refresh',
+                                   expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.session.commit()
+    
+    return TokenManager(refresh_claim_seconds=5)
+
+def stored_token(app, db):
+    from database import GoogleToken
+    
+    with app.app_context():
+        return GoogleToken.query.filter_by(user_id=1).first().access_token
+
+def test_concurrent_401s_share_one_refresh_and_store_the_token(app, db, google, manager):
+    with app.app_context():
+        credentials = manager.get_credentials(1)
+    assert credentials.token == 'revoked'
+    
+    statuses = []
+    
+    def call_api():
+        with app.app_context():
+            http = GoogleAuthorizedHttp(credentials, google, refresh=manager.refresh_credentials)
+            response, _ = http.request('https://analyticsdata.googleapis.com/v1beta/properties/1:runReport')
+            statuses.append(response.status)
+    
+    threads = [threading.Thread(target=call_api) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert statuses == [200] * 6
+    assert google.refreshes == 1
+    assert credentials.token == 'new-1'
+    assert stored_token(app, db) == 'new-1'
+
+def test_expired_credentials_are_renewed_through_the_manager(app, db, google, manager):
+    from database import GoogleToken
+    
+    google.valid_token = 'revoked'  # still accepted - only the expiry forces the refresh
+    with app.app_context():
+        credentials = manager.get_credentials(1)
+        
+        # The hour passed while the client was held
+        credentials.expiry = datetime.utcnow() - timedelta(minutes=1)
+        GoogleToken.query.filter_by(user_id=1).update({'expires_at': credentials.expiry})
+        db.session.commit()
+        
+        http = GoogleAuthorizedHttp(credentials, google, refresh=manager.refresh_credentials)
+        response, _ = http.request('https://searchconsole.googleapis.com/webmasters/v3/sites')
+    
+    assert response.status == 200
+    assert google.refreshes == 1
+    assert stored_token(app, db) == credentials.token == 'new-1'
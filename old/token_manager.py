@@ -0,0 +1,247 @@
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from http_transport import http_session
+from google.oauth2.credentials import Credentials
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+import threading
+import time
+import weakref
+from database import db, GoogleToken
+from config import Config
+from observability import log
+
+# How often a request re-reads a token another process is refreshing
+REFRESH_CLAIM_POLL_SECONDS = 0.2
+
+class TokenManager:
+    """
+    Keeps ready-to-use Google credentials per user
+    
+    Credentials are cached in-process and refreshed before they expire, both
+    on demand and by a background thread. A per-user lock makes sure only one
+    refresh per user runs in this process at a time (single flight); across
+    processes, a refresh is claimed on the google_tokens row
+    (refreshing_until), so each token hits the token endpoint once no matter
+    how many gunicorn workers want it. The others wait for the claimer and
+    reuse the token it writes back. Google API clients renew the credentials
+    they were given through refresh_credentials, never on their own.
+    """
+    
+    def __init__(self, refresh_margin_seconds=300, refresh_interval_seconds=60, refresh_claim_seconds=30):
+        self.refresh_margin = timedelta(seconds=refresh_margin_seconds)
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.refresh_claim = timedelta(seconds=refresh_claim_seconds)
+        self._credentials = {}  # user_id -> Credentials
+        self._owners = weakref.WeakKeyDictionary()  # every Credentials handed out -> user_id
+        self._locks = {}  # user_id -> Lock
+        self._locks_guard = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def _user_lock(self, user_id):
+        with self._locks_guard:
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = threading.Lock()
+            return lock
+    
+    def _is_fresh(self, credentials, rejected_token=None):
+        if not credentials.token or credentials.token == rejected_token:
+            return False
+        if not credentials.expiry:
+            return True
+        return datetime.utcnow() + self.refresh_margin < credentials.expiry
+    
+    def get_credentials(self, user_id):
+        """
+        Return valid credentials for the user, refreshing if needed
+        
+        Returns None when the user has no Google token or the refresh failed
+        (e.g. access was revoked) - only then is a reconnect required.
+        """
+        credentials = self._credentials.get(user_id)
+        if credentials is not None and self._is_fresh(credentials):
+            return credentials
+        
+        with self._user_lock(user_id):
+            # Another request may have refreshed while we were waiting
+            credentials = self._credentials.get(user_id)
+            if credentials is not None and self._is_fresh(credentials):
+                return credentials
+            
+            credentials = self._load_credentials(user_id)
+            if credentials is None:
+                self._credentials.pop(user_id, None)
+                return None
+            
+            self._remember(user_id, credentials)
+            return credentials
+    
+    def refresh_credentials(self, credentials, rejected=False):
+        """
+        Renew credentials handed out by get_credentials in place
+        
+        Called by the Google API clients (GoogleAuthorizedHttp) when the
+        token expired while they held it, or with rejected=True when Google
+        answered 401 - then the token is replaced even if it hasn't expired.
+        Goes through the same lock and refresh claim as get_credentials.
+        Credentials not handed out here are refreshed directly.
+        """
+        user_id = self._owners.get(credentials)
+        if user_id is None:
+            credentials.refresh(Request(session=http_session))
+            return
+        
+        rejected_token = credentials.token if rejected else None
+        with self._user_lock(user_id):
+            fresh = self._credentials.get(user_id)
+            if fresh is None or not self._is_fresh(fresh, rejected_token):
+                fresh = self._load_credentials(user_id, rejected_token=rejected_token)
+                if fresh is None:
+                    self._credentials.pop(user_id, None)
+                    raise RefreshError(f"Google token of user {user_id} could not be refreshed")
+                self._remember(user_id, fresh)
+        
+        credentials.token = fresh.token
+        credentials.expiry = fresh.expiry
+    
+    def _remember(self, user_id, credentials):
+        self._credentials[user_id] = credentials
+        self._owners[credentials] = user_id
+    
+    def _load_credentials(self, user_id, wait=True, rejected_token=None):
+        """
+        Fresh credentials from google_tokens, refreshed here if this process wins the claim
+        
+        Uses its own session, so the caller's request transaction is never
+        committed or rolled back. With wait=False, returns None right away
+        when another process holds the claim. rejected_token (refused by
+        Google) is never taken as fresh.
+        """
+        give_up_at = datetime.utcnow() + self.refresh_claim
+        
+        while True:
+            with Session(db.engine, expire_on_commit=False) as session:
+                google_token = session.query(GoogleToken).filter_by(user_id=user_id).first()
+                if not google_token:
+                    return None
+                
+                credentials = self._build_credentials(google_token)
+                if self._is_fresh(credentials, rejected_token):
+                    return credentials
+                
+                if self._claim_refresh(session, google_token):
+                    return credentials if self._refresh(session, google_token, credentials) else None
+            
+            if not wait or datetime.utcnow() >= give_up_at:
+                return None
+            
+            # Another process is refreshing this token - wait for the result
+            time.sleep(REFRESH_CLAIM_POLL_SECONDS)
+    
+    def _claim_refresh(self, session, google_token):
+        """
+        Claim the refresh of a token for this process (one short transaction)
+        
+        Fails while another process holds an unexpired claim, or when the
+        token changed since it was read (someone else already refreshed it).
+        """
+        now = datetime.utcnow()
+        claimed = session.execute(
+            update(GoogleToken).where(
+                GoogleToken.id == google_token.id,
+                GoogleToken.access_token == google_token.access_token,
+                or_(GoogleToken.refreshing_until.is_(None), GoogleToken.refreshing_until < now)
+            ).values(refreshing_until=now + self.refresh_claim),
+            execution_options={'synchronize_session': False}
+        )
+        session.commit()
+        return claimed.rowcount == 1
+    
+    def _build_credentials(self, google_token):
+        return Credentials(
+            token=google_token.access_token,
+            refresh_token=google_token.refresh_token,
+            token_uri=google_token.token_uri,
+            client_id=google_token.client_id,
+            client_secret=google_token.client_secret,
+            scopes=google_token.get_scopes(),
+            expiry=google_token.expires_at
+        )
+    
+    def _refresh(self, session, google_token, credentials):
+        """Refresh claimed credentials, write the new token back to google_tokens and release the claim"""
+        values = {'refreshing_until': None}
+        try:
+            if not credentials.refresh_token:
+                return False
+            
+            credentials.refresh(Request(session=http_session))
+            values.update(access_token=credentials.token, expires_at=credentials.expiry)
+            log.info(f"🔄 Google token refreshed for user {google_token.user_id}")
+            return True
+        
+        except Exception as e:
+            log.error(f"❌ Error refreshing Google token for user {google_token.user_id}: {e}")
+            return False
+        
+        finally:
+            session.execute(
+                update(GoogleToken).where(GoogleToken.id == google_token.id).values(**values),
+                execution_options={'synchronize_session': False}
+            )
+            session.commit()
+    
+    def refresh_expiring(self):
+        """Refresh every stored token that expires within the refresh margin and isn't claimed elsewhere"""
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            expiring_user_ids = [user_id for user_id, in session.query(GoogleToken.user_id).filter(
+                GoogleToken.refresh_token.isnot(None),
+                GoogleToken.expires_at.isnot(None),
+                GoogleToken.expires_at <= now + self.refresh_margin,
+                or_(GoogleToken.refreshing_until.is_(None), GoogleToken.refreshing_until < now)
+            )]
+        
+        for user_id in expiring_user_ids:
+            with self._user_lock(user_id):
+                credentials = self._credentials.get(user_id)
+                if credentials is not None and self._is_fresh(credentials):
+                    continue
+                
+                credentials = self._load_credentials(user_id, wait=False)
+                if credentials is not None:
+                    self._remember(user_id, credentials)
+    
+    def invalidate(self, user_id):
+        """Drop cached credentials, e.g. after new tokens were saved"""
+        self._credentials.pop(user_id, None)
+    
+    def start(self, app):
+        """Start the background refresh thread"""
+        if self._thread is not None:
+            return
+        
+        def run():
+            while not self._stop_event.wait(self.refresh_interval_seconds):
+                with app.app_context():
+                    try:
+                        self.refresh_expiring()
+                    except Exception as e:
+                        log.error(f"❌ Token refresh loop error: {e}")
+                    finally:
+                        db.session.remove()
+        
+        self._thread = threading.Thread(target=run, name='google-token-refresh', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+
+token_manager = TokenManager(
+    refresh_margin_seconds=Config.GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS,
+    refresh_interval_seconds=Config.GOOGLE_TOKEN_REFRESH_INTERVAL_SECONDS,
+    refresh_claim_seconds=Config.GOOGLE_TOKEN_REFRESH_CLAIM_SECONDS
+)
@@ -0,0 +1,162 @@
+from urllib.parse import unquote
+import marshal
+import tempfile
+
+def site_host(site_url):
+    """
+    Host a Search Console property covers, without 'www.'
+    
+    'sc-domain:example.com' -> 'example.com'
+    'https://www.example.com/blog/' -> 'example.com'
+    """
+    if site_url.startswith('sc-domain:'):
+        return site_url[len('sc-domain:'):].lower()
+    return normalize_url(site_url).split('/', 1)[0]
+
+def host_matcher(site_url):
+    """
+    Predicate telling whether a normalized host belongs to a Search Console property
+    
+    Domain properties cover every subdomain, URL-prefix properties one host.
+    """
+    domain = site_host(site_url)
+    if site_url.startswith('sc-domain:'):
+        suffix = '.' + domain
+        return lambda host: host == domain or host.endswith(suffix)
+    return lambda host: host == domain
+
+def normalize_host(host):
+    """Lowercased host without port and 'www.'"""
+    host = host.lower()
+    colon = host.find(':')
+    if colon != -1:
+        host = host[:colon]
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+def normalize_url(url, default_host=''):
+    """
+    Join key of a page: 'host/path'
+    
+    Scheme, port, 'www.', query string and fragment are dropped, the host is
+    lowercased, the path percent-decoded and its trailing slash removed, so
+    'https://www.Example.com/a/?utm=x' and GA's ('example.com', '/a') meet on
+    'example.com/a'. Paths without a host (GA landingPage) get default_host.
+    Plain string slicing - this runs once per row of both inputs.
+    """
+    end = len(url)
+    for separator in '?#':
+        index = url.find(separator, 0, end)
+        if index != -1:
+            end = index
+    url = url[:end]
+    
+    scheme_end = url.find('://')
+    if scheme_end == -1:
+        host, path = default_host, url
+    else:
+        slash = url.find('/', scheme_end + 3)
+        if slash == -1:
+            host, path = url[scheme_end + 3:], '/'
+        else:
+            host, path = url[scheme_end + 3:slash], url[slash:]
+    
+    host = normalize_host(host)
+    
+    if '%' in path:
+        path = unquote(path)
+    if not path.startswith('/'):
+        path = '/' + path
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    
+    return host + path
+
+class PartitionedHashJoin:
+    """
+    Full outer hash join of two row streams on a string key, in bounded memory
+    
+    Rows are (key, values) where values is a tuple of additive numbers; rows
+    of one side with the same key are summed. Rows are hash-partitioned as
+    they arrive and buffered in memory; once more than buffer_rows are
+    buffered, the buffers spill to temporary files. Joining then loads one
+    partition at a time, so memory is bounded by buffer_rows plus the
+    largest partition, not by the inputs. Small inputs never touch disk.
+    """
+    
+    LEFT = 0
+    RIGHT = 1
+    
+    def __init__(self, partitions=16, buffer_rows=50000):
+        self.partitions = partitions
+        self.buffer_rows = buffer_rows
+        self._buffers = [[[] for _ in range(partitions)] for _ in (self.LEFT, self.RIGHT)]
+        self._files = None
+        self._buffered = 0
+    
+    def add(self, side, key, values):
+        self._buffers[side][hash(key) % self.partitions].append((key, values))
+        self._buffered += 1
+        if self._buffered >= self.buffer_rows:
+            self._spill()
+    
+    def add_left(self, key, values):
+        self.add(self.LEFT, key, values)
+    
+    def add_right(self, key, values):
+        self.add(self.RIGHT, key, values)
+    
+    def _spill(self):
+        if self._files is None:
+            self._files = [[tempfile.TemporaryFile() for _ in range(self.partitions)]
+                           for _ in (self.LEFT, self.RIGHT)]
+        
+        for side_buffers, side_files in zip(self._buffers, self._files):
+            for buffer, spill_file in zip(side_buffers, side_files):
+                if buffer:
+                    marshal.dump(buffer, spill_file)
+                    buffer.clear()
+        self._buffered = 0
+    
+    def _load(self, side, partition):
+        """Rows of one side of a partition, summed per key"""
+        totals = {}
+        
+        def add_rows(rows):
+            for key, values in rows:
+                total = totals.get(key)
+                totals[key] = values if total is None else tuple(a + b for a, b in zip(total, values))
+        
+        if self._files is not None:
+            spill_file = self._files[side][partition]
+            spill_file.seek(0)
+            while True:
+                try:
+                    add_rows(marshal.load(spill_file))
+                except EOFError:
+                    break
+        add_rows(self._buffers[side][partition])
+        self._buffers[side][partition] = []
+        return totals
+    
+    def __iter__(self):
+        """Yield (key, left_values, right_values); the missing side is None"""
+        try:
+            for partition in range(self.partitions):
+                left = self._load(self.LEFT, partition)
+                right = self._load(self.RIGHT, partition)
+                
+                for key, left_values in left.items():
+                    yield key, left_values, right.pop(key, None)
+                for key, right_values in right.items():
+                    yield key, None, right_values
+        finally:
+            self.close()
+    
+    def close(self):
+        if self._files is not None:
+            for side_files in self._files:
+                for spill_file in side_files:
+                    spill_file.close()
+            self._files = None